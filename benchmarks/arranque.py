@@ -0,0 +1,170 @@
+# benchmarks/arranque.py
+#
+# Arranque de cada servicio con la configuración de gunicorn de producción
+# (comun/gunicorn_conf.py):
+#
+#   python benchmarks/arranque.py --workers 4
+#   python benchmarks/arranque.py --workers 4 --sin-preload --servicios inventario pacientes
+#
+# Para cada servicio lanza gunicorn desde su carpeta, mide el tiempo hasta que
+# todos los workers están vivos y GET /listo responde 200, y lee de /proc la
+# memoria del master y de cada worker: RSS (lo que el proceso tiene en
+# memoria) y PSS (RSS repartiendo las páginas compartidas entre quienes las
+# comparten; con preload los workers comparten lo importado por el master).
+# Cada medición se repite --repeticiones veces y se informa la mediana.
+#
+# Los servicios usan las variables de entorno de quien corre el script
+# (DATABASE_URL, AUTH0_*, KAFKA_BOOTSTRAP_SERVERS...), igual que carga.py:
+# levantar antes Postgres y Kafka (docker compose up -d postgres kafka).
+# Solo Linux (lee /proc).
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# servicio -> (carpeta, módulo de la app)
+SERVICIOS = {
+    "pacientes": ("pacientes", "app.main:app"),
+    "inventario": ("inventario", "app.main:app"),
+    "usuarios": ("usuarios", "app:app"),
+    "transacciones": ("transacciones", "app:app"),
+    "informes": ("informes", "app:app"),
+}
+
+
+# --- PROCESOS ---
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _hijos(pid: int) -> list:
+    hijos = []
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as archivo:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                campos = archivo.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(campos[1]) == pid:
+            hijos.append(int(entrada))
+    return hijos
+
+
+def _memoria_mb(pid: int) -> dict:
+    memoria = {}
+    with open(f"/proc/{pid}/smaps_rollup") as archivo:
+        for linea in archivo:
+            clave, _, valor = linea.partition(":")
+            if clave in ("Rss", "Pss"):
+                memoria[clave.lower()] = int(valor.split()[0]) / 1024
+    return memoria
+
+
+# --- MEDICIÓN ---
+
+def medir(servicio: str, workers: int, preload: bool, timeout: float) -> dict:
+    carpeta, modulo = SERVICIOS[servicio]
+    puerto = _puerto_libre()
+    entorno = dict(os.environ)
+    entorno.update({
+        "PORT": str(puerto),
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_PRELOAD": "true" if preload else "false",
+        # Por si comun no está instalado en el entorno
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.path.join(RAIZ, "comun"), entorno.get("PYTHONPATH")])),
+    })
+    entorno.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+    # El log va a un archivo: un pipe sin leer se llena y bloquea a gunicorn
+    log = tempfile.TemporaryFile()
+    inicio = time.monotonic()
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "python:comun.gunicorn_conf", modulo],
+        cwd=os.path.join(RAIZ, carpeta), env=entorno,
+        stdout=subprocess.DEVNULL, stderr=log,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{puerto}", timeout=2) as cliente:
+            while True:
+                if master.poll() is not None:
+                    log.seek(0)
+                    raise RuntimeError(f"{servicio}: gunicorn terminó al arrancar:\n{log.read().decode()[-2000:]}")
+                if time.monotonic() - inicio > timeout:
+                    raise RuntimeError(f"{servicio}: no quedó listo en {timeout:.0f}s")
+                if len(_hijos(master.pid)) >= workers:
+                    try:
+                        if cliente.get("/listo").status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                time.sleep(0.05)
+        listo = time.monotonic() - inicio
+
+        memoria_workers = [_memoria_mb(pid) for pid in _hijos(master.pid)]
+        memoria_master = _memoria_mb(master.pid)
+        return {
+            "listo_s": round(listo, 3),
+            "master_rss_mb": round(memoria_master["rss"], 1),
+            "worker_rss_mb": round(statistics.mean(m["rss"] for m in memoria_workers), 1),
+            "worker_pss_mb": round(statistics.mean(m["pss"] for m in memoria_workers), 1),
+            "total_pss_mb": round(memoria_master["pss"] + sum(m["pss"] for m in memoria_workers), 1),
+        }
+    finally:
+        master.terminate()
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+            master.wait()
+        log.close()
+
+
+def medir_repetido(servicio: str, workers: int, preload: bool, timeout: float, repeticiones: int) -> dict:
+    corridas = [medir(servicio, workers, preload, timeout) for _ in range(repeticiones)]
+    return {clave: round(statistics.median(c[clave] for c in corridas), 3) for clave in corridas[0]}
+
+
+def imprimir(resultados: dict):
+    print(f"\n{'servicio':<16}{'listo s':>9}{'master RSS':>12}{'worker RSS':>12}{'worker PSS':>12}{'total PSS':>11}")
+    for servicio, r in resultados.items():
+        print(f"{servicio:<16}{r['listo_s']:>9}{r['master_rss_mb']:>12}{r['worker_rss_mb']:>12}"
+              f"{r['worker_pss_mb']:>12}{r['total_pss_mb']:>11}")
+    print("(memoria en MB, mediana de las repeticiones)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de arranque y memoria por worker de cada servicio")
+    parser.add_argument("--servicios", nargs="+", choices=sorted(SERVICIOS), default=list(SERVICIOS))
+    parser.add_argument("--workers", type=int, default=4, help="Workers de gunicorn por servicio")
+    parser.add_argument("--sin-preload", action="store_true", help="Cada worker importa la app por su cuenta")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60, help="Segundos máximos hasta quedar listo")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    preload = not args.sin_preload
+    print(f"{args.workers} workers por servicio, preload {'sí' if preload else 'no'}, {args.repeticiones} repeticiones...")
+    resultados = {
+        servicio: medir_repetido(servicio, args.workers, preload, args.timeout, args.repeticiones)
+        for servicio in args.servicios
+    }
+    imprimir(resultados)
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            json.dump({"workers": args.workers, "preload": preload, "servicios": resultados}, archivo, indent=2)
@@ -0,0 +1,204 @@
+# benchmarks/carga.py
+#
+# Prueba de carga de los flujos de la farmacia (ver escenarios.py) contra el
+# stack local levantado con docker-compose.bench.yml.
+#
+#   python benchmarks/carga.py --usuarios 20 --duracion 60
+#
+# Cada usuario virtual (con su propio token) elige un escenario según su
+# peso, lo ejecuta y vuelve a empezar, sin pausas. Al final se imprime, por
+# endpoint, throughput y latencias p50/p95/p99, y se compara con la línea
+# base guardada (linea_base.json): si un endpoint empeora más que
+# --tolerancia el proceso termina con código 1.
+#
+# --guardar-linea-base reemplaza la línea base con los resultados de la
+# corrida (hacerlo en la máquina de referencia y commitear el archivo).
+#
+# --via http://localhost:3000 manda todas las peticiones al nginx del
+# frontend (frontend/nginx.conf) en vez de a cada servicio: mide también el
+# proxy, el keep-alive hacia los upstreams y el micro-caché del catálogo.
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Optional
+
+import httpx
+
+import escenarios
+from emisor_jwks import emitir_token
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+LINEA_BASE = os.path.join(DIRECTORIO, "linea_base.json")
+
+URLS = {
+    "pacientes": os.getenv("BENCH_PACIENTES_URL", "http://localhost:8000"),
+    "inventario": os.getenv("BENCH_INVENTARIO_URL", "http://localhost:8001"),
+    "transacciones": os.getenv("BENCH_TRANSACCIONES_URL", "http://localhost:8003"),
+    "informes": os.getenv("BENCH_INFORMES_URL", "http://localhost:8004"),
+}
+
+# Un endpoint con más de esta proporción de errores falla aunque no haya
+# línea base
+MAXIMO_ERRORES = 0.01
+
+
+# --- REGISTRO DE MEDICIONES ---
+
+class Registro:
+    def __init__(self, desde: float):
+        # Lo anterior a 'desde' es calentamiento y no se cuenta
+        self.desde = desde
+        self.latencias = {}
+        self.errores = {}
+
+    def agregar(self, nombre: str, segundos: float, ok: bool):
+        if time.monotonic() < self.desde:
+            return
+        self.latencias.setdefault(nombre, []).append(segundos)
+        if not ok:
+            self.errores[nombre] = self.errores.get(nombre, 0) + 1
+
+    def medidor(self):
+        async def medir(nombre: str, peticion):
+            # Devuelve la respuesta (None si falló la conexión) para los
+            # escenarios que usan lo que devolvió una llamada
+            inicio = time.monotonic()
+            respuesta = None
+            try:
+                respuesta = await peticion
+                ok = respuesta.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            self.agregar(nombre, time.monotonic() - inicio, ok)
+            return respuesta
+        return medir
+
+
+def _percentil(ordenadas: list, p: float) -> float:
+    # Rango más cercano: el valor que deja al menos p del total por debajo
+    return ordenadas[max(0, math.ceil(p * len(ordenadas)) - 1)]
+
+
+def resumir(registro: Registro, segundos: float) -> dict:
+    resultados = {}
+    for nombre, latencias in sorted(registro.latencias.items()):
+        ordenadas = sorted(latencias)
+        resultados[nombre] = {
+            "peticiones": len(ordenadas),
+            "errores": registro.errores.get(nombre, 0),
+            "rps": round(len(ordenadas) / segundos, 2),
+            "p50_ms": round(1000 * _percentil(ordenadas, 0.50), 2),
+            "p95_ms": round(1000 * _percentil(ordenadas, 0.95), 2),
+            "p99_ms": round(1000 * _percentil(ordenadas, 0.99), 2),
+        }
+    return resultados
+
+
+# --- CORRIDA ---
+
+async def _usuario_virtual(numero: int, contexto, medir, hasta: float, semilla: int):
+    rnd = random.Random(semilla + numero)
+    cabeceras = {"Authorization": f"Bearer {emitir_token(f'bench|usuario-{numero}')}"}
+    funciones = [e for e, _ in escenarios.ESCENARIOS]
+    pesos = [p for _, p in escenarios.ESCENARIOS]
+    while time.monotonic() < hasta:
+        escenario = rnd.choices(funciones, weights=pesos)[0]
+        await escenario(contexto, cabeceras, medir, rnd)
+
+
+async def correr(usuarios: int, duracion: float, calentamiento: float, semilla: int, via: Optional[str] = None) -> dict:
+    limites = httpx.Limits(max_connections=usuarios, max_keepalive_connections=usuarios)
+    clientes = {
+        servicio: httpx.AsyncClient(base_url=via or url, timeout=30, limits=limites)
+        for servicio, url in URLS.items()
+    }
+    try:
+        contexto = escenarios.Contexto(clientes)
+        print(f"Sembrando datos de prueba ({escenarios.BENCH_PRODUCTOS} productos, {escenarios.BENCH_PACIENTES} pacientes)...")
+        await escenarios.sembrar(contexto, {"Authorization": f"Bearer {emitir_token('bench|sembrado')}"})
+
+        inicio = time.monotonic()
+        registro = Registro(desde=inicio + calentamiento)
+        hasta = inicio + calentamiento + duracion
+        print(f"{usuarios} usuarios virtuales, {calentamiento:.0f}s de calentamiento + {duracion:.0f}s medidos...")
+        await asyncio.gather(*(
+            _usuario_virtual(i, contexto, registro.medidor(), hasta, semilla) for i in range(usuarios)
+        ))
+        return resumir(registro, time.monotonic() - registro.desde)
+    finally:
+        for cliente in clientes.values():
+            await cliente.aclose()
+
+
+# --- COMPARACIÓN CON LA LÍNEA BASE ---
+
+def comparar(resultados: dict, linea_base: dict, tolerancia: float) -> list:
+    """Lista de regresiones (texto) de 'resultados' frente a 'linea_base'."""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        if actual["errores"] > MAXIMO_ERRORES * actual["peticiones"]:
+            regresiones.append(f"{nombre}: {actual['errores']} errores de {actual['peticiones']} peticiones")
+        base = linea_base.get(nombre)
+        if base is None:
+            continue
+        for metrica in ("p95_ms", "p99_ms"):
+            if actual[metrica] > base[metrica] * (1 + tolerancia):
+                regresiones.append(f"{nombre}: {metrica} {actual[metrica]} > {base[metrica]} (+{tolerancia:.0%})")
+        if actual["rps"] < base["rps"] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: rps {actual['rps']} < {base['rps']} (-{tolerancia:.0%})")
+    for nombre in linea_base:
+        if nombre not in resultados:
+            regresiones.append(f"{nombre}: sin mediciones en esta corrida")
+    return regresiones
+
+
+def imprimir(resultados: dict):
+    print(f"\n{'endpoint':<48}{'peticiones':>11}{'errores':>9}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<48}{r['peticiones']:>11}{r['errores']:>9}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de los flujos de la farmacia")
+    parser.add_argument("--usuarios", type=int, default=20, help="Usuarios virtuales concurrentes")
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos medidos")
+    parser.add_argument("--calentamiento", type=float, default=10, help="Segundos iniciales que no se miden")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla de la elección de escenarios y datos")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--linea-base", default=LINEA_BASE, help="Resultados de referencia")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento permitido (0.25 = 25%%)")
+    parser.add_argument("--guardar-linea-base", action="store_true", help="Guarda esta corrida como línea base")
+    parser.add_argument("--via", help="URL del nginx por el que pasan todas las peticiones (p. ej. http://localhost:3000)")
+    args = parser.parse_args()
+
+    resultados = asyncio.run(correr(args.usuarios, args.duracion, args.calentamiento, args.semilla, args.via))
+    imprimir(resultados)
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+    if args.guardar_linea_base:
+        with open(args.linea_base, "w") as archivo:
+            json.dump(resultados, archivo, indent=2)
+        print(f"\nLínea base guardada en {args.linea_base}")
+        sys.exit(0)
+
+    linea_base = {}
+    if os.path.exists(args.linea_base):
+        with open(args.linea_base) as archivo:
+            linea_base = json.load(archivo)
+    else:
+        print(f"\nSin línea base en {args.linea_base}: solo se revisan los errores.")
+    regresiones = comparar(resultados, linea_base, args.tolerancia)
+    if regresiones:
+        print("\nREGRESIONES:")
+        for regresion in regresiones:
+            print(f"  - {regresion}")
+        sys.exit(1)
+    print("\nSin regresiones.")
@@ -0,0 +1,83 @@
+# benchmarks/emisor_jwks.py
+#
+# Emisor de tokens que reemplaza a Auth0 en las pruebas de carga.
+#
+#   python benchmarks/emisor_jwks.py generar
+#
+# crea un par de claves RSA en benchmarks/.claves/: la privada (con la que
+# carga.py firma los tokens) y publica/jwks.json, que docker-compose.bench.yml
+# sirve en http://emisor_jwks:8080/jwks.json. Los servicios validan los
+# tokens igual que en producción (comun/auth.py), solo cambia de dónde
+# descargan las claves (AUTH0_JWKS_URL).
+
+import argparse
+import json
+import os
+import time
+
+DIRECTORIO_CLAVES = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".claves")
+DOMINIO_BENCH = "bench.farmacia.local"
+AUDIENCIA_BENCH = "farmacia-bench"
+KID_BENCH = "bench-1"
+
+
+def _ruta_privada(directorio: str) -> str:
+    return os.path.join(directorio, "privada.pem")
+
+
+def generar(directorio: str = DIRECTORIO_CLAVES, forzar: bool = False):
+    """Crea las claves si no existen (con forzar=True las reemplaza)."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk
+
+    if os.path.exists(_ruta_privada(directorio)) and not forzar:
+        print(f"Las claves ya existen en {directorio}")
+        return
+    os.makedirs(os.path.join(directorio, "publica"), exist_ok=True)
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    privada = clave.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    publica = clave.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    with open(_ruta_privada(directorio), "wb") as archivo:
+        archivo.write(privada)
+    jwks = jwk.construct(publica, "RS256").to_dict()
+    jwks.update({"kid": KID_BENCH, "use": "sig", "alg": "RS256"})
+    with open(os.path.join(directorio, "publica", "jwks.json"), "w") as archivo:
+        json.dump({"keys": [jwks]}, archivo)
+    print(f"Claves generadas en {directorio}")
+
+
+def emitir_token(sub: str, directorio: str = DIRECTORIO_CLAVES, duracion_segundos: int = 6 * 3600) -> str:
+    """Token con el mismo formato que los de Auth0 (iss, aud, sub, exp)."""
+    from jose import jwt
+
+    with open(_ruta_privada(directorio), "rb") as archivo:
+        privada = archivo.read()
+    ahora = int(time.time())
+    claims = {
+        "iss": f"https://{DOMINIO_BENCH}/",
+        "aud": AUDIENCIA_BENCH,
+        "sub": sub,
+        "iat": ahora,
+        "exp": ahora + duracion_segundos,
+    }
+    return jwt.encode(claims, privada, algorithm="RS256", headers={"kid": KID_BENCH})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Claves y tokens de prueba para los benchmarks")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    generar_parser = sub.add_parser("generar", help="Crea las claves RSA y jwks.json")
+    generar_parser.add_argument("--forzar", action="store_true", help="Reemplaza las claves existentes")
+    token_parser = sub.add_parser("token", help="Imprime un token firmado (para probar a mano con curl)")
+    token_parser.add_argument("--sub", default="bench|manual")
+    args = parser.parse_args()
+
+    if args.comando == "generar":
+        generar(forzar=args.forzar)
+    else:
+        print(emitir_token(args.sub))
@@ -0,0 +1,161 @@
+# benchmarks/escenarios.py
+#
+# Flujos de la farmacia que ejecuta cada usuario virtual de carga.py. Cada
+# escenario hace una o más llamadas y mide cada una con su propio nombre
+# (el que aparece en los resultados y en la línea base).
+#
+# Los datos de prueba (productos y pacientes 'bench-...') se crean una vez
+# con sembrar(); las siguientes corridas los reutilizan.
+
+import asyncio
+import os
+import random
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+BENCH_PRODUCTOS = int(os.getenv("BENCH_PRODUCTOS", "200"))
+BENCH_PACIENTES = int(os.getenv("BENCH_PACIENTES", "500"))
+PREFIJO = "bench-"
+# Stock inicial de los productos de prueba: las ventas y dispensaciones lo
+# descuentan y no debe llegar a cero durante una corrida
+STOCK_BENCH = 1_000_000_000
+
+
+class Contexto:
+    """Clientes HTTP por servicio y los ids de los datos sembrados."""
+
+    def __init__(self, clientes: dict):
+        self.clientes = clientes
+        self.productos = []
+        self.pacientes = []
+        # Última versión del catálogo vista por las cajas (GET /cambios)
+        self.version_catalogo = 0
+
+
+# --- DATOS DE PRUEBA ---
+
+async def _sembrar_productos(contexto: Contexto, cabeceras: dict):
+    inventario = contexto.clientes["inventario"]
+    respuesta = await inventario.get("/api/inventario/", params={"limit": 1_000_000}, headers=cabeceras)
+    respuesta.raise_for_status()
+    existentes = {p["nombre"]: p["id"] for p in respuesta.json() if p["nombre"].startswith(PREFIJO)}
+    for i in range(BENCH_PRODUCTOS):
+        nombre = f"{PREFIJO}producto-{i}"
+        if nombre not in existentes:
+            respuesta = await inventario.post("/api/inventario/", headers=cabeceras, json={
+                "nombre": nombre, "descripcion": "Producto de prueba de carga",
+                "precio_venta": 1000 + i, "stock": STOCK_BENCH,
+            })
+            respuesta.raise_for_status()
+            existentes[nombre] = respuesta.json()["id"]
+    contexto.productos = sorted(existentes.values())
+
+
+async def _sembrar_paciente(contexto: Contexto, cabeceras: dict, i: int, limite: asyncio.Semaphore):
+    pacientes = contexto.clientes["pacientes"]
+    rut = f"{PREFIJO}{i}"
+    async with limite:
+        respuesta = await pacientes.get(f"/api/pacientes/rut/{rut}", headers=cabeceras)
+        if respuesta.status_code == 404:
+            respuesta = await pacientes.post("/api/pacientes/", headers=cabeceras, json={
+                "nombre": f"Paciente de prueba {i}", "rut": rut, "fecha_nacimiento": "1980-01-01",
+            })
+        respuesta.raise_for_status()
+    return respuesta.json()["id"], rut
+
+
+async def sembrar(contexto: Contexto, cabeceras: dict):
+    await _sembrar_productos(contexto, cabeceras)
+    limite = asyncio.Semaphore(20)
+    contexto.pacientes = await asyncio.gather(
+        *(_sembrar_paciente(contexto, cabeceras, i, limite) for i in range(BENCH_PACIENTES))
+    )
+
+
+# --- ESCENARIOS ---
+# Cada uno recibe (contexto, cabeceras, medir, rnd). medir(nombre, corrutina)
+# ejecuta la llamada, registra su latencia y si falló, y devuelve la respuesta.
+
+def _items(contexto: Contexto, rnd: random.Random, maximo: int):
+    productos = rnd.sample(contexto.productos, rnd.randint(1, maximo))
+    return [{"producto_id": p, "cantidad": rnd.randint(1, 3)} for p in productos]
+
+
+async def venta_pos(contexto, cabeceras, medir, rnd):
+    """Cobro en el punto de venta."""
+    await medir("POST /api/transacciones/ventas", contexto.clientes["transacciones"].post(
+        "/api/transacciones/ventas", headers=cabeceras, json={"productos": _items(contexto, rnd, 4)},
+    ))
+
+
+async def ventas_pos_en_lote(contexto, cabeceras, medir, rnd):
+    """Envío de la cola del POS: varias ventas cobradas en los últimos minutos."""
+    ahora = datetime.now(timezone.utc)
+    ventas = [
+        {"id_cliente": str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+         "fecha": (ahora - timedelta(seconds=rnd.randint(0, 300))).isoformat(),
+         "productos": _items(contexto, rnd, 4)}
+        for _ in range(rnd.randint(1, 10))
+    ]
+    await medir("POST /api/transacciones/ventas/lote", contexto.clientes["transacciones"].post(
+        "/api/transacciones/ventas/lote", headers=cabeceras, json={"ventas": ventas},
+    ))
+
+
+async def sincronizar_catalogo(contexto, cabeceras, medir, rnd):
+    """Sincronización periódica de la copia local del catálogo en el POS."""
+    respuesta = await medir("GET /api/inventario/cambios", contexto.clientes["inventario"].get(
+        "/api/inventario/cambios", headers=cabeceras, params={"desde": contexto.version_catalogo},
+    ))
+    if respuesta is not None and respuesta.status_code == 200:
+        contexto.version_catalogo = max(contexto.version_catalogo, respuesta.json()["version"])
+
+
+async def catalogo(contexto, cabeceras, medir, rnd):
+    """Listado de productos (catálogo del POS y de inventario)."""
+    await medir("GET /api/inventario/", contexto.clientes["inventario"].get(
+        "/api/inventario/", headers=cabeceras, params={"limit": 100},
+    ))
+
+
+async def paciente_por_rut(contexto, cabeceras, medir, rnd):
+    """Búsqueda del paciente por RUT en el mostrador."""
+    _, rut = rnd.choice(contexto.pacientes)
+    await medir("GET /api/pacientes/rut/{rut}", contexto.clientes["pacientes"].get(
+        f"/api/pacientes/rut/{rut}", headers=cabeceras,
+    ))
+
+
+async def dispensacion(contexto, cabeceras, medir, rnd):
+    """Revisión de alertas de la receta y registro de la entrega."""
+    paciente_id, _ = rnd.choice(contexto.pacientes)
+    items = _items(contexto, rnd, 3)
+    pacientes = contexto.clientes["pacientes"]
+    await medir("POST /api/pacientes/{id}/alertas", pacientes.post(
+        f"/api/pacientes/{paciente_id}/alertas", headers=cabeceras,
+        json={"producto_ids": [i["producto_id"] for i in items]},
+    ))
+    await medir("POST /api/pacientes/{id}/dispensaciones/lote", pacientes.post(
+        f"/api/pacientes/{paciente_id}/dispensaciones/lote", headers=cabeceras, json={"productos": items},
+    ))
+
+
+async def reporte_ventas(contexto, cabeceras, medir, rnd):
+    """Descarga del reporte de ventas de los últimos 30 días."""
+    hoy = date.today()
+    await medir("GET /api/informes/ventas/{formato}", contexto.clientes["informes"].get(
+        "/api/informes/ventas/excel", headers=cabeceras,
+        params={"fecha_inicio": (hoy - timedelta(days=30)).isoformat(), "fecha_fin": hoy.isoformat()},
+    ))
+
+
+# (escenario, peso): proporción aproximada de cada flujo en un día de atención
+ESCENARIOS = [
+    (venta_pos, 4),
+    (ventas_pos_en_lote, 1),
+    (catalogo, 5),
+    (sincronizar_catalogo, 2),
+    (paciente_por_rut, 3),
+    (dispensacion, 2),
+    (reporte_ventas, 1),
+]
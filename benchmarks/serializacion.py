@@ -0,0 +1,103 @@
+# benchmarks/serializacion.py
+#
+# Costo de serializar la lista de productos (GET /api/inventario/) con un
+# catálogo grande, sin red ni base de datos:
+#
+#   python benchmarks/serializacion.py --productos 50000
+#
+# Compara, sobre los mismos datos:
+#   - pydantic: objetos del ORM -> List[schemas.Producto] (from_attributes)
+#     -> JSON con el núcleo de Pydantic (lo que hace FastAPI con
+#     response_model),
+#   - orjson: las filas como dicts -> RespuestaJSON (comun/respuestas.py),
+#     lo que hace ahora la ruta,
+# y los bytes en el cable sin comprimir, con gzip y con brotli (mismos
+# niveles que instalar_compresion), con el tiempo de comprimir.
+# Cada medición es la mediana de --repeticiones.
+
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(RAIZ, "inventario"), os.path.join(RAIZ, "comun")]
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app import schemas  # noqa: E402
+from comun.respuestas import (  # noqa: E402
+    COMPRESION_CALIDAD_BROTLI, COMPRESION_NIVEL_GZIP, RespuestaJSON, filas_como_dicts,
+)
+
+COLUMNAS = ("nombre", "descripcion", "precio_venta", "stock", "id")
+
+
+def catalogo(productos: int) -> list:
+    return [
+        (f"Producto {i} 500 mg x 30 comprimidos", f"Descripción del producto {i}" if i % 3 else None,
+         round(990 + i * 0.37, 2), i % 250, i)
+        for i in range(1, productos + 1)
+    ]
+
+
+def _mediana_ms(funcion, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return round(statistics.median(tiempos) * 1000, 1), resultado
+
+
+def medir(productos: int, repeticiones: int) -> dict:
+    filas = catalogo(productos)
+    objetos = [SimpleNamespace(**dict(zip(COLUMNAS, fila))) for fila in filas]
+    adaptador = TypeAdapter(List[schemas.Producto])
+
+    def con_pydantic():
+        return adaptador.dump_json(adaptador.validate_python(objetos, from_attributes=True))
+
+    def con_orjson():
+        return RespuestaJSON(filas_como_dicts(COLUMNAS, filas)).body
+
+    ms_pydantic, cuerpo_pydantic = _mediana_ms(con_pydantic, repeticiones)
+    ms_orjson, cuerpo = _mediana_ms(con_orjson, repeticiones)
+    resultados = {
+        "serializacion_ms": {"pydantic": ms_pydantic, "orjson": ms_orjson},
+        "bytes": {"pydantic": len(cuerpo_pydantic), "orjson": len(cuerpo)},
+        "compresion": {},
+    }
+
+    ms_gzip, comprimido = _mediana_ms(lambda: gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL_GZIP), repeticiones)
+    resultados["compresion"]["gzip"] = {"bytes": len(comprimido), "ms": ms_gzip}
+    try:
+        import brotli
+    except ImportError:
+        print("brotli no está instalado (pip install brotli-asgi): se omite", file=sys.stderr)
+    else:
+        ms_brotli, comprimido = _mediana_ms(lambda: brotli.compress(cuerpo, quality=COMPRESION_CALIDAD_BROTLI), repeticiones)
+        resultados["compresion"]["brotli"] = {"bytes": len(comprimido), "ms": ms_brotli}
+    return resultados
+
+
+def imprimir(productos: int, r: dict):
+    print(f"\n{productos} productos")
+    print(f"{'serialización':<16}{'ms':>10}{'bytes':>12}")
+    for nombre, ms in r["serializacion_ms"].items():
+        print(f"{nombre:<16}{ms:>10}{r['bytes'][nombre]:>12}")
+    print(f"\n{'compresión':<16}{'ms':>10}{'bytes':>12}{'% del JSON':>12}")
+    for nombre, c in r["compresion"].items():
+        print(f"{nombre:<16}{c['ms']:>10}{c['bytes']:>12}{c['bytes'] / r['bytes']['orjson'] * 100:>11.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serialización y compresión de la lista de productos")
+    parser.add_argument("--productos", type=int, default=50000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    imprimir(args.productos, medir(args.productos, args.repeticiones))
@@ -0,0 +1,3 @@
+# comun/__init__.py
+#
+# Código compartido entre los microservicios (ver README.md).
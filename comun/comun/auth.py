@@ -0,0 +1,138 @@
+# comun/auth.py
+#
+# Validación de los tokens de Auth0, igual en todos los servicios:
+#   - Las claves (JWKS) se descargan una vez por proceso y se vuelven a pedir
+#     solo si llega un 'kid' desconocido (rotación), como máximo cada
+#     AUTH0_JWKS_REFRESCO_MINIMO_SEGUNDOS. AUTH0_JWKS_URL permite apuntar a
+#     otra URL (p. ej. un mock en las pruebas de carga).
+#   - Un token ya verificado se guarda (hasta su 'exp') en un LRU de
+#     AUTH0_CACHE_TOKENS entradas: el mismo token en la siguiente petición no
+#     vuelve a verificar la firma RSA.
+# Los aciertos y fallos de ambos cachés se cuentan en cache_consultas_total
+# (cache="jwks_auth0" / "tokens_auth0").
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from comun.metricas import registrar_cache
+
+AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
+AUTH0_API_AUDIENCE = os.getenv("AUTH0_API_AUDIENCE")
+AUTH0_JWKS_URL = os.getenv("AUTH0_JWKS_URL")
+AUTH0_JWKS_REFRESCO_MINIMO_SEGUNDOS = float(os.getenv("AUTH0_JWKS_REFRESCO_MINIMO_SEGUNDOS", "30"))
+AUTH0_CACHE_TOKENS = int(os.getenv("AUTH0_CACHE_TOKENS", "5000"))
+ALGORITHMS = ["RS256"]
+
+
+class VerificadorAuth0:
+    def __init__(self, dominio: Optional[str] = AUTH0_DOMAIN, audiencia: Optional[str] = AUTH0_API_AUDIENCE,
+                 jwks_url: Optional[str] = AUTH0_JWKS_URL, max_tokens: int = AUTH0_CACHE_TOKENS):
+        self.dominio = dominio
+        self.audiencia = audiencia
+        self.jwks_url = jwks_url or (f"https://{dominio}/.well-known/jwks.json" if dominio else None)
+        self.max_tokens = max_tokens
+        self._claves = {}
+        self._descargado = None
+        self._lock_claves = None
+        # sha256(token) -> (payload, exp)
+        self._tokens = OrderedDict()
+        self._lock_tokens = threading.Lock()
+
+    # --- CLAVES ---
+
+    async def _descargar_claves(self):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=10) as client:
+            respuesta = await client.get(self.jwks_url)
+            respuesta.raise_for_status()
+        self._claves = {clave["kid"]: clave for clave in respuesta.json()["keys"]}
+        self._descargado = time.monotonic()
+
+    async def clave(self, kid: str) -> Optional[dict]:
+        if kid in self._claves:
+            registrar_cache("jwks_auth0", True)
+            return self._claves[kid]
+        registrar_cache("jwks_auth0", False)
+        if self._lock_claves is None:
+            self._lock_claves = asyncio.Lock()
+        async with self._lock_claves:
+            if kid in self._claves:
+                return self._claves[kid]
+            reciente = self._descargado is not None and time.monotonic() - self._descargado < AUTH0_JWKS_REFRESCO_MINIMO_SEGUNDOS
+            if not reciente:
+                try:
+                    await self._descargar_claves()
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"No se pudieron obtener las claves de Auth0: {e}")
+        return self._claves.get(kid)
+
+    # --- TOKENS ---
+
+    def _en_cache(self, huella: str) -> Optional[dict]:
+        with self._lock_tokens:
+            entrada = self._tokens.get(huella)
+            if entrada is None:
+                return None
+            if entrada[1] <= time.time():
+                del self._tokens[huella]
+                return None
+            self._tokens.move_to_end(huella)
+            return entrada[0]
+
+    def _guardar(self, huella: str, payload: dict):
+        with self._lock_tokens:
+            self._tokens[huella] = (payload, payload.get("exp", 0))
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+
+    async def verificar(self, token: str) -> dict:
+        from jose import jwt, JWTError
+
+        if self.dominio is None or self.audiencia is None:
+            raise HTTPException(status_code=500, detail="Configuración de Auth0 no encontrada en el servidor.")
+        huella = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        payload = self._en_cache(huella)
+        registrar_cache("tokens_auth0", payload is not None)
+        if payload is not None:
+            return payload
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            clave = await self.clave(kid)
+            if clave is None:
+                raise HTTPException(status_code=401, detail="Token inválido: clave de firma no encontrada.")
+            payload = jwt.decode(
+                token,
+                {k: clave[k] for k in ("kty", "kid", "use", "n", "e") if k in clave},
+                algorithms=ALGORITHMS,
+                audience=self.audiencia,
+                issuer=f"https://{self.dominio}/",
+            )
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expirado.")
+        except jwt.JWTClaimsError as e:
+            raise HTTPException(status_code=401, detail=f"Token inválido: {e}")
+        except JWTError as e:
+            raise HTTPException(status_code=401, detail=f"Token inválido: {e}")
+        self._guardar(huella, payload)
+        return payload
+
+    async def __call__(self, request: Request) -> dict:
+        """Dependencia de FastAPI: valida 'Authorization: Bearer ...' y devuelve el payload."""
+        cabecera = request.headers.get("Authorization")
+        if not cabecera:
+            raise HTTPException(status_code=401, detail="Token de autorización no proporcionado.")
+        partes = cabecera.split()
+        if len(partes) != 2 or partes[0].lower() != "bearer":
+            raise HTTPException(status_code=401, detail="La cabecera Authorization debe ser un token Bearer.")
+        return await self.verificar(partes[1])
+
+
+verificador_auth0 = VerificadorAuth0()
@@ -0,0 +1,52 @@
+# comun/cambios.py
+#
+# Lectura de "qué cambió desde la versión N" en las tablas versionadas
+# (productos y movimientos_stock en la migración 0008, pacientes en la 0009).
+# La versión de una fila es el id de la transacción que la escribió y los
+# borrados dejan una lápida en <tabla>_eliminados.
+#
+# Solo se entregan los cambios de transacciones anteriores a 'hasta', el
+# xmin del snapshot actual: todas ya terminaron, así que ninguna transacción
+# en curso puede confirmar después un cambio con una versión menor. 'hasta'
+# es la versión que el cliente manda en la siguiente consulta. Una
+# transacción larga (o una conexión 'idle in transaction') frena el avance
+# de la versión, pero no hace perder cambios.
+
+from sqlalchemy import text
+
+SQL_VERSION_SEGURA = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+
+def leer_cambios(db, desde: int, sql_todos, sql_cambiados, sql_eliminados) -> dict:
+    """
+    Filas cambiadas e ids eliminados desde la versión 'desde' (Session o
+    Connection de SQLAlchemy). sql_cambiados y sql_eliminados reciben
+    :desde y :hasta. Con desde=0 devuelve todas las filas (sql_todos) y
+    'completo' en True: el cliente reemplaza su copia entera.
+    """
+    hasta = db.execute(SQL_VERSION_SEGURA).scalar()
+    if desde <= 0:
+        return {"version": hasta, "completo": True, "filas": db.execute(sql_todos).all(), "eliminados": []}
+    parametros = {"desde": desde, "hasta": hasta}
+    return {
+        # Nunca por debajo de lo que el cliente ya vio
+        "version": max(hasta, desde),
+        "completo": False,
+        "filas": db.execute(sql_cambiados, parametros).all(),
+        "eliminados": db.execute(sql_eliminados, parametros).scalars().all(),
+    }
+
+
+def aplicar_cambios(copia: dict, cambios: dict, clave: str = "id", valor=lambda fila: fila) -> dict:
+    """
+    Aplica el resultado de leer_cambios a una copia en memoria (id -> valor)
+    y la devuelve; con 'completo' la reemplaza. 'clave' es el nombre de la
+    columna id y 'valor' arma lo que se guarda de cada fila.
+    """
+    if cambios["completo"]:
+        copia = {}
+    for fila in cambios["filas"]:
+        copia[getattr(fila, clave)] = valor(fila)
+    for id_eliminado in cambios["eliminados"]:
+        copia.pop(id_eliminado, None)
+    return copia
@@ -0,0 +1,187 @@
+# comun/db.py
+#
+# Engine de SQLAlchemy con el pool configurado igual en todos los servicios.
+# Cada proceso (worker de gunicorn, proceso del pool de reportes) tiene su
+# propio pool, así que el máximo de conexiones por servicio es
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW): hay que tenerlo en cuenta
+# frente al max_connections de PostgreSQL.
+#
+# El engine queda instrumentado (comun/metricas.py): espera para obtener una
+# conexión del pool, conexiones en uso, y duración de cada sentencia. Las
+# sentencias se miden en el cursor de psycopg2, así que también cuentan las
+# que se ejecutan sobre engine.raw_connection() (pacientes).
+
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from comun.metricas import CONSULTA_SEGUNDOS, POOL_CONEXIONES_EN_USO, POOL_ESPERA_SEGUNDOS, POOL_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Segundos esperando una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Las conexiones más viejas que esto se reabren (firewalls / pgbouncer que
+# cortan conexiones inactivas)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Tiempo máximo de una sentencia en milisegundos (0: sin límite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def url_desde_entorno() -> str:
+    """DATABASE_URL, o la URL armada con POSTGRES_* (como lo hacían pacientes e inventario)."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    return (
+        f"postgresql://{os.getenv('POSTGRES_USER', 'admin')}:"
+        f"{os.getenv('POSTGRES_PASSWORD', 'admin')}@"
+        f"{os.getenv('POSTGRES_HOST', 'postgres')}/"
+        f"{os.getenv('POSTGRES_DB', 'farmacia')}"
+    )
+
+
+# --- MÉTRICAS ---
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout (y cuántos agotan el timeout)."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_ESPERA_SEGUNDOS.observe(time.perf_counter() - inicio)
+
+
+OPERACIONES = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY", "CREATE", "ALTER", "DROP"}
+
+
+def _operacion(sentencia) -> str:
+    # Primera palabra de la sentencia (SELECT, INSERT, WITH...), para no
+    # crear una serie por cada texto SQL distinto
+    if isinstance(sentencia, bytes):
+        sentencia = sentencia[:32].decode("utf-8", "ignore")
+    if not isinstance(sentencia, str):
+        return "OTRA"
+    partes = sentencia[:32].split(None, 1)
+    operacion = partes[0].upper() if partes else ""
+    return operacion if operacion in OPERACIONES else "OTRA"
+
+
+_CursorMedido = None
+
+
+def cursor_medido():
+    """Clase de cursor de psycopg2 que registra la duración de cada execute."""
+    global _CursorMedido
+    if _CursorMedido is None:
+        import psycopg2.extensions
+
+        class CursorMedido(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                inicio = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    CONSULTA_SEGUNDOS.labels(_operacion(query)).observe(time.perf_counter() - inicio)
+
+            def executemany(self, query, vars_list):
+                inicio = time.perf_counter()
+                try:
+                    return super().executemany(query, vars_list)
+                finally:
+                    CONSULTA_SEGUNDOS.labels(_operacion(query)).observe(time.perf_counter() - inicio)
+
+        _CursorMedido = CursorMedido
+    return _CursorMedido
+
+
+def _medir_conexiones_en_uso(engine):
+    # El evento checkin se dispara antes de que el pool descuente la
+    # conexión, por eso se lleva la cuenta aquí y no con pool.checkedout()
+    event.listen(engine, "checkout", lambda *_: POOL_CONEXIONES_EN_USO.inc())
+    event.listen(engine, "checkin", lambda *_: POOL_CONEXIONES_EN_USO.dec())
+
+
+# --- ENGINE ---
+
+def crear_engine(url: Optional[str] = None, nombre_aplicacion: Optional[str] = None, **opciones):
+    """
+    Engine con pool acotado y pre_ping (una conexión caída se reemplaza en
+    vez de fallar la petición). 'nombre_aplicacion' aparece en
+    pg_stat_activity para saber qué servicio tiene cada conexión.
+    """
+    url = url or url_desde_entorno()
+    connect_args = dict(opciones.pop("connect_args", {}))
+    if nombre_aplicacion:
+        connect_args.setdefault("application_name", nombre_aplicacion)
+    if DB_STATEMENT_TIMEOUT_MS:
+        connect_args.setdefault("options", f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}")
+    if make_url(url).get_driver_name() == "psycopg2":
+        connect_args.setdefault("cursor_factory", cursor_medido())
+    configuracion = {
+        "poolclass": PoolMedido,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "connect_args": connect_args,
+    }
+    configuracion.update(opciones)
+    engine = create_engine(url, **configuracion)
+    _medir_conexiones_en_uso(engine)
+    # Con preload (gunicorn) el engine se crea en el master: cada worker
+    # descarta las conexiones heredadas sin cerrarlas (siguen siendo del master)
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+    return engine
+
+
+def calentar_pool(engine, conexiones: int = 1):
+    """
+    Abre 'conexiones' conexiones del pool en un hilo aparte y las devuelve al
+    pool, para que la primera petición no pague la conexión. No bloquea el
+    arranque: si la base aún no responde se registra y /listo lo informa.
+    """
+    def calentar():
+        abiertas = []
+        try:
+            for _ in range(conexiones):
+                conexion = engine.connect()
+                abiertas.append(conexion)
+                conexion.exec_driver_sql("SELECT 1")
+        except Exception as e:
+            logger.warning(f"No se pudo calentar el pool de conexiones: {e}")
+        finally:
+            for conexion in abiertas:
+                conexion.close()
+
+    threading.Thread(target=calentar, name="calentar-pool", daemon=True).start()
+
+
+def crear_sesiones(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def dependencia_db(SessionLocal):
+    """Devuelve un get_db() para Depends que abre y cierra una sesión por petición."""
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    return get_db
@@ -0,0 +1,71 @@
+# comun/gunicorn_conf.py
+#
+# Configuración de gunicorn compartida por todos los servicios:
+#
+#     gunicorn -c python:comun.gunicorn_conf app.main:app
+#
+# Workers de uvicorn (uno por CPU disponible para el contenedor), keep-alive
+# más largo que el de nginx hacia los servicios (para que nginx no reutilice
+# una conexión que el worker ya cerró), reciclado de workers cada
+# GUNICORN_MAX_REQUESTS peticiones (con jitter, para que no reinicien todos a
+# la vez) y preload: la app se importa una vez en el master y los workers la
+# heredan con fork, lo que acelera el arranque y comparte memoria.
+#
+# Con preload todo lo que se abre al importar queda en el master: los pools
+# de SQLAlchemy se descartan en cada worker (comun/db.py) y los hilos (Kafka,
+# roles) se inician en el lifespan de cada worker, nunca al importar.
+#
+# Con PROMETHEUS_MULTIPROC_DIR el directorio se vacía al arrancar y se marcan
+# como muertos los workers que terminan (comun/metricas.py).
+
+import glob
+import os
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Tiene que existir antes de importar la app (preload crea ahí las métricas del master)
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def _cpus_disponibles() -> int:
+    # Límite de CPU del contenedor (cgroup v2, 'cpu.max' = "cuota periodo"),
+    # si no las CPUs en las que puede correr el proceso
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as archivo:
+            cuota, periodo = archivo.read().split()
+        if cuota != "max":
+            return max(1, int(int(cuota) / int(periodo)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "0")) or _cpus_disponibles()
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+# El heartbeat de los workers va a memoria, no al disco del contenedor
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+
+
+def on_starting(server):
+    # Archivos de métricas de una ejecución anterior
+    if PROMETHEUS_MULTIPROC_DIR:
+        for archivo in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(archivo)
+
+
+def child_exit(server, worker):
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
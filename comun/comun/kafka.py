@@ -0,0 +1,171 @@
+# comun/kafka.py
+#
+# Publicador de eventos compartido. publicar() solo deja el mensaje en una
+# cola en memoria y vuelve al momento: la petición HTTP no espera a Kafka.
+# Un hilo por proceso toma los mensajes, los entrega al KafkaProducer (que
+# los agrupa por partición durante KAFKA_LINGER_MS) y reintenta la conexión
+# si Kafka no está disponible, sin bloquear el arranque del servicio.
+#
+# Es de "mejor esfuerzo", igual que los productores que reemplaza: si la
+# cola se llena (KAFKA_COLA_MAXIMA) o el proceso muere antes de enviar, el
+# mensaje se pierde y queda en el log. cerrar() (al apagar el servicio)
+# espera a que se envíe lo pendiente.
+#
+# Métricas (comun/metricas.py): latencia desde publicar() hasta el ack del
+# broker, eventos descartados o fallidos, tamaño de la cola y, con
+# MedidorLag, el lag de los consumidores.
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from comun.metricas import (
+    KAFKA_COLA_PENDIENTES, KAFKA_CONSUMIDOR_LAG, KAFKA_PUBLICACION_ERRORES, KAFKA_PUBLICACION_SEGUNDOS,
+)
+
+logger = logging.getLogger(__name__)
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "10"))
+KAFKA_COLA_MAXIMA = int(os.getenv("KAFKA_COLA_MAXIMA", "10000"))
+KAFKA_REINTENTO_SEGUNDOS = float(os.getenv("KAFKA_REINTENTO_SEGUNDOS", "5"))
+# Cada cuánto los consumidores recalculan su lag
+KAFKA_LAG_CADA_SEGUNDOS = float(os.getenv("KAFKA_LAG_CADA_SEGUNDOS", "5"))
+
+_FIN = object()
+
+
+class PublicadorKafka:
+    def __init__(self, client_id: str, bootstrap_servers: str = KAFKA_BOOTSTRAP_SERVERS,
+                 cola_maxima: int = KAFKA_COLA_MAXIMA):
+        self.client_id = client_id
+        self.bootstrap_servers = bootstrap_servers
+        self._cola_maxima = cola_maxima
+        self._reiniciar()
+        # El hilo y el productor no sobreviven a un fork (workers con preload)
+        os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._cola = queue.Queue(maxsize=self._cola_maxima)
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._producer = None
+
+    @property
+    def conectado(self) -> bool:
+        return self._producer is not None
+
+    def publicar(self, topic: str, mensaje: dict, clave: Optional[str] = None):
+        """Encola el mensaje para enviarlo en segundo plano."""
+        self.iniciar()
+        try:
+            self._cola.put_nowait((topic, mensaje, clave, time.perf_counter()))
+        except queue.Full:
+            KAFKA_PUBLICACION_ERRORES.labels(topic, "cola_llena").inc()
+            logger.error(f"Cola de Kafka llena, se descarta el evento para '{topic}': {mensaje}")
+        KAFKA_COLA_PENDIENTES.set(self._cola.qsize())
+
+    def iniciar(self):
+        """
+        Inicia el hilo de envío, que conecta con Kafka en segundo plano. Lo
+        llama el arranque (lifespan) de cada servicio para que la primera
+        publicación no espere la conexión; publicar() lo hace si no se llamó.
+        """
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._enviar, name=f"kafka-{self.client_id}", daemon=True)
+                self._hilo.start()
+
+    def _conectar(self):
+        from kafka import KafkaProducer
+
+        while self._producer is None:
+            try:
+                self._producer = KafkaProducer(
+                    bootstrap_servers=self.bootstrap_servers,
+                    value_serializer=lambda m: json.dumps(m, default=str).encode("utf-8"),
+                    key_serializer=lambda k: k.encode("utf-8") if k is not None else None,
+                    client_id=self.client_id,
+                    linger_ms=KAFKA_LINGER_MS,
+                    acks=1,
+                    api_version=(2, 8, 1),
+                )
+                logger.info(f"KafkaProducer '{self.client_id}' conectado a {self.bootstrap_servers}.")
+            except Exception as e:
+                logger.warning(f"No se pudo conectar KafkaProducer '{self.client_id}', se reintenta en {KAFKA_REINTENTO_SEGUNDOS}s: {e}")
+                time.sleep(KAFKA_REINTENTO_SEGUNDOS)
+
+    def _enviar(self):
+        self._conectar()
+        while True:
+            elemento = self._cola.get()
+            if elemento is _FIN:
+                self._producer.flush()
+                self._cola.task_done()
+                return
+            topic, mensaje, clave, encolado = elemento
+            try:
+                futuro = self._producer.send(topic, value=mensaje, key=clave)
+                futuro.add_callback(lambda _, topic=topic, encolado=encolado: _confirmado(topic, encolado))
+                futuro.add_errback(lambda e, topic=topic: _error_de_envio(topic, e))
+            except Exception as e:
+                _error_de_envio(topic, e, mensaje)
+            finally:
+                self._cola.task_done()
+                KAFKA_COLA_PENDIENTES.set(self._cola.qsize())
+
+    def cerrar(self, timeout: float = 10):
+        """Envía lo pendiente (hasta 'timeout' segundos) y detiene el hilo."""
+        if self._hilo is None:
+            return
+        try:
+            self._cola.put(_FIN, timeout=timeout)
+        except queue.Full:
+            return
+        self._hilo.join(timeout)
+        self._hilo = None
+
+
+def _confirmado(topic: str, encolado: float):
+    KAFKA_PUBLICACION_SEGUNDOS.labels(topic).observe(time.perf_counter() - encolado)
+
+
+def _error_de_envio(topic: str, error, mensaje: Optional[dict] = None):
+    KAFKA_PUBLICACION_ERRORES.labels(topic, "envio").inc()
+    detalle = f". Mensaje: {mensaje}" if mensaje is not None else ""
+    logger.error(f"Error al enviar evento a '{topic}': {error}{detalle}")
+
+
+class MedidorLag:
+    """
+    Publica kafka_consumidor_lag (último offset de cada partición asignada
+    menos la posición del consumidor). Se llama después de cada poll o
+    mensaje; recalcula como máximo cada KAFKA_LAG_CADA_SEGUNDOS.
+    """
+
+    def __init__(self, grupo: str, cada_segundos: float = KAFKA_LAG_CADA_SEGUNDOS):
+        self.grupo = grupo
+        self.cada_segundos = cada_segundos
+        self._ultimo = 0.0
+
+    def actualizar(self, consumer):
+        ahora = time.monotonic()
+        if ahora - self._ultimo < self.cada_segundos:
+            return
+        self._ultimo = ahora
+        for particion in consumer.assignment():
+            # highwater() sale de la última respuesta de fetch: no consulta al broker
+            final = consumer.highwater(particion)
+            if final is None:
+                continue
+            try:
+                posicion = consumer.position(particion)
+            except Exception:
+                continue
+            KAFKA_CONSUMIDOR_LAG.labels(self.grupo, particion.topic, str(particion.partition)).set(max(final - posicion, 0))
@@ -0,0 +1,190 @@
+# comun/metricas.py
+#
+# Métricas de Prometheus de cada servicio, expuestas en GET /metrics:
+#
+#   http_peticion_segundos{metodo,ruta,estado}   latencia por plantilla de ruta
+#   http_peticiones_en_curso                     peticiones atendiéndose ahora
+#   db_pool_espera_segundos                      espera para obtener una conexión
+#   db_pool_conexiones_en_uso / db_pool_timeouts_total
+#   db_consulta_segundos{operacion}              duración de cada sentencia
+#   kafka_publicacion_segundos{topic}            desde publicar() hasta el ack
+#   kafka_publicacion_errores_total{topic,motivo} / kafka_cola_pendientes
+#   kafka_consumidor_lag{grupo,topic,particion}  mensajes sin leer
+#   cache_consultas_total{cache,resultado}       aciertos / fallos de cada caché
+#   sse_conexiones{canal}                        clientes conectados a cada stream
+#   sse_eventos_total{canal} / sse_desbordes_total{canal}
+#
+# Las rutas se agrupan por su plantilla ('/api/pacientes/{id_paciente}'), no
+# por la URL concreta, para que la cantidad de series no crezca con los ids.
+#
+# Con varios workers (gunicorn) hay que definir PROMETHEUS_MULTIPROC_DIR (un
+# directorio vacío al arrancar): cada proceso escribe ahí sus valores y
+# /metrics devuelve la suma de todos, sin importar qué worker atienda el
+# scrape.
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from starlette.routing import Match
+
+# Límites superiores (segundos) de los tramos de los histogramas de latencia
+TRAMOS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Las consultas y la espera del pool suelen estar muy por debajo de 5 ms
+TRAMOS_BASE_DE_DATOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+# --- HTTP ---
+
+PETICION_SEGUNDOS = Histogram(
+    "http_peticion_segundos", "Latencia de las peticiones HTTP por ruta",
+    ["metodo", "ruta", "estado"], buckets=TRAMOS_LATENCIA,
+)
+PETICIONES_EN_CURSO = Gauge(
+    "http_peticiones_en_curso", "Peticiones HTTP atendiéndose en este momento",
+    multiprocess_mode="livesum",
+)
+
+# --- BASE DE DATOS (ver comun/db.py) ---
+
+POOL_ESPERA_SEGUNDOS = Histogram(
+    "db_pool_espera_segundos", "Tiempo hasta obtener una conexión del pool (incluye abrirla)",
+    buckets=TRAMOS_BASE_DE_DATOS,
+)
+POOL_CONEXIONES_EN_USO = Gauge(
+    "db_pool_conexiones_en_uso", "Conexiones del pool prestadas en este momento",
+    multiprocess_mode="livesum",
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts", "Peticiones que no obtuvieron conexión en DB_POOL_TIMEOUT",
+)
+CONSULTA_SEGUNDOS = Histogram(
+    "db_consulta_segundos", "Duración de las sentencias SQL por tipo",
+    ["operacion"], buckets=TRAMOS_BASE_DE_DATOS,
+)
+
+# --- KAFKA (ver comun/kafka.py) ---
+
+KAFKA_PUBLICACION_SEGUNDOS = Histogram(
+    "kafka_publicacion_segundos", "Tiempo desde publicar() hasta la confirmación del broker",
+    ["topic"], buckets=TRAMOS_LATENCIA,
+)
+KAFKA_PUBLICACION_ERRORES = Counter(
+    "kafka_publicacion_errores", "Eventos que no se pudieron enviar",
+    ["topic", "motivo"],
+)
+KAFKA_COLA_PENDIENTES = Gauge(
+    "kafka_cola_pendientes", "Eventos en la cola del publicador esperando envío",
+    multiprocess_mode="livesum",
+)
+KAFKA_CONSUMIDOR_LAG = Gauge(
+    "kafka_consumidor_lag", "Mensajes publicados que el consumidor todavía no leyó",
+    ["grupo", "topic", "particion"], multiprocess_mode="livemax",
+)
+
+# --- CACHÉS (tokens de Auth0, JWKS, roles) ---
+
+CACHE_CONSULTAS = Counter(
+    "cache_consultas", "Consultas a los cachés en memoria",
+    ["cache", "resultado"],
+)
+
+
+def registrar_cache(cache: str, acierto: bool):
+    CACHE_CONSULTAS.labels(cache, "acierto" if acierto else "fallo").inc()
+
+# --- STREAMS DE EVENTOS (ver comun/sse.py) ---
+
+SSE_CONEXIONES = Gauge(
+    "sse_conexiones", "Clientes conectados a cada stream de eventos",
+    ["canal"], multiprocess_mode="livesum",
+)
+SSE_EVENTOS = Counter(
+    "sse_eventos", "Eventos (ya agrupados) enviados por cada stream",
+    ["canal"],
+)
+SSE_DESBORDES = Counter(
+    "sse_desbordes", "Veces que un cliente lento perdió sus eventos pendientes y debió resincronizar",
+    ["canal"],
+)
+
+
+# --- MIDDLEWARE ---
+
+# Rutas que no se miden (las consultan los chequeos de salud y el scraper)
+RUTAS_EXCLUIDAS = {"/salud", "/listo", "/metrics"}
+# Los streams de eventos duran lo que dure la conexión: su duración no es
+# latencia y se mide aparte (sse_conexiones)
+TIPO_STREAM = b"text/event-stream"
+
+
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        estado = {"codigo": 500, "stream": False}
+
+        async def send_con_estado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+                estado["stream"] = any(
+                    nombre == b"content-type" and valor.startswith(TIPO_STREAM)
+                    for nombre, valor in mensaje.get("headers", [])
+                )
+            await send(mensaje)
+
+        PETICIONES_EN_CURSO.inc()
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            PETICIONES_EN_CURSO.dec()
+            ruta = _plantilla_de_ruta(scope)
+            if ruta not in RUTAS_EXCLUIDAS and not estado["stream"]:
+                PETICION_SEGUNDOS.labels(scope["method"], ruta, str(estado["codigo"])).observe(time.perf_counter() - inicio)
+
+
+def _plantilla_de_ruta(scope) -> str:
+    # Las versiones recientes de FastAPI no copian las rutas de un router
+    # incluido: scope["route"] trae la ruta sin el prefijo y la plantilla
+    # completa queda en el contexto efectivo.
+    contexto = (scope.get("fastapi") or {}).get("effective_route_context")
+    if contexto is not None and getattr(contexto, "path", None):
+        return contexto.path
+    ruta = scope.get("route")
+    if ruta is not None and hasattr(ruta, "path"):
+        return ruta.path
+    # Versiones de Starlette que no dejan la ruta en el scope
+    aplicacion = scope.get("app")
+    for candidata in getattr(aplicacion, "routes", []):
+        coincide, _ = candidata.matches(scope)
+        if coincide == Match.FULL:
+            return getattr(candidata, "path", scope["path"])
+    return "(sin ruta)"
+
+
+def exportar() -> bytes:
+    """Texto de /metrics: el registro del proceso o, con PROMETHEUS_MULTIPROC_DIR, el de todos los workers."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return generate_latest(registro)
+    return generate_latest(REGISTRY)
+
+
+def instalar_metricas(app):
+    """Agrega el middleware y GET /metrics a una app de FastAPI."""
+    from fastapi.responses import Response
+
+    app.add_middleware(MiddlewareMetricas)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(exportar(), media_type=CONTENT_TYPE_LATEST)
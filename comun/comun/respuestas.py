@@ -0,0 +1,103 @@
+# comun/respuestas.py
+#
+# Serialización y compresión de respuestas compartidas por los servicios.
+#
+# RespuestaJSON serializa con orjson. Es para las rutas de solo lectura que
+# devuelven listas grandes armadas directo desde las filas de la base, sin
+# construir un modelo de Pydantic por fila (la ruta conserva su
+# response_model para la documentación; FastAPI no valida una Response que
+# ya viene armada). No se usa como default_response_class de las apps: con
+# response_model FastAPI ya serializa a JSON con el núcleo de Pydantic, y una
+# clase por defecto propia desactiva ese camino.
+#
+# instalar_compresion(app) comprime las respuestas de COMPRESION_MINIMO_BYTES
+# o más: brotli si el cliente lo acepta y brotli-asgi está instalado (extra
+# 'compresion' de comun), si no gzip. Las respuestas más chicas van sin
+# comprimir: el ahorro no compensa el CPU.
+#
+# respuesta_json_cacheable agrega ETag (hash del cuerpo) y Cache-Control, y
+# responde 304 sin cuerpo si el If-None-Match coincide: lo usa el catálogo de
+# inventario, que nginx guarda unos segundos en su micro-caché
+# (frontend/nginx.conf) y revalida con el ETag.
+
+import hashlib
+import os
+from decimal import Decimal
+from typing import Iterable, List, Sequence
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # Extra 'compresion' no instalado: solo gzip
+    BrotliMiddleware = None
+
+COMPRESION_MINIMO_BYTES = int(os.getenv("COMPRESION_MINIMO_BYTES", "1024"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+# 4-5 es el punto donde brotli comprime más que gzip -6 sin costar más CPU
+COMPRESION_CALIDAD_BROTLI = int(os.getenv("COMPRESION_CALIDAD_BROTLI", "4"))
+
+
+def _por_defecto(valor):
+    # Tipos que orjson no conoce: NUMERIC de PostgreSQL y modelos anidados
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, "model_dump"):
+        return valor.model_dump(mode="json")
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+
+def a_json(contenido) -> bytes:
+    """JSON con orjson. Fechas y datetimes en ISO 8601 igual que con Pydantic (UTC como 'Z')."""
+    return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+class RespuestaJSON(JSONResponse):
+    """JSONResponse serializada con a_json (orjson)."""
+
+    def render(self, content) -> bytes:
+        return a_json(content)
+
+
+def _etag_coincide(si_no_coincide: str, etag: str) -> bool:
+    # Comparación débil (RFC 9110): se ignora el prefijo W/
+    if si_no_coincide.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (e.strip().removeprefix("W/") for e in si_no_coincide.split(","))
+
+
+def respuesta_json_cacheable(request, contenido, cache_control: str) -> Response:
+    """
+    RespuestaJSON con ETag débil (el cuerpo comprimido no es idéntico byte a
+    byte) y el Cache-Control indicado; 304 si el cliente ya tiene esa versión.
+    """
+    respuesta = RespuestaJSON(contenido)
+    etag = f'W/"{hashlib.blake2b(respuesta.body, digest_size=16).hexdigest()}"'
+    cabeceras = {"ETag": etag, "Cache-Control": cache_control}
+    si_no_coincide = request.headers.get("if-none-match")
+    if si_no_coincide and _etag_coincide(si_no_coincide, etag):
+        return Response(status_code=304, headers=cabeceras)
+    respuesta.headers.update(cabeceras)
+    return respuesta
+
+
+def filas_como_dicts(columnas: Sequence[str], filas: Iterable[Sequence]) -> List[dict]:
+    """Filas de un cursor (tuplas) como dicts columna -> valor, listas para RespuestaJSON."""
+    return [dict(zip(columnas, fila)) for fila in filas]
+
+
+def instalar_compresion(app, minimo_bytes: int = COMPRESION_MINIMO_BYTES, excluir: Sequence[str] = ()):
+    """
+    Comprime con brotli o gzip (según Accept-Encoding) las respuestas de
+    'minimo_bytes' o más. 'excluir': expresiones regulares de rutas que van
+    sin comprimir (streams de eventos, ver comun/sse.py).
+    """
+    if BrotliMiddleware is not None:
+        # Con gzip_fallback los clientes sin brotli reciben gzip
+        app.add_middleware(BrotliMiddleware, quality=COMPRESION_CALIDAD_BROTLI,
+                           minimum_size=minimo_bytes, gzip_fallback=True, excluded_handlers=list(excluir))
+    else:
+        # GZipMiddleware ya deja pasar sin comprimir los text/event-stream
+        app.add_middleware(GZipMiddleware, minimum_size=minimo_bytes, compresslevel=COMPRESION_NIVEL_GZIP)
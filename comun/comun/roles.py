@@ -0,0 +1,232 @@
+# comun/roles.py
+#
+# Caché de roles de usuario compartido por los servicios. El dueño de los
+# roles es el servicio de usuarios; los demás los consultan aquí:
+#
+#   - Un rol se busca la primera vez (o al expirar, ROLES_CACHE_TTL_SEGUNDOS)
+#     con GET {USUARIOS_URL}/interno/roles/{user_id}. En el caso común la
+#     respuesta sale de memoria, sin salto de red.
+#   - usuarios publica cada cambio de rol o eliminación en el topic
+#     'usuarios-roles'; escuchar_cambios() aplica esos eventos al caché de
+#     este proceso al momento, así que el TTL solo acota el desfase si Kafka
+#     no está disponible.
+#   - Si usuarios no responde se sigue usando el último rol conocido aunque
+#     haya expirado; sin ninguno se lanza RolesNoDisponibles.
+#
+# El mismo caché lo usa usuarios con cargar= leyendo de su base.
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from comun.metricas import registrar_cache
+
+logger = logging.getLogger(__name__)
+
+USUARIOS_URL = os.getenv("USUARIOS_URL", "http://usuarios:8000")
+ROLES_API_TOKEN = os.getenv("ROLES_API_TOKEN", "")
+ROLES_CACHE_TTL_SEGUNDOS = float(os.getenv("ROLES_CACHE_TTL_SEGUNDOS", "60"))
+ROLES_CACHE_USUARIOS = int(os.getenv("ROLES_CACHE_USUARIOS", "10000"))
+ROLES_TIMEOUT_SEGUNDOS = float(os.getenv("ROLES_TIMEOUT_SEGUNDOS", "2"))
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+TOPIC_ROLES = "usuarios-roles"
+
+# Cabecera con la que los servicios se identifican ante /interno/roles
+CABECERA_TOKEN = "X-Token-Servicio"
+
+
+class RolesNoDisponibles(Exception):
+    """No se pudo conocer el rol: usuarios no responde y no hay nada en caché."""
+
+
+class ClienteRoles:
+    def __init__(self, cargar: Optional[Callable[[str], Optional[str]]] = None,
+                 url_usuarios: str = USUARIOS_URL,
+                 ttl_segundos: float = ROLES_CACHE_TTL_SEGUNDOS,
+                 max_usuarios: int = ROLES_CACHE_USUARIOS):
+        # cargar(user_id) devuelve el rol o None si el usuario no existe
+        self._cargar = cargar or self._cargar_por_http
+        self.url_usuarios = url_usuarios.rstrip("/")
+        self.ttl_segundos = ttl_segundos
+        self.max_usuarios = max_usuarios
+        self._lock = threading.Lock()
+        # user_id -> (rol o None, instante de carga)
+        self._entradas = OrderedDict()
+        # Aumenta con cada evento recibido; una carga que se cruzó con un
+        # evento no se guarda (podría traer el rol anterior).
+        self._cambios = 0
+        # user_id -> hora (time.time()) del último cambio de rol recibido
+        self._ultimo_cambio = OrderedDict()
+        self._http = None
+        self._escuchando = False
+
+    # --- CONSULTA ---
+
+    def rol_de(self, user_id: str) -> Optional[str]:
+        """Rol del usuario, o None si no está registrado en usuarios."""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada is not None and ahora - entrada[1] < self.ttl_segundos:
+                self._entradas.move_to_end(user_id)
+                registrar_cache("roles", True)
+                return entrada[0]
+            cambios = self._cambios
+        registrar_cache("roles", False)
+
+        try:
+            rol = self._cargar(user_id)
+        except Exception as e:
+            if entrada is not None:
+                logger.warning(f"No se pudo refrescar el rol de {user_id}, se usa el último conocido: {e}")
+                return entrada[0]
+            raise RolesNoDisponibles(f"No se pudo obtener el rol de {user_id}: {e}") from e
+
+        with self._lock:
+            if cambios == self._cambios:
+                self._guardar(user_id, rol, ahora)
+        return rol
+
+    def vigente(self, user_id: str) -> Optional[str]:
+        """Rol en caché si la entrada no expiró; None si no hay (no consulta)."""
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada is not None and time.monotonic() - entrada[1] < self.ttl_segundos:
+                self._entradas.move_to_end(user_id)
+                registrar_cache("roles", True)
+                return entrada[0]
+        registrar_cache("roles", False)
+        return None
+
+    def recordar(self, user_id: str, rol: Optional[str]):
+        """Guarda un rol recién leído por el propio servicio (no es un cambio)."""
+        with self._lock:
+            self._guardar(user_id, rol, time.monotonic())
+
+    def tiene_rol(self, user_id: str, *roles: str) -> bool:
+        return user_id is not None and self.rol_de(user_id) in roles
+
+    def _guardar(self, user_id: str, rol: Optional[str], instante: float):
+        self._entradas[user_id] = (rol, instante)
+        self._entradas.move_to_end(user_id)
+        while len(self._entradas) > self.max_usuarios:
+            self._entradas.popitem(last=False)
+
+    def _cargar_por_http(self, user_id: str) -> Optional[str]:
+        import httpx
+
+        if self._http is None:
+            headers = {CABECERA_TOKEN: ROLES_API_TOKEN} if ROLES_API_TOKEN else {}
+            self._http = httpx.Client(base_url=self.url_usuarios, headers=headers, timeout=ROLES_TIMEOUT_SEGUNDOS)
+        respuesta = self._http.get(f"/interno/roles/{user_id}")
+        if respuesta.status_code == 404:
+            return None
+        respuesta.raise_for_status()
+        return respuesta.json()["rol"]
+
+    # --- INVALIDACIÓN ---
+
+    def aplicar_cambio(self, user_id: str, rol: Optional[str]):
+        """Registra el rol nuevo (None si el usuario se eliminó)."""
+        with self._lock:
+            self._cambios += 1
+            self._guardar(user_id, rol, time.monotonic())
+            self._ultimo_cambio[user_id] = time.time()
+            self._ultimo_cambio.move_to_end(user_id)
+            while len(self._ultimo_cambio) > self.max_usuarios:
+                self._ultimo_cambio.popitem(last=False)
+
+    def cambio_posterior_a(self, user_id: str, instante: float) -> bool:
+        """True si el rol del usuario cambió en o después de 'instante' (epoch)."""
+        with self._lock:
+            cambio = self._ultimo_cambio.get(user_id)
+        return cambio is not None and cambio >= instante
+
+    def invalidar(self, user_id: Optional[str] = None):
+        """Olvida un usuario, o todo el caché si no se indica ninguno."""
+        with self._lock:
+            self._cambios += 1
+            if user_id is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(user_id, None)
+
+    def procesar_evento(self, evento: dict):
+        accion = evento.get("accion")
+        if accion == "ROL_ACTUALIZADO":
+            self.aplicar_cambio(evento["user_id"], evento["rol"])
+        elif accion == "USUARIO_ELIMINADO":
+            self.aplicar_cambio(evento["user_id"], None)
+
+    def escuchar_cambios(self, bootstrap_servers: str = KAFKA_BOOTSTRAP_SERVERS):
+        """
+        Inicia (una sola vez) un hilo que aplica los eventos de 'usuarios-roles'.
+        Cada proceso lee el topic completo (sin group_id) desde el final: lo
+        anterior ya lo cubre el TTL.
+        """
+        with self._lock:
+            if self._escuchando:
+                return
+            self._escuchando = True
+        hilo = threading.Thread(target=self._consumir, args=(bootstrap_servers,), daemon=True)
+        hilo.start()
+
+    def _consumir(self, bootstrap_servers: str):
+        from kafka import KafkaConsumer
+        from comun.kafka import MedidorLag
+
+        lag = MedidorLag(TOPIC_ROLES)
+
+        while True:
+            try:
+                consumer = KafkaConsumer(
+                    TOPIC_ROLES,
+                    bootstrap_servers=bootstrap_servers,
+                    value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+                    group_id=None,
+                    auto_offset_reset="latest",
+                )
+                # Lo que cambió mientras no se escuchaba se vuelve a pedir
+                self.invalidar()
+                logger.info(f"Escuchando cambios de roles en '{TOPIC_ROLES}'.")
+                for message in consumer:
+                    self.procesar_evento(message.value)
+                    lag.actualizar(consumer)
+            except Exception as e:
+                logger.error(f"Consumidor de '{TOPIC_ROLES}' detenido, se reintenta: {e}")
+                time.sleep(5)
+
+
+# --- PUBLICACIÓN (la usa el servicio de usuarios) ---
+
+_publicador = None
+
+
+def publicar_cambio_rol(user_id: str, rol: Optional[str]):
+    """Avisa a todos los servicios del rol nuevo de un usuario (None: eliminado)."""
+    global _publicador
+    from comun.kafka import PublicadorKafka
+
+    if _publicador is None:
+        _publicador = PublicadorKafka("usuarios-roles-producer")
+    if rol is None:
+        evento = {"accion": "USUARIO_ELIMINADO", "user_id": user_id}
+    else:
+        evento = {"accion": "ROL_ACTUALIZADO", "user_id": user_id, "rol": rol}
+    # Clave = user_id: los cambios de un mismo usuario llegan en orden.
+    # Si el evento se pierde, los demás servicios lo ven al expirar el TTL.
+    _publicador.publicar(TOPIC_ROLES, evento, clave=user_id)
+
+
+# --- CLIENTE POR DEFECTO ---
+
+cliente_roles = ClienteRoles()
+
+
+def user_has_role(user_id: str, *roles: str) -> bool:
+    """True si el rol del usuario es alguno de 'roles' (consulta el caché)."""
+    return cliente_roles.tiene_rol(user_id, *roles)
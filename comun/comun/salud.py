@@ -0,0 +1,60 @@
+# comun/salud.py
+#
+# Endpoints de salud para docker compose / balanceadores:
+#   GET /salud  -> el proceso responde (liveness). No toca dependencias.
+#   GET /listo  -> puede atender peticiones (readiness): ejecuta cada
+#                  comprobación registrada (p. ej. SELECT 1) y responde 503
+#                  si alguna falla. Con 'publicador' informa además si el
+#                  productor de Kafka ya conectó, sin afectar el estado: la
+#                  publicación es de mejor esfuerzo (comun/kafka.py) y el
+#                  servicio atiende igual mientras conecta.
+
+import logging
+from typing import Callable, Dict, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def comprobar_base_de_datos(engine) -> Callable[[], None]:
+    def comprobar():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    return comprobar
+
+
+def instalar_salud(app, engine=None, comprobaciones: Optional[Dict[str, Callable[[], None]]] = None,
+                   publicador=None):
+    """
+    Agrega /salud y /listo. 'comprobaciones' son funciones sin argumentos
+    que lanzan una excepción si la dependencia no está disponible; con
+    'engine' se agrega la de la base de datos y con 'publicador' (un
+    PublicadorKafka) el estado de su conexión, solo informativo.
+    """
+    comprobaciones = dict(comprobaciones or {})
+    if engine is not None:
+        comprobaciones.setdefault("base_de_datos", comprobar_base_de_datos(engine))
+
+    @app.get("/salud", include_in_schema=False)
+    def salud():
+        return {"estado": "ok"}
+
+    # Función síncrona: FastAPI la ejecuta en el threadpool y las
+    # comprobaciones (bloqueantes) no frenan el event loop.
+    @app.get("/listo", include_in_schema=False)
+    def listo():
+        resultado = {}
+        for nombre, comprobar in comprobaciones.items():
+            try:
+                comprobar()
+                resultado[nombre] = "ok"
+            except Exception as e:
+                logger.warning(f"Comprobación '{nombre}' fallida: {e}")
+                resultado[nombre] = f"error: {e}"
+        listo = all(valor == "ok" for valor in resultado.values())
+        cuerpo = {"estado": "ok" if listo else "no_listo", "comprobaciones": resultado}
+        if publicador is not None:
+            cuerpo["kafka"] = "conectado" if publicador.conectado else "conectando"
+        return JSONResponse(cuerpo, status_code=200 if listo else 503)
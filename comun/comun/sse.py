@@ -0,0 +1,168 @@
+# comun/sse.py
+#
+# Streams de Server-Sent Events: los servicios empujan los cambios (stock,
+# ventas del día) a muchos clientes abiertos (cajas del POS, dashboards) en
+# lugar de que cada uno relea las listas cada pocos segundos.
+#
+# Un CanalSSE por tipo de evento y por proceso:
+#   - publicar(cambios) se llama desde cualquier hilo (p. ej. el consumidor
+#     de Kafka) con un dict clave -> estado. No espera a los clientes: solo
+#     mezcla los cambios en el lote pendiente, donde el último estado de cada
+#     clave reemplaza al anterior. Una ráfaga de ventas del mismo producto
+#     sale como un solo cambio.
+#   - Cada SSE_INTERVALO_SEGUNDOS, si hubo cambios, se arma UN evento, se
+#     serializa una vez y se deja en la cola de cada conexión.
+#   - Contrapresión por conexión: la cola guarda hasta SSE_COLA_MAXIMA
+#     eventos. Si un cliente no lee a tiempo (red lenta, pestaña dormida) se
+#     descartan sus eventos pendientes y recibe 'resincronizar': vuelve a
+#     pedir el estado por REST. La memoria por cliente queda acotada y los
+#     demás clientes no se enteran.
+#   - Un comentario de latido cada SSE_LATIDO_SEGUNDOS mantiene la conexión
+#     abierta a través de nginx y hace notar las desconexiones.
+#   - Hasta SSE_MAXIMO_CONEXIONES por proceso; después, 503.
+#
+# Las rutas de eventos van sin compresión (instalar_compresion(app,
+# excluir=...)) y nginx las pasa sin buffering (frontend/nginx.conf).
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from comun.metricas import SSE_CONEXIONES, SSE_DESBORDES, SSE_EVENTOS
+from comun.respuestas import a_json
+
+logger = logging.getLogger(__name__)
+
+SSE_INTERVALO_SEGUNDOS = float(os.getenv("SSE_INTERVALO_SEGUNDOS", "0.5"))
+SSE_COLA_MAXIMA = int(os.getenv("SSE_COLA_MAXIMA", "20"))
+SSE_LATIDO_SEGUNDOS = float(os.getenv("SSE_LATIDO_SEGUNDOS", "15"))
+SSE_MAXIMO_CONEXIONES = int(os.getenv("SSE_MAXIMO_CONEXIONES", "1000"))
+# Espera que el navegador usa antes de reconectar (campo 'retry')
+SSE_REINTENTO_MS = int(os.getenv("SSE_REINTENTO_MS", "3000"))
+
+RESINCRONIZAR = b"event: resincronizar\ndata: {}\n\n"
+LATIDO = b": latido\n\n"
+
+
+def evento_sse(evento: str, datos) -> bytes:
+    """Un evento en formato text/event-stream con 'datos' en JSON (una línea)."""
+    return b"event: " + evento.encode() + b"\ndata: " + a_json(datos) + b"\n\n"
+
+
+class CanalSSE:
+    """
+    'armar' recibe el lote de cambios agrupados (clave -> estado) y devuelve
+    los datos del evento; por defecto, la lista de estados.
+    """
+
+    def __init__(self, nombre: str, evento: str, armar: Callable[[dict], object] = lambda cambios: list(cambios.values()),
+                 intervalo: float = SSE_INTERVALO_SEGUNDOS, cola_maxima: int = SSE_COLA_MAXIMA,
+                 maximo_conexiones: int = SSE_MAXIMO_CONEXIONES):
+        self.nombre = nombre
+        self.evento = evento
+        self.intervalo = intervalo
+        self.cola_maxima = cola_maxima
+        self.maximo_conexiones = maximo_conexiones
+        self._armar = armar
+        self._lock = threading.Lock()
+        self._pendientes = {}
+        self._resincronizar = False
+        self._colas = set()
+        self._tarea = None
+
+    @property
+    def conexiones(self) -> int:
+        return len(self._colas)
+
+    def publicar(self, cambios: dict):
+        """Agrega cambios al próximo evento. Se puede llamar desde cualquier hilo."""
+        if not self._colas:
+            return  # Nadie escucha en este proceso
+        with self._lock:
+            self._pendientes.update(cambios)
+
+    def resincronizar(self):
+        """
+        Pide a todos los clientes que relean el estado (p. ej. el productor de
+        cambios se reconectó y pudo perder algunos). Desde cualquier hilo.
+        """
+        with self._lock:
+            self._resincronizar = True
+
+    async def _repartir(self):
+        # Una tarea por canal mientras haya conexiones
+        try:
+            while self._colas:
+                await asyncio.sleep(self.intervalo)
+                with self._lock:
+                    cambios, self._pendientes = self._pendientes, {}
+                    resincronizar, self._resincronizar = self._resincronizar, False
+                if resincronizar:
+                    # El estado completo que van a leer ya incluye 'cambios'
+                    for cola in list(self._colas):
+                        self._entregar(cola, RESINCRONIZAR)
+                    continue
+                if not cambios:
+                    continue
+                try:
+                    mensaje = evento_sse(self.evento, self._armar(cambios))
+                except Exception as e:
+                    logger.error(f"Error armando el evento del canal '{self.nombre}': {e}")
+                    continue
+                SSE_EVENTOS.labels(self.nombre).inc()
+                for cola in list(self._colas):
+                    self._entregar(cola, mensaje)
+        finally:
+            self._tarea = None
+
+    def _entregar(self, cola: asyncio.Queue, mensaje: bytes):
+        try:
+            cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo que tenía pendiente y se le pide
+            # que vuelva a leer el estado completo
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait(RESINCRONIZAR)
+            SSE_DESBORDES.labels(self.nombre).inc()
+
+    def respuesta(self, inicial: Optional[Callable[[], object]] = None) -> StreamingResponse:
+        """
+        StreamingResponse para la ruta de eventos. 'inicial' (opcional, se
+        ejecuta en el threadpool) da los datos del primer evento: el estado
+        actual, para que el cliente no tenga que pedirlo aparte.
+        """
+        if len(self._colas) >= self.maximo_conexiones:
+            raise HTTPException(status_code=503, detail="Demasiadas conexiones de eventos, reintente más tarde.",
+                                headers={"Retry-After": "30"})
+        return StreamingResponse(
+            self._eventos(inicial), media_type="text/event-stream",
+            # X-Accel-Buffering: nginx entrega cada evento apenas llega
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def _eventos(self, inicial):
+        cola = asyncio.Queue(maxsize=self.cola_maxima)
+        self._colas.add(cola)
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._repartir())
+        SSE_CONEXIONES.labels(self.nombre).inc()
+        try:
+            yield f"retry: {SSE_REINTENTO_MS}\n\n".encode()
+            if inicial is not None:
+                yield evento_sse(self.evento, await run_in_threadpool(inicial))
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), SSE_LATIDO_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    mensaje = LATIDO
+                yield mensaje
+        finally:
+            self._colas.discard(cola)
+            SSE_CONEXIONES.labels(self.nombre).dec()
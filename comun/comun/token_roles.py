@@ -0,0 +1,101 @@
+# comun/token_roles.py
+#
+# Tokens de rol: usuarios firma (RS256) un token corto con el rol del usuario
+# (POST /api/usuarios/token-rol) y el frontend lo envía en la cabecera
+# X-Token-Rol junto al token de Auth0. Cada servicio lo verifica en proceso
+# con la clave pública de usuarios (/.well-known/jwks.json, descargada una
+# vez y guardada en memoria), así que autorizar por rol no consulta a nadie.
+#
+# Si el token falta, expiró, no es del mismo usuario que el de Auth0 o es
+# anterior al último cambio de rol conocido (eventos de 'usuarios-roles'),
+# resolver_rol() usa el caché de comun.roles.
+
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from comun.metricas import registrar_cache
+from comun.roles import USUARIOS_URL, cliente_roles
+
+logger = logging.getLogger(__name__)
+
+EMISOR_TOKEN_ROL = "usuarios"
+AUDIENCIA_TOKEN_ROL = "farmacia-servicios"
+ALGORITMO_TOKEN_ROL = "RS256"
+CABECERA_TOKEN_ROL = "X-Token-Rol"
+ROLES_JWKS_URL = os.getenv("ROLES_JWKS_URL", f"{USUARIOS_URL}/.well-known/jwks.json")
+# Mínimo entre dos descargas de claves provocadas por un 'kid' desconocido
+ROLES_JWKS_REFRESCO_MINIMO_SEGUNDOS = float(os.getenv("ROLES_JWKS_REFRESCO_MINIMO_SEGUNDOS", "30"))
+
+
+class TokenRolInvalido(Exception):
+    pass
+
+
+class VerificadorTokenRoles:
+    def __init__(self, url_jwks: str = ROLES_JWKS_URL):
+        self.url_jwks = url_jwks
+        self._lock = threading.Lock()
+        self._claves = {}
+        self._descargado = None
+
+    def _clave(self, kid: str) -> dict:
+        with self._lock:
+            clave = self._claves.get(kid)
+            registrar_cache("jwks_roles", clave is not None)
+            if clave is not None:
+                return clave
+            # Un 'kid' desconocido puede ser una clave nueva de usuarios; se
+            # vuelve a descargar, pero no más de una vez cada tanto.
+            if self._descargado is not None and time.monotonic() - self._descargado < ROLES_JWKS_REFRESCO_MINIMO_SEGUNDOS:
+                raise TokenRolInvalido(f"Clave de firma desconocida: {kid}")
+            import httpx
+
+            try:
+                respuesta = httpx.get(self.url_jwks, timeout=5)
+                respuesta.raise_for_status()
+            except httpx.HTTPError as e:
+                raise TokenRolInvalido(f"No se pudieron obtener las claves de usuarios: {e}") from e
+            self._claves = {clave["kid"]: clave for clave in respuesta.json()["keys"]}
+            self._descargado = time.monotonic()
+            if kid not in self._claves:
+                raise TokenRolInvalido(f"Clave de firma desconocida: {kid}")
+            return self._claves[kid]
+
+    def verificar(self, token: str) -> dict:
+        """Devuelve los claims (sub, rol, iat, exp) de un token de rol válido."""
+        from jose import jwt, JWTError
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            return jwt.decode(
+                token,
+                self._clave(kid),
+                algorithms=[ALGORITMO_TOKEN_ROL],
+                audience=AUDIENCIA_TOKEN_ROL,
+                issuer=EMISOR_TOKEN_ROL,
+            )
+        except JWTError as e:
+            raise TokenRolInvalido(str(e)) from e
+
+
+verificador_token_roles = VerificadorTokenRoles()
+
+
+def resolver_rol(user_id: str, token_rol: Optional[str] = None) -> Optional[str]:
+    """
+    Rol de 'user_id' (el 'sub' del token de Auth0 ya validado). Sale del
+    token de rol si es válido; si no, del caché de roles.
+    """
+    if token_rol:
+        try:
+            claims = verificador_token_roles.verificar(token_rol)
+            if claims.get("sub") == user_id and not cliente_roles.cambio_posterior_a(user_id, claims.get("iat", 0)):
+                registrar_cache("token_rol", True)
+                return claims.get("rol")
+        except TokenRolInvalido as e:
+            logger.info(f"Token de rol descartado para {user_id}: {e}")
+    registrar_cache("token_rol", False)
+    return cliente_roles.rol_de(user_id)
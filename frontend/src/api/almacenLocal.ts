@@ -0,0 +1,99 @@
+// frontend/src/api/almacenLocal.ts
+//
+// Base IndexedDB del punto de venta ('farmacia-pos'), para que la caja siga
+// funcionando con la red lenta o caída:
+//   - productos: copia local del catálogo (clave: id). Ver catalogoLocal.ts.
+//   - pacientes: copia local de los pacientes (clave: id). Ver pacientesLocal.ts.
+//   - meta: valores sueltos (clave explícita), p. ej. la versión del catálogo.
+//   - ventas_pendientes: ventas hechas en la caja que todavía no llegan a
+//     transacciones (clave: id_cliente). Ver colaVentas.ts.
+
+const NOMBRE_BD = 'farmacia-pos';
+const VERSION_BD = 2; // 2: almacén 'pacientes'
+
+export const PRODUCTOS = 'productos';
+export const PACIENTES = 'pacientes';
+export const META = 'meta';
+export const VENTAS_PENDIENTES = 'ventas_pendientes';
+
+let conexion: Promise<IDBDatabase> | null = null;
+
+const abrir = (): Promise<IDBDatabase> => {
+    if (!conexion) {
+        conexion = new Promise((resolve, reject) => {
+            const solicitud = indexedDB.open(NOMBRE_BD, VERSION_BD);
+            solicitud.onupgradeneeded = () => {
+                const bd = solicitud.result;
+                if (!bd.objectStoreNames.contains(PRODUCTOS)) {
+                    bd.createObjectStore(PRODUCTOS, { keyPath: 'id' });
+                }
+                if (!bd.objectStoreNames.contains(PACIENTES)) {
+                    bd.createObjectStore(PACIENTES, { keyPath: 'id' });
+                }
+                if (!bd.objectStoreNames.contains(META)) {
+                    bd.createObjectStore(META);
+                }
+                if (!bd.objectStoreNames.contains(VENTAS_PENDIENTES)) {
+                    bd.createObjectStore(VENTAS_PENDIENTES, { keyPath: 'id_cliente' });
+                }
+            };
+            solicitud.onsuccess = () => resolve(solicitud.result);
+            solicitud.onerror = () => {
+                conexion = null; // Se reintenta en la próxima llamada
+                reject(solicitud.error);
+            };
+        });
+    }
+    return conexion;
+};
+
+const resultado = <T>(solicitud: IDBRequest<T>): Promise<T> =>
+    new Promise((resolve, reject) => {
+        solicitud.onsuccess = () => resolve(solicitud.result);
+        solicitud.onerror = () => reject(solicitud.error);
+    });
+
+export const leerTodos = async <T>(almacen: string): Promise<T[]> => {
+    const bd = await abrir();
+    return resultado(bd.transaction(almacen).objectStore(almacen).getAll());
+};
+
+export const leerValor = async <T>(almacen: string, clave: IDBValidKey): Promise<T | undefined> => {
+    const bd = await abrir();
+    return resultado(bd.transaction(almacen).objectStore(almacen).get(clave));
+};
+
+// Ejecuta las escrituras de 'operaciones' en una sola transacción y espera a
+// que se confirme: se aplican todas o ninguna.
+export const escribir = async (almacenes: string[], operaciones: (tx: IDBTransaction) => void): Promise<void> => {
+    const bd = await abrir();
+    const tx = bd.transaction(almacenes, 'readwrite');
+    const confirmada = new Promise<void>((resolve, reject) => {
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+        tx.onabort = () => reject(tx.error);
+    });
+    operaciones(tx);
+    return confirmada;
+};
+
+// Respuesta de un GET /cambios (inventario o pacientes), sin las filas
+export interface Cambios {
+    version: number;
+    completo: boolean;
+    eliminados: number[];
+}
+
+// Aplica las filas cambiadas y las eliminadas a 'almacen' y guarda la nueva
+// versión en la misma transacción: si algo falla, la próxima sincronización
+// repite desde la versión anterior.
+export const aplicarCambios = (almacen: string, claveVersion: string, filas: object[], cambios: Cambios): Promise<void> =>
+    escribir([almacen, META], tx => {
+        const copia = tx.objectStore(almacen);
+        if (cambios.completo) {
+            copia.clear();
+        }
+        filas.forEach(fila => copia.put(fila));
+        cambios.eliminados.forEach(id => copia.delete(id));
+        tx.objectStore(META).put(cambios.version, claveVersion);
+    });
@@ -0,0 +1,85 @@
+// frontend/src/api/catalogoLocal.ts
+//
+// Catálogo de productos guardado en el navegador (almacenLocal.ts). La
+// primera vez se descarga completo; después solo se piden a inventario los
+// cambios desde la última versión guardada (GET /cambios?desde=N). Si la
+// red falla, la caja sigue con la copia local. Con el stream de stock
+// conectado (eventos.ts), los cambios de stock llegan al momento y se
+// aplican con aplicarCambiosStock.
+
+import { Producto, obtenerCambiosProductosAPI } from './inventario';
+import { META, PRODUCTOS, aplicarCambios, escribir, leerTodos, leerValor } from './almacenLocal';
+
+const CLAVE_VERSION = 'version_catalogo';
+
+export interface Catalogo {
+    productos: Producto[];
+    sinConexion: boolean; // true: la sincronización falló, es la copia local
+}
+
+export const leerCatalogoLocal = (): Promise<Producto[]> => leerTodos<Producto>(PRODUCTOS);
+
+export const sincronizarCatalogo = async (token: string): Promise<Producto[]> => {
+    const desde = (await leerValor<number>(META, CLAVE_VERSION)) ?? 0;
+    const cambios = await obtenerCambiosProductosAPI(desde, token);
+    await aplicarCambios(PRODUCTOS, CLAVE_VERSION, cambios.productos, cambios);
+    return leerCatalogoLocal();
+};
+
+// Sincroniza y devuelve el catálogo; sin red devuelve la copia local. Solo
+// falla si no hay ni red ni copia local.
+export const obtenerCatalogo = async (token: string): Promise<Catalogo> => {
+    try {
+        return { productos: await sincronizarCatalogo(token), sinConexion: false };
+    } catch (err) {
+        const locales = await leerCatalogoLocal().catch(() => [] as Producto[]);
+        if (locales.length === 0) {
+            throw err;
+        }
+        return { productos: locales, sinConexion: true };
+    }
+};
+
+// Cambio recibido por el stream de stock de inventario (GET /eventos)
+export interface CambioStock {
+    producto_id: number;
+    nombre?: string;
+    stock?: number;
+    eliminado?: boolean;
+}
+
+export interface ResultadoCambiosStock {
+    productos: Producto[];
+    desconocidos: boolean; // true: llegó un producto que no está en la copia local
+}
+
+// Aplica a la copia local los cambios de stock del stream. No cambia la
+// versión guardada: la próxima sincronización vuelve a traer estos productos
+// con todos sus datos. Un producto desconocido (recién creado) no se puede
+// guardar solo con su stock: queda para esa sincronización.
+export const aplicarCambiosStock = async (cambios: CambioStock[]): Promise<ResultadoCambiosStock> => {
+    const porId = new Map<number, Producto>();
+    (await leerCatalogoLocal()).forEach(p => porId.set(p.id, p));
+    let desconocidos = false;
+    await escribir([PRODUCTOS], tx => {
+        const copia = tx.objectStore(PRODUCTOS);
+        cambios.forEach(cambio => {
+            const actual = porId.get(cambio.producto_id);
+            if (cambio.eliminado) {
+                porId.delete(cambio.producto_id);
+                copia.delete(cambio.producto_id);
+            } else if (actual === undefined) {
+                desconocidos = true;
+            } else {
+                const producto = {
+                    ...actual,
+                    nombre: cambio.nombre ?? actual.nombre,
+                    stock: cambio.stock ?? actual.stock,
+                };
+                porId.set(producto.id, producto);
+                copia.put(producto);
+            }
+        });
+    });
+    return { productos: Array.from(porId.values()), desconocidos };
+};
@@ -0,0 +1,92 @@
+// frontend/src/api/colaVentas.ts
+//
+// Cola de ventas del punto de venta. Cobrar solo guarda la venta en el
+// navegador (almacenLocal.ts), sin esperar a la red; enviarVentasPendientes()
+// las manda en lotes a POST /api/transacciones/ventas/lote. Cada venta lleva
+// un id_cliente propio: si un envío se corta y se repite, transacciones
+// responde "duplicada" y no la registra dos veces.
+
+import { VENTAS_PENDIENTES, escribir, leerTodos } from './almacenLocal';
+import { ProductoVenta, VENTAS_POR_LOTE, VentaCaja, registrarVentasLoteAPI } from './transacciones';
+
+export interface VentaPendiente extends VentaCaja {
+    total: number; // Con los precios de la copia local; el definitivo lo calcula transacciones
+    rechazo?: string; // Motivo si transacciones la rechazó: queda a la vista y no se reintenta
+}
+
+export interface ResultadoEnvio {
+    enviadas: number;
+    rechazadas: number;
+}
+
+// crypto.randomUUID solo existe en contextos seguros (https o localhost)
+const nuevoIdCliente = (): string => {
+    if (typeof crypto.randomUUID === 'function') {
+        return crypto.randomUUID();
+    }
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = (bytes[6] & 0x0f) | 0x40; // Versión 4
+    bytes[8] = (bytes[8] & 0x3f) | 0x80; // Variante RFC 4122
+    const hex = Array.prototype.map.call(bytes, (b: number) => b.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+};
+
+export const encolarVenta = async (productos: ProductoVenta[], total: number): Promise<VentaPendiente> => {
+    const venta: VentaPendiente = {
+        id_cliente: nuevoIdCliente(),
+        fecha: new Date().toISOString(),
+        productos,
+        total,
+    };
+    await escribir([VENTAS_PENDIENTES], tx => tx.objectStore(VENTAS_PENDIENTES).put(venta));
+    return venta;
+};
+
+export const leerVentasPendientes = (): Promise<VentaPendiente[]> => leerTodos<VentaPendiente>(VENTAS_PENDIENTES);
+
+export const descartarVenta = (idCliente: string): Promise<void> =>
+    escribir([VENTAS_PENDIENTES], tx => tx.objectStore(VENTAS_PENDIENTES).delete(idCliente));
+
+// Un solo envío a la vez, aunque lo pidan el temporizador, el evento
+// 'online' y un cobro al mismo tiempo
+let envioEnCurso: Promise<ResultadoEnvio> | null = null;
+
+const enviar = async (token: string): Promise<ResultadoEnvio> => {
+    const pendientes = (await leerVentasPendientes()).filter(v => !v.rechazo);
+    const resultado: ResultadoEnvio = { enviadas: 0, rechazadas: 0 };
+    for (let i = 0; i < pendientes.length; i += VENTAS_POR_LOTE) {
+        const lote = pendientes.slice(i, i + VENTAS_POR_LOTE);
+        const respuestas = await registrarVentasLoteAPI(
+            lote.map(({ id_cliente, fecha, productos }) => ({ id_cliente, fecha, productos })),
+            token
+        );
+        await escribir([VENTAS_PENDIENTES], tx => {
+            const almacen = tx.objectStore(VENTAS_PENDIENTES);
+            respuestas.forEach(r => {
+                if (r.estado === 'rechazada') {
+                    const venta = lote.find(v => v.id_cliente === r.id_cliente);
+                    if (venta) {
+                        almacen.put({ ...venta, rechazo: r.detalle || 'Rechazada por el servidor' });
+                    }
+                    resultado.rechazadas += 1;
+                } else if (r.estado === 'conflicto') {
+                    // Queda en la cola tal cual: se reenvía en el próximo intento
+                } else {
+                    almacen.delete(r.id_cliente);
+                    resultado.enviadas += 1;
+                }
+            });
+        });
+    }
+    return resultado;
+};
+
+// Si falla la red, lo que no se confirmó sigue en la cola para el próximo intento
+export const enviarVentasPendientes = (token: string): Promise<ResultadoEnvio> => {
+    if (!envioEnCurso) {
+        envioEnCurso = enviar(token).finally(() => {
+            envioEnCurso = null;
+        });
+    }
+    return envioEnCurso;
+};
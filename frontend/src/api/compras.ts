@@ -1,5 +1,7 @@
 // frontend/src/api/compras.ts
 
+import { cabeceraTokenRol } from './usuarios';
+
 // Interfaces que reflejan los esquemas de tu backend (inventario/app/schemas.py)
 export interface DetalleOrdenCompraCreate {
     producto_id: number;
@@ -38,6 +40,9 @@ async function fetchAPI<T>(url: string, token: string, options: RequestInit = {}
     const headers = {
         'Content-Type': 'application/json',
         'Authorization': `Bearer ${token}`, // Cabecera de autenticación
+        // Las compras requieren rol: se envía el token de rol para que
+        // inventario lo verifique sin consultar a usuarios
+        ...(await cabeceraTokenRol(token)),
         ...options.headers,
     };
 
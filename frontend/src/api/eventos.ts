@@ -0,0 +1,106 @@
+// frontend/src/api/eventos.ts
+//
+// Lector de los streams de eventos de los servicios (Server-Sent Events,
+// comun/sse.py). No usa EventSource porque este no permite mandar el header
+// Authorization: lee el stream con fetch y lo separa en eventos.
+//
+// Si la conexión se corta (red, reinicio del servicio, timeout de nginx)
+// vuelve a conectarse después de la espera que pide el servicio ('retry'),
+// con un token nuevo. Mientras estuvo desconectado se pudieron perder
+// eventos: alConectar es el lugar para releer el estado por REST.
+
+export interface ManejadoresEventos {
+    // Cada evento con su nombre ('stock', 'ventas', 'resincronizar') y sus datos ya parseados
+    alEvento: (evento: string, datos: any) => void;
+    alConectar?: () => void;
+    alDesconectar?: () => void;
+}
+
+const REINTENTO_POR_DEFECTO_MS = 3000;
+// Servicio saturado (503): se espera más antes de volver a intentar
+const REINTENTO_SATURADO_MS = 30000;
+
+// Se conecta a 'url' y devuelve la función que cierra la conexión
+export const escucharEventos = (
+    url: string,
+    obtenerToken: () => Promise<string>,
+    manejadores: ManejadoresEventos
+): (() => void) => {
+    let cerrado = false;
+    let controlador: AbortController | null = null;
+    let temporizador: ReturnType<typeof setTimeout> | null = null;
+    let reintentoMs = REINTENTO_POR_DEFECTO_MS;
+
+    const procesarBloque = (bloque: string) => {
+        let evento = 'message';
+        const datos: string[] = [];
+        bloque.split('\n').forEach(linea => {
+            if (linea === '' || linea.startsWith(':')) {
+                return; // Comentario (latido)
+            }
+            const separador = linea.indexOf(':');
+            const campo = separador === -1 ? linea : linea.slice(0, separador);
+            const valor = separador === -1 ? '' : linea.slice(separador + 1).replace(/^ /, '');
+            if (campo === 'event') {
+                evento = valor;
+            } else if (campo === 'data') {
+                datos.push(valor);
+            } else if (campo === 'retry' && /^\d+$/.test(valor)) {
+                reintentoMs = parseInt(valor, 10);
+            }
+        });
+        if (datos.length > 0) {
+            manejadores.alEvento(evento, JSON.parse(datos.join('\n')));
+        }
+    };
+
+    const conectar = async () => {
+        let saturado = false;
+        controlador = new AbortController();
+        try {
+            const token = await obtenerToken();
+            const response = await fetch(url, {
+                headers: { 'Authorization': `Bearer ${token}`, 'Accept': 'text/event-stream' },
+                signal: controlador.signal,
+            });
+            if (!response.ok || !response.body) {
+                saturado = response.status === 503;
+                throw new Error(`Error al conectar al stream de eventos (${response.status})`);
+            }
+            manejadores.alConectar?.();
+            const lector = response.body.getReader();
+            const decodificador = new TextDecoder();
+            let pendiente = '';
+            while (!cerrado) {
+                const { value, done } = await lector.read();
+                if (done) {
+                    break;
+                }
+                pendiente += decodificador.decode(value, { stream: true }).replace(/\r\n?/g, '\n');
+                let fin = pendiente.indexOf('\n\n');
+                while (fin !== -1) {
+                    procesarBloque(pendiente.slice(0, fin));
+                    pendiente = pendiente.slice(fin + 2);
+                    fin = pendiente.indexOf('\n\n');
+                }
+            }
+        } catch (err) {
+            if (!cerrado) {
+                console.error(err);
+            }
+        }
+        if (!cerrado) {
+            manejadores.alDesconectar?.();
+            temporizador = setTimeout(conectar, saturado ? REINTENTO_SATURADO_MS : reintentoMs);
+        }
+    };
+
+    conectar();
+    return () => {
+        cerrado = true;
+        if (temporizador !== null) {
+            clearTimeout(temporizador);
+        }
+        controlador?.abort();
+    };
+};
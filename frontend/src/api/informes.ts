@@ -137,3 +137,65 @@ export const descargarSinMovimiento = async (
 
   return response.blob();
 };
+
+
+
+export interface ProductoTopDashboard {
+  producto_id: number;
+  nombre: string | null;
+  cantidad_vendida: number;
+}
+
+export interface OrdenCompraReciente {
+  id: number;
+  proveedor: string;
+  fecha_creacion: string;
+  estado: string;
+}
+
+export interface ResumenDashboard {
+  fecha: string;
+  total_ventas_hoy: number;
+  transacciones_hoy: number;
+  top_productos_hoy: ProductoTopDashboard[];
+  total_productos: number;
+  productos_stock_bajo: number;
+  ordenes_compra_recientes: OrdenCompraReciente[];
+  en_vivo: boolean;
+}
+
+// Stream de las ventas del día (Server-Sent Events, ver eventos.ts). Cada
+// evento 'ventas' trae la parte de ventas del resumen ya actualizada.
+export const URL_EVENTOS_VENTAS = '/api/informes/eventos/ventas';
+
+export type VentasDelDia = Pick<ResumenDashboard, 'fecha' | 'total_ventas_hoy' | 'transacciones_hoy' | 'top_productos_hoy'>;
+
+/**
+ * Obtiene en una sola llamada los KPIs del dashboard (ventas del día,
+ * productos más vendidos, stock bajo y órdenes de compra recientes).
+ * @param token El token de acceso JWT del usuario.
+ * @param umbralStock Stock igual o menor a este valor se considera bajo.
+ */
+export const obtenerResumenDashboard = async (
+  token: string,
+  umbralStock: number = 10
+): Promise<ResumenDashboard> => {
+
+  const params = new URLSearchParams({
+    umbral_stock: umbralStock.toString(),
+  });
+
+  const response = await fetch(`/api/informes/dashboard/resumen?${params.toString()}`, {
+    method: 'GET',
+    headers: {
+      Authorization: `Bearer ${token}`,
+    },
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || 'Error al obtener el resumen del dashboard.');
+  }
+
+  return response.json();
+};
@@ -2,6 +2,9 @@
 
 const API_URL = process.env.REACT_APP_INVENTARIO_API_URL || "http://localhost:8001/api/inventario";
 
+// Stream de cambios de stock (Server-Sent Events, ver eventos.ts)
+export const URL_EVENTOS_STOCK = `${API_URL}/eventos`;
+
 // Interfaces para que TypeScript sepa cómo son los datos de un producto
 export interface Producto {
     id: number;
@@ -11,6 +14,16 @@ export interface Producto {
     stock: number;
 }
 
+// Respuesta de GET /cambios: lo que cambió desde la versión pedida. 'version'
+// es la que hay que mandar en la próxima consulta; con 'completo' la lista
+// reemplaza todo el catálogo (primera carga, desde=0).
+export interface CambiosCatalogo {
+    version: number;
+    completo: boolean;
+    productos: Producto[];
+    eliminados: number[];
+}
+
 export interface ProductoCreate {
     nombre: string;
     descripcion: string | null;
@@ -28,6 +41,16 @@ export const listarProductosAPI = async (token: string): Promise<Producto[]> =>
     return response.json();
 };
 
+export const obtenerCambiosProductosAPI = async (desde: number, token: string): Promise<CambiosCatalogo> => {
+    const response = await fetch(`${API_URL}/cambios?desde=${desde}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+    });
+    if (!response.ok) {
+        throw new Error("Error al obtener los cambios del catálogo");
+    }
+    return response.json();
+};
+
 // Función para crear un nuevo producto
 export const crearProductoAPI = async (producto: ProductoCreate, token: string): Promise<Producto> => {
     const response = await fetch(`${API_URL}/`, {
@@ -18,6 +18,34 @@ export interface Dispensacion {
   producto_id: number; // Asumimos que guardas el ID del producto
   cantidad: number;
   fecha_dispensacion: string;
+  nombre_producto: string | null;
+}
+
+// Página del historial: 'siguiente_cursor' es null en la última página
+export interface PaginaDispensaciones {
+  items: Dispensacion[];
+  siguiente_cursor: string | null;
+}
+
+export interface HistorialPaciente {
+  paciente: Paciente;
+  dispensaciones: PaginaDispensaciones;
+}
+
+export interface FiltrosHistorial {
+  limite?: number;
+  cursor?: string | null;
+  desde?: string; // YYYY-MM-DD
+  hasta?: string; // YYYY-MM-DD
+}
+
+// Respuesta de GET /cambios: pacientes nuevos o modificados e ids de los
+// eliminados desde la versión pedida ('completo': es la lista entera)
+export interface CambiosPacientes {
+  version: number;
+  completo: boolean;
+  pacientes: Paciente[];
+  eliminados: number[];
 }
 
 export interface DispensacionCreate {
@@ -65,6 +93,10 @@ export async function listarPacientesAPI(token: string): Promise<Paciente[]> {
   return fetchAPI<Paciente[]>(`${BASE_URL}/`, token);
 }
 
+export async function obtenerCambiosPacientesAPI(desde: number, token: string): Promise<CambiosPacientes> {
+  return fetchAPI<CambiosPacientes>(`${BASE_URL}/cambios?desde=${desde}`, token);
+}
+
 export async function actualizarPacienteAPI(id: number, pacienteData: PacienteCreate, token: string): Promise<Paciente> {
   return fetchAPI<Paciente>(`${BASE_URL}/${id}`, token, {
     method: 'PUT',
@@ -86,11 +118,30 @@ export async function obtenerPacientePorRutAPI(rut: string, token: string): Prom
   return fetchAPI<Paciente>(`${BASE_URL}/rut/${rut}`, token);
 }
 
+function parametrosHistorial(filtros: FiltrosHistorial): string {
+  const params = new URLSearchParams();
+  if (filtros.limite) params.append('limite', String(filtros.limite));
+  if (filtros.cursor) params.append('cursor', filtros.cursor);
+  if (filtros.desde) params.append('desde', filtros.desde);
+  if (filtros.hasta) params.append('hasta', filtros.hasta);
+  const query = params.toString();
+  return query ? `?${query}` : '';
+}
+
+/**
+ * Obtiene una página del historial de dispensaciones de un paciente (de la más
+ * reciente a la más antigua). Para la siguiente página se pasa el
+ * 'siguiente_cursor' de la respuesta anterior.
+ */
+export async function obtenerDispensacionesAPI(pacienteId: number, token: string, filtros: FiltrosHistorial = {}): Promise<PaginaDispensaciones> {
+  return fetchAPI<PaginaDispensaciones>(`${BASE_URL}/${pacienteId}/dispensaciones${parametrosHistorial(filtros)}`, token);
+}
+
 /**
- * Obtiene el historial de dispensaciones de un paciente específico.
+ * Obtiene el paciente y la primera página de su historial en una sola llamada.
  */
-export async function obtenerDispensacionesAPI(pacienteId: number, token: string): Promise<Dispensacion[]> {
-  return fetchAPI<Dispensacion[]>(`${BASE_URL}/${pacienteId}/dispensaciones`, token);
+export async function obtenerHistorialPacienteAPI(pacienteId: number, token: string, filtros: FiltrosHistorial = {}): Promise<HistorialPaciente> {
+  return fetchAPI<HistorialPaciente>(`${BASE_URL}/${pacienteId}/historial${parametrosHistorial({ ...filtros, cursor: null })}`, token);
 }
 
 /**
@@ -103,9 +154,42 @@ export async function registrarDispensacionAPI(pacienteId: number, dispensacionD
   });
 }
 
+/**
+ * Registra en una sola llamada todos los medicamentos entregados en una visita.
+ */
+export async function registrarDispensacionesAPI(pacienteId: number, productos: DispensacionCreate[], token: string): Promise<Dispensacion[]> {
+  return fetchAPI<Dispensacion[]>(`${BASE_URL}/${pacienteId}/dispensaciones/lote`, token, {
+    method: 'POST',
+    body: JSON.stringify({ productos }),
+  });
+}
+
 /**
  * Verifica si existe una alerta para un medicamento y paciente específicos.
  */
 export async function verificarAlertaAPI(pacienteId: number, productoId: number, token: string): Promise<{ alerta: boolean; mensaje: string }> {
-    return fetchAPI<{ alerta: boolean; mensaje: string }>(`${BASE_URL}/${pacienteId}/dispensaciones/alerta?producto_id=${productoId}`, token);
+    return fetchAPI<{ alerta: boolean; mensaje: string }>(`${BASE_URL}/${pacienteId}/alertas?producto_id=${productoId}`, token);
+}
+
+export interface AlertaProducto {
+  producto_id: number;
+  alerta: boolean;
+  mensaje: string;
+  retiros?: { id_dispensacion: number; fecha: string }[];
+}
+
+export interface AlertasReceta {
+  paciente_id: number;
+  alerta: boolean;
+  alertas: AlertaProducto[];
+}
+
+/**
+ * Verifica en una sola llamada las alertas de todos los productos de una receta.
+ */
+export async function verificarAlertasRecetaAPI(pacienteId: number, productoIds: number[], token: string, dias: number = 30): Promise<AlertasReceta> {
+  return fetchAPI<AlertasReceta>(`${BASE_URL}/${pacienteId}/alertas`, token, {
+    method: 'POST',
+    body: JSON.stringify({ producto_ids: productoIds, dias }),
+  });
 }
\ No newline at end of file
@@ -0,0 +1,24 @@
+// frontend/src/api/pacientesLocal.ts
+//
+// Lista de pacientes guardada en el navegador (almacenLocal.ts). Igual que
+// el catálogo (catalogoLocal.ts): la primera vez se descarga completa y
+// después solo se piden los cambios desde la última versión
+// (GET /api/pacientes/cambios?desde=N).
+
+import { Paciente, obtenerCambiosPacientesAPI } from './pacientes';
+import { META, PACIENTES, aplicarCambios, leerTodos, leerValor } from './almacenLocal';
+
+const CLAVE_VERSION = 'version_pacientes';
+
+// Ordenados por nombre, como GET /api/pacientes/
+export const leerPacientesLocales = async (): Promise<Paciente[]> => {
+    const pacientes = await leerTodos<Paciente>(PACIENTES);
+    return pacientes.sort((a, b) => (a.nombre || '').localeCompare(b.nombre || ''));
+};
+
+export const sincronizarPacientes = async (token: string): Promise<Paciente[]> => {
+    const desde = (await leerValor<number>(META, CLAVE_VERSION)) ?? 0;
+    const cambios = await obtenerCambiosPacientesAPI(desde, token);
+    await aplicarCambios(PACIENTES, CLAVE_VERSION, cambios.pacientes, cambios);
+    return leerPacientesLocales();
+};
@@ -0,0 +1,45 @@
+// frontend/src/api/transacciones.ts
+
+const API_URL = process.env.REACT_APP_TRANSACCIONES_API_URL || "http://localhost:8003/api/transacciones";
+
+export interface ProductoVenta {
+    producto_id: number;
+    cantidad: number;
+}
+
+// Venta hecha en la caja: id_cliente y fecha los pone el navegador
+export interface VentaCaja {
+    id_cliente: string;
+    fecha: string; // ISO 8601 con zona
+    productos: ProductoVenta[];
+}
+
+// "duplicada": ya estaba registrada (reenvío); "rechazada": no se reintenta;
+// "conflicto": no se pudo confirmar, se reenvía en el próximo intento
+export interface ResultadoVentaCaja {
+    id_cliente: string;
+    estado: 'registrada' | 'duplicada' | 'rechazada' | 'conflicto';
+    id_venta: number | null;
+    total: number | null;
+    detalle: string | null;
+}
+
+// Igual a VENTAS_LOTE_MAXIMO de transacciones
+export const VENTAS_POR_LOTE = 200;
+
+export const registrarVentasLoteAPI = async (ventas: VentaCaja[], token: string): Promise<ResultadoVentaCaja[]> => {
+    const response = await fetch(`${API_URL}/ventas/lote`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+        },
+        body: JSON.stringify({ ventas })
+    });
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.detail || "Error al enviar las ventas");
+    }
+    const data = await response.json();
+    return data.resultados;
+};
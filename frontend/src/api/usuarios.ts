@@ -39,8 +39,39 @@ async function fetchAPI<T>(url: string, token: string, options: RequestInit = {}
   return response.status === 204 ? (undefined as T) : await response.json();
 }
 
-export async function listarUsuariosAPI(token: string): Promise<Usuario[]> {
-  return fetchAPI<Usuario[]>(`${API_URL}/`, token);
+export const ROLES_USUARIO = ['beneficiario', 'cajero', 'vendedor', 'admin_inventario', 'admin_general'];
+
+export interface PaginaUsuarios {
+  items: Usuario[];
+  siguiente_cursor: string | null;
+}
+
+export interface FiltrosUsuarios {
+  limite?: number;
+  cursor?: string | null;
+  rol?: string | null;
+}
+
+export interface ConteoUsuarios {
+  total: number;
+  por_rol: Record<string, number>;
+}
+
+/**
+ * Una página del listado de usuarios (ordenado por id). Para la página
+ * siguiente se pasa el 'siguiente_cursor' recibido.
+ */
+export async function listarUsuariosAPI(token: string, filtros: FiltrosUsuarios = {}): Promise<PaginaUsuarios> {
+  const parametros = new URLSearchParams();
+  if (filtros.limite) parametros.set('limite', String(filtros.limite));
+  if (filtros.cursor) parametros.set('cursor', filtros.cursor);
+  if (filtros.rol) parametros.set('rol', filtros.rol);
+  const consulta = parametros.toString();
+  return fetchAPI<PaginaUsuarios>(`${API_URL}/${consulta ? `?${consulta}` : ''}`, token);
+}
+
+export async function contarUsuariosAPI(token: string): Promise<ConteoUsuarios> {
+  return fetchAPI<ConteoUsuarios>(`${API_URL}/conteo`, token);
 }
 
 export async function crearUsuarioAPI(usuario: UsuarioCreate, token: string): Promise<Usuario> {
@@ -73,3 +104,37 @@ export async function obtenerUsuarioPorIdAPI(id: string, token: string): Promise
 export async function obtenerMiPerfilUsuarioAPI(token: string): Promise<Usuario> {
     return fetchAPI<Usuario>(`${API_URL}/perfil`, token);
 }
+
+// --- TOKEN DE ROL ---
+// Token corto firmado por usuarios con el rol del usuario. Los servicios lo
+// verifican localmente (sin consultar a usuarios) cuando llega en la
+// cabecera X-Token-Rol. Se guarda en memoria y se renueva antes de vencer.
+export interface TokenRol {
+  token: string;
+  rol: string;
+  expira_en: number; // segundos
+}
+
+const MARGEN_RENOVACION_MS = 30 * 1000;
+let tokenRolActual: { token: string; paraToken: string; vence: number } | null = null;
+
+export async function obtenerTokenRolAPI(token: string): Promise<TokenRol> {
+  return fetchAPI<TokenRol>(`${API_URL}/token-rol`, token, { method: 'POST' });
+}
+
+/**
+ * Cabecera X-Token-Rol para las llamadas que requieren un rol. Si no se puede
+ * obtener el token se devuelve vacía: el servicio consulta el rol por su cuenta.
+ */
+export async function cabeceraTokenRol(token: string): Promise<Record<string, string>> {
+  if (!tokenRolActual || tokenRolActual.paraToken !== token || tokenRolActual.vence - Date.now() < MARGEN_RENOVACION_MS) {
+    try {
+      const nuevo = await obtenerTokenRolAPI(token);
+      tokenRolActual = { token: nuevo.token, paraToken: token, vence: Date.now() + nuevo.expira_en * 1000 };
+    } catch (error) {
+      tokenRolActual = null;
+      return {};
+    }
+  }
+  return { 'X-Token-Rol': tokenRolActual.token };
+}
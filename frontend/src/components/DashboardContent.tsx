@@ -2,9 +2,11 @@
 
 import React, { useState, useEffect, useCallback } from 'react';
 import { useAuth0 } from '@auth0/auth0-react';
-import { listarPacientesAPI, Paciente } from '../api/pacientes';
-import { listarProductosAPI, Producto } from '../api/inventario';
-import { listarUsuariosAPI, Usuario } from '../api/usuarios';
+import { Paciente } from '../api/pacientes';
+import { sincronizarPacientes } from '../api/pacientesLocal';
+import { obtenerResumenDashboard, ResumenDashboard, URL_EVENTOS_VENTAS, VentasDelDia } from '../api/informes';
+import { escucharEventos } from '../api/eventos';
+import { contarUsuariosAPI } from '../api/usuarios';
 import './Pagina.css';
 import './DashboardContent.css';
 
@@ -13,6 +15,7 @@ const DashboardContent: React.FC = () => {
     const [totalPacientes, setTotalPacientes] = useState<number | null>(null);
     const [totalProductos, setTotalProductos] = useState<number | null>(null);
     const [lowStockProductsCount, setLowStockProductsCount] = useState<number | null>(null);
+    const [resumen, setResumen] = useState<ResumenDashboard | null>(null);
     const [usersByRole, setUsersByRole] = useState<Record<string, number> | null>(null);
     const [isLoadingData, setIsLoadingData] = useState<boolean>(true);
     const [error, setError] = useState<string | null>(null);
@@ -35,7 +38,7 @@ const DashboardContent: React.FC = () => {
 
             // --- Cargar datos de Pacientes (accesible para todos los roles autenticados) ---
             try {
-                const pacientes: Paciente[] = await listarPacientesAPI(token);
+                const pacientes: Paciente[] = await sincronizarPacientes(token);
                 setTotalPacientes(pacientes.length);
             } catch (err: any) {
                 console.error('Error al cargar pacientes para el Dashboard:', err);
@@ -43,15 +46,16 @@ const DashboardContent: React.FC = () => {
                 // No establecemos el error principal aquí para no bloquear todo el dashboard
             }
 
-            // --- Cargar datos de Productos (accesible para todos los roles autenticados) ---
+            // --- KPIs de ventas e inventario (una sola llamada al servicio de informes) ---
             try {
-                const products: Producto[] = await listarProductosAPI(token);
-                setTotalProductos(products.length);
                 const LOW_STOCK_THRESHOLD = 10;
-                const lowStockCount = products.filter(p => p.stock <= LOW_STOCK_THRESHOLD).length;
-                setLowStockProductsCount(lowStockCount);
+                const datosResumen = await obtenerResumenDashboard(token, LOW_STOCK_THRESHOLD);
+                setResumen(datosResumen);
+                setTotalProductos(datosResumen.total_productos);
+                setLowStockProductsCount(datosResumen.productos_stock_bajo);
             } catch (err: any) {
-                console.error('Error al cargar productos para el Dashboard:', err);
+                console.error('Error al cargar el resumen para el Dashboard:', err);
+                setResumen(null);
                 setTotalProductos(null); // Opcional: mostrar N/A si falla
                 setLowStockProductsCount(null);
                 // No establecemos el error principal aquí
@@ -59,12 +63,8 @@ const DashboardContent: React.FC = () => {
 
             // --- Cargar datos de Usuarios (probablemente solo para administradores) ---
             try {
-                const users: Usuario[] = await listarUsuariosAPI(token);
-                const rolesCount: Record<string, number> = {};
-                users.forEach(user => {
-                    rolesCount[user.rol] = (rolesCount[user.rol] || 0) + 1;
-                });
-                setUsersByRole(rolesCount);
+                const conteo = await contarUsuariosAPI(token);
+                setUsersByRole(conteo.por_rol);
             } catch (userApiError: any) {
                 // Si falla la API de usuarios (ej. por permisos), no mostramos un error general,
                 // simplemente indicamos que esa sección no está disponible.
@@ -81,6 +81,7 @@ const DashboardContent: React.FC = () => {
             setTotalPacientes(null);
             setTotalProductos(null);
             setLowStockProductsCount(null);
+            setResumen(null);
             setUsersByRole(null);
         } finally {
             setIsLoadingData(false);
@@ -91,6 +92,23 @@ const DashboardContent: React.FC = () => {
         fetchData();
     }, [fetchData]);
 
+    // Ventas del día en vivo: informes empuja el total, las transacciones y
+    // el top en cuanto llegan ventas nuevas, sin recargar el resumen
+    useEffect(() => {
+        if (!isAuthenticated) return;
+        const obtenerToken = () => getAccessTokenSilently({
+            authorizationParams: { audience: process.env.REACT_APP_AUTH0_API_AUDIENCE! },
+        });
+        return escucharEventos(URL_EVENTOS_VENTAS, obtenerToken, {
+            alEvento: (evento, datos) => {
+                if (evento === 'ventas') {
+                    const ventas = datos as VentasDelDia;
+                    setResumen(anterior => anterior ? { ...anterior, ...ventas } : anterior);
+                }
+            },
+        });
+    }, [isAuthenticated, getAccessTokenSilently]);
+
     if (isLoadingData) {
         return <div className="dashboard-loading"><p>Cargando datos del dashboard...</p></div>;
     }
@@ -110,6 +128,25 @@ const DashboardContent: React.FC = () => {
                 <h3>Total de Productos</h3>
                 <p className="metric-number">{totalProductos !== null ? totalProductos : 'N/A'}</p>
             </div>
+            <div className="card dashboard-card">
+                <h3>Ventas de Hoy</h3>
+                <p className="metric-number">{resumen ? `$${resumen.total_ventas_hoy.toLocaleString('es-CL')}` : 'N/A'}</p>
+                {resumen && <p className="sub-text">{resumen.transacciones_hoy} transacciones</p>}
+            </div>
+            <div className="card dashboard-card">
+                <h3>Más Vendidos Hoy</h3>
+                {resumen && resumen.top_productos_hoy.length > 0 ? (
+                    <ul className="role-list">
+                        {resumen.top_productos_hoy.map(p => (
+                            <li key={p.producto_id}>
+                                <strong>{p.nombre ?? `#${p.producto_id}`}:</strong> {p.cantidad_vendida}
+                            </li>
+                        ))}
+                    </ul>
+                ) : (
+                    <p className="sub-text">Sin ventas registradas hoy.</p>
+                )}
+            </div>
             {/* NUEVA TARJETA: Productos con Bajo Stock */}
             <div className="card dashboard-card accent-low-stock">
                 <h3>Productos con Bajo Stock</h3>
@@ -118,6 +155,20 @@ const DashboardContent: React.FC = () => {
                   <p className="sub-text">¡Revisa tu inventario!</p>
                 }
             </div>
+            <div className="card dashboard-card">
+                <h3>Órdenes de Compra Recientes</h3>
+                {resumen && resumen.ordenes_compra_recientes.length > 0 ? (
+                    <ul className="role-list">
+                        {resumen.ordenes_compra_recientes.map(o => (
+                            <li key={o.id}>
+                                <strong>#{o.id} {o.proveedor}:</strong> {o.estado}
+                            </li>
+                        ))}
+                    </ul>
+                ) : (
+                    <p className="sub-text">No hay órdenes de compra.</p>
+                )}
+            </div>
             {/* NUEVA TARJETA: Usuarios por Rol */}
             <div className="card dashboard-card accent-users">
                 <h3>Usuarios por Rol</h3>
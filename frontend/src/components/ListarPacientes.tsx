@@ -3,12 +3,12 @@
 import React, { useState, useEffect, useCallback, FormEvent, ChangeEvent } from 'react';
 import { useAuth0 } from '@auth0/auth0-react';
 import { 
-  listarPacientesAPI, 
   actualizarPacienteAPI, 
   eliminarPacienteAPI, 
   Paciente, 
   PacienteCreate 
 } from '../api/pacientes';
+import { sincronizarPacientes } from '../api/pacientesLocal';
 import FormularioPaciente from './FormularioPaciente';
 import ModalHistorial from './ModalHistorial';
 import './ListarPacientes.css';
@@ -38,7 +38,8 @@ const ListarPacientes: React.FC = () => {
       const token = await getAccessTokenSilently({
         authorizationParams: { audience: process.env.REACT_APP_AUTH0_API_AUDIENCE! },
       });
-      const data = await listarPacientesAPI(token);
+      // Copia local: solo se descargan los cambios desde la última carga
+      const data = await sincronizarPacientes(token);
       setPacientes(data);
       setMensaje('');
     } catch (error: any) {
@@ -3,10 +3,12 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { useAuth0 } from '@auth0/auth0-react';
 // Asegúrate de que las interfaces y funciones se importen correctamente
-import { listarUsuariosAPI, eliminarUsuarioAPI, actualizarUsuarioAPI, Usuario, UsuarioCreate } from '../api/usuarios'; 
+import { listarUsuariosAPI, contarUsuariosAPI, eliminarUsuarioAPI, actualizarUsuarioAPI, Usuario, UsuarioCreate, ROLES_USUARIO } from '../api/usuarios'; 
 import FormularioUsuario from './FormularioUsuario';
 import './ListarPacientes.css'; 
 
+const TAMANO_PAGINA = 50;
+
 interface ListarUsuariosProps {
   onUsuarioModificado: () => void; 
 }
@@ -17,6 +19,11 @@ const ListarUsuarios: React.FC<ListarUsuariosProps> = ({ onUsuarioModificado })
   const [mensaje, setMensaje] = useState('');
   
   const [cargandoLista, setCargandoLista] = useState(false);
+  const [cargandoMas, setCargandoMas] = useState(false);
+  // Paginación por cursor: el backend devuelve el cursor de la página siguiente
+  const [siguienteCursor, setSiguienteCursor] = useState<string | null>(null);
+  const [filtroRol, setFiltroRol] = useState('');
+  const [totalUsuarios, setTotalUsuarios] = useState<number | null>(null);
 
   const [usuarioAEditar, setUsuarioAEditar] = useState<Usuario | null>(null);
   const [mostrarModalEdicion, setMostrarModalEdicion] = useState(false);
@@ -32,17 +39,42 @@ const ListarUsuarios: React.FC<ListarUsuariosProps> = ({ onUsuarioModificado })
       const token = await getAccessTokenSilently({
         authorizationParams: { audience: process.env.REACT_APP_AUTH0_API_AUDIENCE! },
       });
-      const data = await listarUsuariosAPI(token);
-      setUsuarios(data);
+      const [pagina, conteo] = await Promise.all([
+        listarUsuariosAPI(token, { limite: TAMANO_PAGINA, rol: filtroRol || null }),
+        contarUsuariosAPI(token),
+      ]);
+      setUsuarios(pagina.items);
+      setSiguienteCursor(pagina.siguiente_cursor);
+      setTotalUsuarios(filtroRol ? (conteo.por_rol[filtroRol] ?? 0) : conteo.total);
       setMensaje('');
     } catch (error: any) {
       console.error(error);
       setMensaje(error.message || 'Error desconocido al cargar usuarios');
       setUsuarios([]);
+      setSiguienteCursor(null);
+      setTotalUsuarios(null);
     } finally {
       setCargandoLista(false);
     }
-  }, [isAuthenticated, getAccessTokenSilently]);
+  }, [isAuthenticated, getAccessTokenSilently, filtroRol]);
+
+  const cargarMas = async () => {
+    if (!siguienteCursor) return;
+    setCargandoMas(true);
+    try {
+      const token = await getAccessTokenSilently({
+        authorizationParams: { audience: process.env.REACT_APP_AUTH0_API_AUDIENCE! },
+      });
+      const pagina = await listarUsuariosAPI(token, { limite: TAMANO_PAGINA, rol: filtroRol || null, cursor: siguienteCursor });
+      setUsuarios(prev => [...prev, ...pagina.items]);
+      setSiguienteCursor(pagina.siguiente_cursor);
+    } catch (error: any) {
+      console.error(error);
+      setMensaje(error.message || 'Error desconocido al cargar más usuarios');
+    } finally {
+      setCargandoMas(false);
+    }
+  };
 
   useEffect(() => {
     if (isAuthenticated) {
@@ -131,6 +163,21 @@ const ListarUsuarios: React.FC<ListarUsuariosProps> = ({ onUsuarioModificado })
   return (
     <div className="listar-pacientes-container">
       <h2 className="listar-pacientes-title">Lista de Usuarios</h2>
+
+      {isAuthenticated && (
+        <div className="filtros-usuarios">
+          <label htmlFor="filtro-rol">Rol: </label>
+          <select id="filtro-rol" value={filtroRol} onChange={(e) => setFiltroRol(e.target.value)}>
+            <option value="">Todos</option>
+            {ROLES_USUARIO.map((rol) => (
+              <option key={rol} value={rol}>{rol}</option>
+            ))}
+          </select>
+          {totalUsuarios !== null && (
+            <span> Mostrando {usuarios.length} de {totalUsuarios}</span>
+          )}
+        </div>
+      )}
       
       {isAuthenticated && mensaje && !mostrarModalEdicion && (
         <p className={`listar-pacientes-mensaje ${mensaje.includes('Error') ? 'error' : (mensaje.includes('exitosamente') ? 'success' : '')}`}>
@@ -169,6 +216,11 @@ const ListarUsuarios: React.FC<ListarUsuariosProps> = ({ onUsuarioModificado })
               ))}
             </tbody>
           </table>
+          {siguienteCursor && (
+            <button type="button" className="btn-accion" onClick={cargarMas} disabled={cargandoMas}>
+              {cargandoMas ? 'Cargando...' : 'Cargar más'}
+            </button>
+          )}
         </div>
       )}
 
@@ -2,7 +2,7 @@
 
 import React, { useState, useEffect, useCallback } from 'react';
 import { useAuth0 } from '@auth0/auth0-react';
-import { Paciente, Dispensacion, obtenerDispensacionesAPI, registrarDispensacionAPI } from '../api/pacientes';
+import { Paciente, Dispensacion, obtenerDispensacionesAPI, obtenerHistorialPacienteAPI, registrarDispensacionAPI } from '../api/pacientes';
 import './ModalHistorial.css';
 
 interface ModalHistorialProps {
@@ -10,29 +10,65 @@ interface ModalHistorialProps {
     onClose: () => void;
 }
 
+// Dispensaciones por página del historial
+const TAMANO_PAGINA = 20;
+
 const ModalHistorial: React.FC<ModalHistorialProps> = ({ paciente, onClose }) => {
     const { getAccessTokenSilently } = useAuth0();
+    const [datosPaciente, setDatosPaciente] = useState<Paciente>(paciente);
     const [historial, setHistorial] = useState<Dispensacion[]>([]);
+    const [siguienteCursor, setSiguienteCursor] = useState<string | null>(null);
     const [isLoading, setIsLoading] = useState(true);
+    const [isLoadingMas, setIsLoadingMas] = useState(false);
     const [error, setError] = useState<string | null>(null);
 
+    const [desde, setDesde] = useState('');
+    const [hasta, setHasta] = useState('');
+
     const [productoId, setProductoId] = useState('');
     const [cantidad, setCantidad] = useState(1);
 
+    // Primera página: el paciente y su historial llegan en una sola llamada
     const cargarHistorial = useCallback(async () => {
-        // ... (esta función no necesita cambios)
         setIsLoading(true);
         setError(null);
         try {
             const token = await getAccessTokenSilently();
-            const data = await obtenerDispensacionesAPI(paciente.id, token);
-            setHistorial(data);
+            const data = await obtenerHistorialPacienteAPI(paciente.id, token, {
+                limite: TAMANO_PAGINA,
+                desde: desde || undefined,
+                hasta: hasta || undefined,
+            });
+            setDatosPaciente(data.paciente);
+            setHistorial(data.dispensaciones.items);
+            setSiguienteCursor(data.dispensaciones.siguiente_cursor);
         } catch (err: any) {
             setError(err.message);
         } finally {
             setIsLoading(false);
         }
-    }, [paciente.id, getAccessTokenSilently]);
+    }, [paciente.id, desde, hasta, getAccessTokenSilently]);
+
+    const cargarMas = async () => {
+        if (!siguienteCursor) return;
+        setIsLoadingMas(true);
+        setError(null);
+        try {
+            const token = await getAccessTokenSilently();
+            const pagina = await obtenerDispensacionesAPI(paciente.id, token, {
+                limite: TAMANO_PAGINA,
+                cursor: siguienteCursor,
+                desde: desde || undefined,
+                hasta: hasta || undefined,
+            });
+            setHistorial(prev => [...prev, ...pagina.items]);
+            setSiguienteCursor(pagina.siguiente_cursor);
+        } catch (err: any) {
+            setError(err.message);
+        } finally {
+            setIsLoadingMas(false);
+        }
+    };
 
     useEffect(() => {
         cargarHistorial();
@@ -72,7 +108,7 @@ const ModalHistorial: React.FC<ModalHistorialProps> = ({ paciente, onClose }) =>
         <div className="modal-historial">
             <div className="modal-contenido-historial">
                 <span className="cerrar-modal" onClick={onClose}>&times;</span>
-                <h3>Historial de: {paciente.nombre}</h3>
+                <h3>Historial de: {datosPaciente.nombre}</h3>
                 {error && <div className="alert alert-danger">{error}</div>}
 
                 {/* Formulario para nueva dispensación */}
@@ -103,13 +139,19 @@ const ModalHistorial: React.FC<ModalHistorialProps> = ({ paciente, onClose }) =>
 
                 {/* Tabla de historial */}
                 <h5>Dispensaciones Realizadas</h5>
+                <div className="form-inline-historial mb-2">
+                    <label className="mr-2">Desde</label>
+                    <input type="date" value={desde} onChange={(e) => setDesde(e.target.value)} className="form-control mr-2" />
+                    <label className="mr-2">Hasta</label>
+                    <input type="date" value={hasta} onChange={(e) => setHasta(e.target.value)} className="form-control mr-2" />
+                </div>
                 {isLoading ? <p>Cargando historial...</p> : (
                     <div className="tabla-responsive-container">
                         <table className="pacientes-table">
                             <thead>
                                 <tr>
                                     <th>Fecha</th>
-                                    <th>ID Producto</th>
+                                    <th>Producto</th>
                                     <th>Cantidad</th>
                                 </tr>
                             </thead>
@@ -118,7 +160,7 @@ const ModalHistorial: React.FC<ModalHistorialProps> = ({ paciente, onClose }) =>
                                     historial.map(d => (
                                         <tr key={d.id}>
                                             <td>{new Date(d.fecha_dispensacion).toLocaleString('es-CL')}</td>
-                                            <td>{d.producto_id}</td>
+                                            <td>{d.nombre_producto ?? `ID ${d.producto_id}`}</td>
                                             <td>{d.cantidad}</td>
                                         </tr>
                                     ))
@@ -129,6 +171,11 @@ const ModalHistorial: React.FC<ModalHistorialProps> = ({ paciente, onClose }) =>
                                 )}
                             </tbody>
                         </table>
+                        {siguienteCursor && (
+                            <button type="button" className="btn btn-secondary mt-2" onClick={cargarMas} disabled={isLoadingMas}>
+                                {isLoadingMas ? 'Cargando...' : 'Cargar más'}
+                            </button>
+                        )}
                     </div>
                 )}
             </div>
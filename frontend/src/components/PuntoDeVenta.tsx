@@ -1,9 +1,12 @@
 // frontend/src/components/PuntoDeVenta.tsx
 
-import React, { useState, useEffect, useCallback, ChangeEvent, FormEvent } from 'react';
+import React, { useState, useEffect, useCallback, useRef, ChangeEvent, FormEvent } from 'react';
 import { useAuth0 } from '@auth0/auth0-react';
-import { Paciente, obtenerPacientePorRutAPI, registrarDispensacionAPI } from '../api/pacientes';
-import { Producto, listarProductosAPI } from '../api/inventario';
+import { Paciente, obtenerPacientePorRutAPI, registrarDispensacionesAPI } from '../api/pacientes';
+import { Producto, URL_EVENTOS_STOCK } from '../api/inventario';
+import { CambioStock, aplicarCambiosStock, obtenerCatalogo } from '../api/catalogoLocal';
+import { escucharEventos } from '../api/eventos';
+import { VentaPendiente, descartarVenta, encolarVenta, enviarVentasPendientes, leerVentasPendientes } from '../api/colaVentas';
 import './FormularioPaciente.css'; // Reutilizamos estilos generales de formulario
 import './PuntoDeVenta.css'; // Estilos específicos para este componente (lo crearemos)
 
@@ -11,6 +14,12 @@ interface CartItem extends Producto {
     cantidadEnCesta: number;
 }
 
+// Cada cuánto se sincroniza el catálogo (solo sin el stream de stock) y se
+// reintenta enviar la cola
+const INTERVALO_SINCRONIZACION_MS = 30000;
+// Espera tras un cobro antes de enviar: los cobros seguidos van en un lote
+const ESPERA_ENVIO_MS = 2000;
+
 const PuntoDeVenta: React.FC = () => {
     const { getAccessTokenSilently, isAuthenticated } = useAuth0();
 
@@ -31,24 +40,114 @@ const PuntoDeVenta: React.FC = () => {
     const [mensajeVenta, setMensajeVenta] = useState<string | null>(null);
     const [isProcessingSale, setIsProcessingSale] = useState<boolean>(false);
 
-    // Cargar productos disponibles al iniciar
-    useEffect(() => {
-        const fetchProductos = async () => {
-            if (!isAuthenticated) return;
-            setCargandoProductos(true);
+    // Ventas cobradas sin paciente que esperan ser enviadas a transacciones
+    const [ventasPendientes, setVentasPendientes] = useState<VentaPendiente[]>([]);
+    const [sinConexion, setSinConexion] = useState<boolean>(false);
+    const temporizadorEnvio = useRef<ReturnType<typeof setTimeout> | null>(null);
+    // true mientras el stream de stock está conectado: el stock llega solo
+    const enVivo = useRef<boolean>(false);
+
+    // El catálogo sale de la copia local del navegador; solo se piden a
+    // inventario los cambios desde la última sincronización
+    const cargarCatalogo = useCallback(async () => {
+        try {
+            const token = await getAccessTokenSilently();
+            const catalogo = await obtenerCatalogo(token);
+            setProductosDisponibles(catalogo.productos);
+            setSinConexion(catalogo.sinConexion);
             setErrorProductos(null);
-            try {
-                const token = await getAccessTokenSilently();
-                const data = await listarProductosAPI(token);
-                setProductosDisponibles(data);
-            } catch (err: any) {
-                setErrorProductos(err.message || 'Error al cargar productos.');
-            } finally {
-                setCargandoProductos(false);
+        } catch (err: any) {
+            setErrorProductos(err.message || 'Error al cargar productos.');
+        }
+    }, [getAccessTokenSilently]);
+
+    const enviarPendientes = useCallback(async () => {
+        try {
+            const token = await getAccessTokenSilently();
+            const resultado = await enviarVentasPendientes(token);
+            setSinConexion(false);
+            if (resultado.enviadas > 0 && !enVivo.current) {
+                cargarCatalogo(); // El stock ya incluye estas ventas
             }
+        } catch (err) {
+            // Sin conexión: las ventas siguen en la cola para el próximo intento
+            setSinConexion(true);
+        } finally {
+            setVentasPendientes(await leerVentasPendientes().catch(() => [] as VentaPendiente[]));
+        }
+    }, [getAccessTokenSilently, cargarCatalogo]);
+
+    const programarEnvio = () => {
+        if (temporizadorEnvio.current) clearTimeout(temporizadorEnvio.current);
+        temporizadorEnvio.current = setTimeout(enviarPendientes, ESPERA_ENVIO_MS);
+    };
+
+    // Cargar el catálogo y enviar lo pendiente al iniciar; después, cada
+    // INTERVALO_SINCRONIZACION_MS y cuando vuelve la conexión
+    useEffect(() => {
+        if (!isAuthenticated) return;
+        const iniciar = async () => {
+            setCargandoProductos(true);
+            await cargarCatalogo();
+            setCargandoProductos(false);
+            enviarPendientes();
+        };
+        iniciar();
+        const sincronizar = () => {
+            if (!enVivo.current) cargarCatalogo();
+            enviarPendientes();
         };
-        fetchProductos();
-    }, [isAuthenticated, getAccessTokenSilently]);
+        const intervalo = setInterval(sincronizar, INTERVALO_SINCRONIZACION_MS);
+        window.addEventListener('online', sincronizar);
+        return () => {
+            clearInterval(intervalo);
+            window.removeEventListener('online', sincronizar);
+            if (temporizadorEnvio.current) clearTimeout(temporizadorEnvio.current);
+        };
+    }, [isAuthenticated, cargarCatalogo, enviarPendientes]);
+
+    // Stock en vivo: inventario empuja los cambios (ventas de otras cajas,
+    // compras recibidas) en vez de esperar la próxima sincronización. Al
+    // conectarse y cuando el servicio pide 'resincronizar' se relee lo que
+    // cambió desde la última versión, para cubrir los eventos perdidos.
+    useEffect(() => {
+        if (!isAuthenticated) return;
+        const cerrar = escucharEventos(URL_EVENTOS_STOCK, () => getAccessTokenSilently(), {
+            alConectar: () => {
+                enVivo.current = true;
+                cargarCatalogo();
+            },
+            alDesconectar: () => {
+                enVivo.current = false;
+            },
+            alEvento: async (evento, datos) => {
+                if (evento === 'resincronizar') {
+                    cargarCatalogo();
+                } else if (evento === 'stock') {
+                    try {
+                        const resultado = await aplicarCambiosStock(datos.productos as CambioStock[]);
+                        setProductosDisponibles(resultado.productos);
+                        if (resultado.desconocidos) cargarCatalogo();
+                    } catch (err) {
+                        cargarCatalogo();
+                    }
+                }
+            },
+        });
+        return () => {
+            enVivo.current = false;
+            cerrar();
+        };
+    }, [isAuthenticated, getAccessTokenSilently, cargarCatalogo]);
+
+    // Stock descontando las ventas que aún no llegan al servidor
+    const reservado: { [productoId: number]: number } = {};
+    ventasPendientes.filter(v => !v.rechazo).forEach(v =>
+        v.productos.forEach(p => {
+            reservado[p.producto_id] = (reservado[p.producto_id] || 0) + p.cantidad;
+        })
+    );
+    const stockLocal = (product: Producto) => Math.max(product.stock - (reservado[product.id] || 0), 0);
 
     // Manejar búsqueda de paciente por RUT
     const handleBuscarPaciente = async (e: FormEvent) => {
@@ -85,8 +184,8 @@ const PuntoDeVenta: React.FC = () => {
             setMensajeVenta('La cantidad debe ser mayor a 0.');
             return;
         }
-        if (product.stock < quantity) {
-            setMensajeVenta(`No hay suficiente stock para ${product.nombre}. Stock disponible: ${product.stock}`);
+        if (stockLocal(product) < quantity) {
+            setMensajeVenta(`No hay suficiente stock para ${product.nombre}. Stock disponible: ${stockLocal(product)}`);
             return;
         }
 
@@ -94,7 +193,7 @@ const PuntoDeVenta: React.FC = () => {
             const existingItem = prevCart.find(item => item.id === product.id);
             if (existingItem) {
                 const newQuantity = existingItem.cantidadEnCesta + quantity;
-                if (product.stock < newQuantity) {
+                if (stockLocal(product) < newQuantity) {
                     setMensajeVenta(`La cantidad total en la cesta de ${product.nombre} excede el stock disponible.`);
                     return prevCart;
                 }
@@ -115,8 +214,8 @@ const PuntoDeVenta: React.FC = () => {
                 return prevCart.filter(item => item.id !== productId);
             }
             const productInList = productosDisponibles.find(p => p.id === productId);
-            if (productInList && newQuantity > productInList.stock) {
-                 setMensajeVenta(`No hay suficiente stock para esta cantidad de ${productInList.nombre}. Stock disponible: ${productInList.stock}`);
+            if (productInList && newQuantity > stockLocal(productInList)) {
+                 setMensajeVenta(`No hay suficiente stock para esta cantidad de ${productInList.nombre}. Stock disponible: ${stockLocal(productInList)}`);
                  return prevCart; // No actualizar si excede stock
             }
             return prevCart.map(item =>
@@ -134,35 +233,50 @@ const PuntoDeVenta: React.FC = () => {
         return cart.reduce((total, item) => total + (item.precio_venta * item.cantidadEnCesta), 0);
     };
 
-    // Procesar la venta
+    // Procesar la venta. Sin paciente es una venta de mostrador: se guarda
+    // en la cola local al momento y se envía en segundo plano. Con paciente
+    // es una dispensación, que se registra en línea en su historial.
     const handleProcesarVenta = async () => {
-        if (!isAuthenticated || !pacienteSeleccionado) {
-            setMensajeVenta('Debe seleccionar un paciente para procesar la venta.');
-            return;
-        }
+        if (!isAuthenticated) return;
         if (cart.length === 0) {
             setMensajeVenta('La cesta está vacía.');
             return;
         }
 
         setIsProcessingSale(true);
+
+        if (!pacienteSeleccionado) {
+            try {
+                const venta = await encolarVenta(
+                    cart.map(item => ({ producto_id: item.id, cantidad: item.cantidadEnCesta })),
+                    calcularTotal()
+                );
+                setVentasPendientes(prev => [...prev, venta]);
+                setCart([]);
+                setMensajeVenta('Venta registrada. Se enviará al servidor en segundo plano.');
+                programarEnvio();
+            } catch (err: any) {
+                setMensajeVenta(`Error al guardar la venta: ${err.message || err}`);
+            } finally {
+                setIsProcessingSale(false);
+            }
+            return;
+        }
+
         setMensajeVenta('Procesando venta...');
 
         try {
             const token = await getAccessTokenSilently();
-            for (const item of cart) {
-                // Registrar cada producto como una dispensación
-                await registrarDispensacionAPI(
-                    pacienteSeleccionado.id,
-                    { producto_id: item.id, cantidad: item.cantidadEnCesta },
-                    token
-                );
-            }
+            // Toda la cesta se registra como una sola dispensación
+            await registrarDispensacionesAPI(
+                pacienteSeleccionado.id,
+                cart.map(item => ({ producto_id: item.id, cantidad: item.cantidadEnCesta })),
+                token
+            );
             setMensajeVenta('Venta registrada con éxito y stock actualizado.');
             setCart([]); // Limpiar la cesta
-            // Opcional: recargar productos disponibles para reflejar nuevo stock
-            const updatedProducts = await listarProductosAPI(token);
-            setProductosDisponibles(updatedProducts);
+            // Trae del servidor el nuevo stock
+            await cargarCatalogo();
 
         } catch (err: any) {
             console.error('Error al procesar la venta:', err);
@@ -179,6 +293,7 @@ const PuntoDeVenta: React.FC = () => {
     return (
         <div className="punto-de-venta-container">
             <h2 className="section-title">Módulo de Caja: Punto de Venta</h2>
+            {sinConexion && <p className="mensaje-feedback error">Sin conexión con el servidor: se usa el catálogo guardado y las ventas quedan en cola.</p>}
             {mensajeVenta && <p className={`mensaje-feedback ${mensajeVenta.includes('Error') ? 'error' : 'success'}`}>{mensajeVenta}</p>}
 
             <div className="pos-grid">
@@ -203,11 +318,11 @@ const PuntoDeVenta: React.FC = () => {
                                     <ul className="product-selection-list">
                                         {productosFiltrados.map(p => (
                                             <li key={p.id}>
-                                                <span>{p.nombre} (${p.precio_venta.toLocaleString('es-CL')}) - Stock: {p.stock}</span>
+                                                <span>{p.nombre} (${p.precio_venta.toLocaleString('es-CL')}) - Stock: {stockLocal(p)}</span>
                                                 <button 
                                                     className="btn btn-add-to-cart" 
                                                     onClick={() => addToCart(p, 1)}
-                                                    disabled={p.stock <= 0}
+                                                    disabled={stockLocal(p) <= 0}
                                                 >
                                                     Añadir
                                                 </button>
@@ -284,16 +399,32 @@ const PuntoDeVenta: React.FC = () => {
                             <h5 className="card-title">Confirmar Venta</h5>
                             <div className="resumen-venta">
                                 <p>Productos en cesta: {cart.length}</p>
-                                <p>Paciente seleccionado: {pacienteSeleccionado ? pacienteSeleccionado.nombre : 'Ninguno'}</p>
+                                <p>Paciente seleccionado: {pacienteSeleccionado ? pacienteSeleccionado.nombre : 'Ninguno (venta de mostrador)'}</p>
                                 <p>Total a pagar: <strong>${calcularTotal().toLocaleString('es-CL')}</strong></p>
                             </div>
                             <button
                                 className="btn btn-primary btn-large mt-3"
                                 onClick={handleProcesarVenta}
-                                disabled={isProcessingSale || cart.length === 0 || !pacienteSeleccionado}
+                                disabled={isProcessingSale || cart.length === 0}
                             >
                                 {isProcessingSale ? 'Procesando...' : 'Procesar Venta'}
                             </button>
+                            {ventasPendientes.length > 0 && (
+                                <div className="ventas-pendientes">
+                                    <p>Ventas por enviar: {ventasPendientes.filter(v => !v.rechazo).length}</p>
+                                    {ventasPendientes.filter(v => v.rechazo).map(v => (
+                                        <p key={v.id_cliente} className="mensaje-feedback error">
+                                            Venta del {new Date(v.fecha).toLocaleString('es-CL')} rechazada: {v.rechazo}
+                                            <button className="btn-remove-item" onClick={async () => {
+                                                await descartarVenta(v.id_cliente);
+                                                setVentasPendientes(prev => prev.filter(x => x.id_cliente !== v.id_cliente));
+                                            }}>
+                                                &times;
+                                            </button>
+                                        </p>
+                                    ))}
+                                </div>
+                            )}
                         </div>
                     </div>
                 </div>
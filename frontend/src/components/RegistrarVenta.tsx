@@ -3,7 +3,8 @@
 import React, { useState, useEffect, FormEvent, ChangeEvent } from 'react';
 import { useAuth0 } from '@auth0/auth0-react';
 import { Paciente, obtenerPacientePorRutAPI, registrarDispensacionAPI } from '../api/pacientes';
-import { Producto, listarProductosAPI } from '../api/inventario';
+import { Producto } from '../api/inventario';
+import { obtenerCatalogo } from '../api/catalogoLocal';
 import './FormularioPaciente.css'; // Reutilizamos estilos generales de formulario
 import './RegistrarVenta.css'; // Crearemos este archivo para estilos específicos
 
@@ -24,7 +25,8 @@ const RegistrarVenta: React.FC = () => {
   const [mensajeDispensacion, setMensajeDispensacion] = useState<string | null>(null);
   const [isSubmittingDispensacion, setIsSubmittingDispensacion] = useState<boolean>(false);
 
-  // Cargar productos disponibles al iniciar
+  // Cargar productos disponibles al iniciar (copia local del catálogo,
+  // actualizada con los cambios desde la última visita)
   useEffect(() => {
     const fetchProductos = async () => {
       if (!isAuthenticated) return;
@@ -32,7 +34,7 @@ const RegistrarVenta: React.FC = () => {
       setErrorProductos(null);
       try {
         const token = await getAccessTokenSilently();
-        const data = await listarProductosAPI(token);
+        const { productos: data } = await obtenerCatalogo(token);
         setProductosDisponibles(data);
         if (data.length > 0) {
           setProductoSeleccionadoId(data[0].id.toString()); // Seleccionar el primero por defecto
@@ -0,0 +1,68 @@
+# informes/archivo_ventas.py
+#
+# Lectura del archivo histórico de ventas. Los meses más antiguos que la
+# retención se sacan de PostgreSQL (mantenimiento_ventas.py) y quedan como
+# Parquet comprimido, un archivo por partición mensual:
+#
+#     ARCHIVO_VENTAS_DIR/ventas/p2024_01.parquet
+#     ARCHIVO_VENTAS_DIR/detalles_venta/p2024_01.parquet
+#
+# Los reportes solo necesitan los detalles (llevan venta_id y la fecha de la
+# venta), así que aquí se leen únicamente esos archivos.
+
+import os
+from datetime import date, datetime
+
+ARCHIVO_VENTAS_DIR = os.environ.get("ARCHIVO_VENTAS_DIR", "/var/lib/informes/archivo")
+
+
+def ruta_mes(tabla: str, mes: date) -> str:
+    return os.path.join(ARCHIVO_VENTAS_DIR, tabla, mes.strftime("p%Y_%m") + ".parquet")
+
+
+def meses_archivados(tabla: str = "detalles_venta") -> list:
+    """Primer día de cada mes archivado, en orden."""
+    directorio = os.path.join(ARCHIVO_VENTAS_DIR, tabla)
+    if not os.path.isdir(directorio):
+        return []
+    meses = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(".parquet"):
+            continue
+        try:
+            meses.append(datetime.strptime(nombre[:-len(".parquet")], "p%Y_%m").date())
+        except ValueError:
+            continue
+    return sorted(meses)
+
+
+def archivos_en_rango(desde: date, hasta=None) -> list:
+    """Archivos de detalles de los meses que se cruzan con [desde, hasta]."""
+    inicio = desde.replace(day=1)
+    return [
+        ruta_mes("detalles_venta", mes)
+        for mes in meses_archivados()
+        if mes >= inicio and (hasta is None or mes <= hasta)
+    ]
+
+
+def leer_detalles(desde: datetime, hasta=None, columnas=None):
+    """
+    Itera los detalles archivados con fecha en [desde, hasta] como bloques de
+    pandas, mes por mes en orden cronológico. pyarrow aplica el filtro con
+    las estadísticas de cada row group, así que no se lee el mes completo si
+    el rango solo toca una parte.
+    """
+    import pyarrow.dataset as ds
+
+    rutas = archivos_en_rango(desde.date() if isinstance(desde, datetime) else desde,
+                              hasta.date() if isinstance(hasta, datetime) else hasta)
+    if not rutas:
+        return
+    filtro = ds.field("fecha") >= desde
+    if hasta is not None:
+        filtro = filtro & (ds.field("fecha") <= hasta)
+    for ruta in rutas:
+        for lote in ds.dataset(ruta, format="parquet").to_batches(columns=columnas, filter=filtro):
+            if lote.num_rows:
+                yield lote.to_pandas()
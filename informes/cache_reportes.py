@@ -0,0 +1,65 @@
+# informes/cache_reportes.py
+#
+# Caché en disco de los archivos de reportes ya generados, con desalojo LRU
+# acotado por tamaño. El orden de uso se guarda en el atime de cada archivo
+# (lo fijamos explícitamente con os.utime, así no depende de 'noatime') y el
+# mtime queda como fecha de generación para la cabecera Last-Modified.
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheReportes:
+    def __init__(self, directorio: str, max_bytes: int):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def ruta(self, clave: str) -> str:
+        # La clave ya incluye el formato; el nombre de descarga se fija al servir
+        return os.path.join(self.directorio, clave)
+
+    def obtener(self, clave: str):
+        """Devuelve la ruta del archivo cacheado (marcándolo como usado) o None."""
+        ruta = self.ruta(clave)
+        try:
+            mtime = os.stat(ruta).st_mtime
+            os.utime(ruta, (time.time(), mtime))
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def registrar(self, clave: str):
+        """Se llama después de escribir un archivo nuevo; aplica el límite de tamaño."""
+        self.obtener(clave)
+        self.desalojar()
+
+    def desalojar(self):
+        with self._lock:
+            archivos = []
+            total = 0
+            with os.scandir(self.directorio) as entradas:
+                for entrada in entradas:
+                    # Se ignoran los archivos a medio escribir (*.tmp)
+                    if not entrada.is_file() or entrada.name.endswith(".tmp"):
+                        continue
+                    info = entrada.stat()
+                    archivos.append((info.st_atime, info.st_size, entrada.path))
+                    total += info.st_size
+            if total <= self.max_bytes:
+                return
+            # Los menos usados recientemente primero
+            for _, tamano, ruta in sorted(archivos):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                    total -= tamano
+                    logger.info(f"Reporte desalojado del caché: {os.path.basename(ruta)}")
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,307 @@
+# informes/dashboard.py
+#
+# KPIs del dashboard mantenidos en memoria de forma incremental.
+# Al arrancar se siembran con una consulta a la BD y luego se actualizan con
+# los eventos de Kafka: 'topic_ventas' (ventas nuevas) y 'topic_inventario'
+# (cambios de stock publicados por el servicio de inventario). Así el endpoint
+# de resumen no recorre tablas en cada petición.
+#
+# La copia de los productos se completa además con los cambios por versión
+# (comun/cambios.py): al calcular el resumen se leen solo los productos que
+# cambiaron desde la última lectura, lo que corrige eventos perdidos y
+# cambios de nombre sin volver a leer todo el catálogo.
+#
+# Las ventas del día también se empujan a los dashboards abiertos por SSE
+# (canal_ventas, GET /api/informes/eventos/ventas): cada venta aplicada marca
+# el canal y, a lo más una vez por SSE_INTERVALO_SEGUNDOS, sale un evento con
+# los totales y el top del momento.
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime
+
+from kafka import KafkaConsumer
+from kafka.errors import KafkaError
+from sqlalchemy import text
+
+from comun.cambios import aplicar_cambios, leer_cambios
+from comun.kafka import MedidorLag
+from comun.sse import CanalSSE
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+TOPIC_VENTAS = "topic_ventas"
+TOPIC_INVENTARIO = "topic_inventario"
+# Segundos que se reutiliza una respuesta del resumen entre peticiones
+DASHBOARD_TTL_SEGUNDOS = float(os.environ.get("DASHBOARD_TTL_SEGUNDOS", "5"))
+# Ids de ventas aplicadas desde la siembra que se recuerdan para descartar
+# eventos repetidos
+DASHBOARD_VENTAS_RECIENTES = int(os.environ.get("DASHBOARD_VENTAS_RECIENTES", "10000"))
+
+_lock = threading.Lock()
+_estado = {
+    "dia": None,
+    "total_ventas": 0.0,
+    "transacciones": 0,
+    "vendidos": Counter(),      # producto_id -> unidades vendidas hoy
+    # Las ventas se confirman (y publican) fuera de orden de id: los
+    # repetidos se reconocen por id exacto, no por el máximo visto
+    "ventas_sembradas": set(),          # ids que ya contó la siembra
+    "ventas_recientes": OrderedDict(),  # ids aplicados desde la siembra (acotado)
+    "productos": {},            # producto_id -> {"nombre", "stock"}
+    "version_productos": 0,     # versión de la copia de productos (0: sin leer)
+    "en_vivo": False,           # True mientras el consumidor de Kafka está activo
+}
+_cache_respuestas = {}          # (top, umbral) -> (instante, respuesta)
+TOP_EN_VIVO = 5                 # productos del top en los eventos de ventas
+
+
+# --- SIEMBRA DESDE LA BASE DE DATOS ---
+
+def _sembrar_ventas_del_dia(db, hoy: date):
+    total, transacciones, ids = db.execute(
+        text("SELECT COALESCE(SUM(total), 0), COUNT(*), COALESCE(array_agg(id), '{}') FROM ventas WHERE fecha >= :hoy"),
+        {"hoy": hoy},
+    ).one()
+    vendidos = db.execute(
+        # El detalle lleva la fecha de su venta: solo se lee la partición del
+        # mes. Solo las ventas de 'ids': una venta confirmada entre las dos
+        # consultas la cuenta su evento, no la siembra.
+        text("""
+            SELECT producto_id, SUM(cantidad) FROM detalles_venta
+            WHERE fecha >= :hoy AND venta_id = ANY(:ids)
+            GROUP BY producto_id
+        """),
+        {"hoy": hoy, "ids": list(ids)},
+    ).all()
+    _estado["dia"] = hoy
+    _estado["total_ventas"] = float(total)
+    _estado["transacciones"] = int(transacciones)
+    _estado["vendidos"] = Counter({producto_id: int(cantidad) for producto_id, cantidad in vendidos})
+    _estado["ventas_sembradas"] = set(ids)
+    _estado["ventas_recientes"] = OrderedDict()
+
+
+SQL_TODOS_LOS_PRODUCTOS = text("SELECT producto_id AS id, nombre, stock FROM stock_actual")
+SQL_PRODUCTOS_CAMBIADOS = text("""
+    WITH cambiados AS (
+        SELECT id FROM productos WHERE version >= :desde AND version < :hasta
+        UNION
+        SELECT producto_id FROM movimientos_stock WHERE version >= :desde AND version < :hasta
+    )
+    SELECT s.producto_id AS id, s.nombre, s.stock
+    FROM cambiados c JOIN stock_actual s ON s.producto_id = c.id
+""")
+SQL_PRODUCTOS_ELIMINADOS = text(
+    "SELECT producto_id FROM productos_eliminados WHERE version >= :desde AND version < :hasta"
+)
+
+
+def _refrescar_productos(db):
+    # La primera vez (versión 0) lee todo el catálogo; después, solo lo que cambió
+    cambios = leer_cambios(db, _estado["version_productos"],
+                           SQL_TODOS_LOS_PRODUCTOS, SQL_PRODUCTOS_CAMBIADOS, SQL_PRODUCTOS_ELIMINADOS)
+    with _lock:
+        _estado["productos"] = aplicar_cambios(
+            _estado["productos"], cambios, valor=lambda p: {"nombre": p.nombre, "stock": p.stock or 0})
+        _estado["version_productos"] = max(_estado["version_productos"], cambios["version"])
+
+
+def refrescar_productos():
+    db = SessionLocal()
+    try:
+        _refrescar_productos(db)
+    finally:
+        db.close()
+
+
+def sembrar():
+    db = SessionLocal()
+    try:
+        _refrescar_productos(db)
+        with _lock:
+            _sembrar_ventas_del_dia(db, date.today())
+            _cache_respuestas.clear()
+    finally:
+        db.close()
+
+
+def _rotar_dia_si_corresponde():
+    # Llamar con _lock tomado. Al cambiar de día los contadores de ventas parten de cero.
+    hoy = date.today()
+    if _estado["dia"] != hoy:
+        _estado["dia"] = hoy
+        _estado["total_ventas"] = 0.0
+        _estado["transacciones"] = 0
+        _estado["vendidos"] = Counter()
+        _estado["ventas_sembradas"] = set()
+        _estado["ventas_recientes"] = OrderedDict()
+        _cache_respuestas.clear()
+
+
+# --- APLICACIÓN DE EVENTOS ---
+
+def aplicar_venta(evento: dict):
+    venta_id = evento.get("venta_id")
+    with _lock:
+        _rotar_dia_si_corresponde()
+        recientes = _estado["ventas_recientes"]
+        if venta_id is not None and (venta_id in _estado["ventas_sembradas"] or venta_id in recientes):
+            return
+        fecha = evento.get("fecha")
+        if fecha and datetime.fromisoformat(fecha).date() != _estado["dia"]:
+            return
+        if venta_id is not None:
+            recientes[venta_id] = True
+            while len(recientes) > DASHBOARD_VENTAS_RECIENTES:
+                recientes.popitem(last=False)
+        _estado["total_ventas"] += float(evento.get("total") or 0)
+        _estado["transacciones"] += 1
+        for item in evento.get("productos", []):
+            if item.get("producto_id") is not None and isinstance(item.get("cantidad"), int):
+                _estado["vendidos"][item["producto_id"]] += item["cantidad"]
+    # Las ventas de una ráfaga salen en un solo evento con los totales al enviarlo
+    canal_ventas.publicar({"ventas": True})
+
+
+def aplicar_inventario(evento: dict):
+    with _lock:
+        if evento.get("accion") == "PRODUCTO_ELIMINADO":
+            _estado["productos"].pop(evento.get("producto_id"), None)
+            return
+        for item in evento.get("productos", []):
+            producto = _estado["productos"].setdefault(item["producto_id"], {"nombre": None, "stock": 0})
+            if item.get("nombre") is not None:
+                producto["nombre"] = item["nombre"]
+            producto["stock"] = item.get("stock") or 0
+
+
+def consumir_eventos():
+    """
+    Hilo del consumidor. No usa group_id: cada proceso de la API recibe TODOS
+    los eventos y mantiene su propia copia de los contadores. Se suscribe
+    antes de sembrar para no perder ventas entre la siembra y la suscripción;
+    las que la siembra ya contó se descartan por 'ventas_sembradas'.
+    """
+    try:
+        consumer = KafkaConsumer(
+            TOPIC_VENTAS, TOPIC_INVENTARIO,
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+            group_id=None,
+            auto_offset_reset='latest',
+            api_version=(2, 8, 1)
+        )
+        # Forzamos la asignación de particiones y la posición 'latest' ahora
+        consumer.poll(timeout_ms=0)
+    except KafkaError as e:
+        logger.error(f"Dashboard sin eventos en vivo, no se pudo conectar a Kafka: {e}")
+        return
+
+    sembrar()
+    _estado["en_vivo"] = True
+    logger.info("Contadores del dashboard sembrados; escuchando eventos de ventas e inventario.")
+    lag = MedidorLag("informes-dashboard")
+    try:
+        for message in consumer:
+            lag.actualizar(consumer)
+            try:
+                if message.topic == TOPIC_VENTAS:
+                    aplicar_venta(message.value)
+                else:
+                    aplicar_inventario(message.value)
+            except Exception as e:
+                logger.error(f"Error aplicando evento del dashboard ({message.topic}): {e}")
+    finally:
+        _estado["en_vivo"] = False
+
+
+def iniciar():
+    hilo = threading.Thread(target=consumir_eventos, daemon=True)
+    hilo.start()
+
+
+# --- RESUMEN ---
+
+def _ventas_del_dia(top: int) -> dict:
+    # Llamar con _lock tomado
+    productos = _estado["productos"]
+    return {
+        "fecha": _estado["dia"],
+        "total_ventas_hoy": round(_estado["total_ventas"], 2),
+        "transacciones_hoy": _estado["transacciones"],
+        "top_productos_hoy": [
+            {
+                "producto_id": producto_id,
+                "nombre": productos.get(producto_id, {}).get("nombre"),
+                "cantidad_vendida": cantidad,
+            }
+            for producto_id, cantidad in _estado["vendidos"].most_common(top)
+        ],
+    }
+
+
+def ventas_del_dia(top: int = TOP_EN_VIVO) -> dict:
+    """Total, transacciones y top del día según los contadores actuales."""
+    with _lock:
+        _rotar_dia_si_corresponde()
+        return _ventas_del_dia(top)
+
+
+# El evento no lleva las ventas sueltas sino el estado al momento de enviarlo
+canal_ventas = CanalSSE("informes_ventas", "ventas", armar=lambda _cambios: ventas_del_dia())
+
+
+def _ordenes_recientes(limite: int = 5):
+    db = SessionLocal()
+    try:
+        filas = db.execute(
+            text("SELECT id, proveedor, fecha_creacion, estado FROM ordenes_compra ORDER BY id DESC LIMIT :limite"),
+            {"limite": limite},
+        ).mappings().all()
+        return [dict(f) for f in filas]
+    finally:
+        db.close()
+
+
+def resumen(top: int = 5, umbral_stock: int = 10) -> dict:
+    """
+    Arma el resumen a partir de los contadores. La respuesta se reutiliza
+    durante DASHBOARD_TTL_SEGUNDOS para que muchos terminales con el
+    dashboard abierto no multipliquen las consultas.
+    """
+    clave = (top, umbral_stock)
+    ahora = time.monotonic()
+    cacheada = _cache_respuestas.get(clave)
+    if cacheada is not None and ahora - cacheada[0] < DASHBOARD_TTL_SEGUNDOS:
+        return cacheada[1]
+
+    # Sin consumidor activo los contadores no se actualizan solos: se
+    # vuelven a sembrar (a lo más una vez por TTL gracias al caché).
+    if not _estado["en_vivo"]:
+        sembrar()
+    else:
+        # Los eventos de inventario son de mejor esfuerzo: se completa la
+        # copia con lo que cambió en la base desde la última lectura
+        refrescar_productos()
+
+    ordenes = _ordenes_recientes()
+    with _lock:
+        _rotar_dia_si_corresponde()
+        productos = _estado["productos"]
+        respuesta = {
+            **_ventas_del_dia(top),
+            "total_productos": len(productos),
+            "productos_stock_bajo": sum(1 for p in productos.values() if p["stock"] <= umbral_stock),
+            "ordenes_compra_recientes": ordenes,
+            "en_vivo": _estado["en_vivo"],
+            "generado": datetime.utcnow(),
+        }
+        _cache_respuestas[clave] = (ahora, respuesta)
+    return respuesta
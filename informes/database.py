@@ -0,0 +1,16 @@
+# informes/database.py
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import declarative_base
+
+load_dotenv()
+
+from comun.db import crear_engine, crear_sesiones, dependencia_db
+
+# Engine con pool compartido (comun/db.py). Cada proceso del pool de
+# reportes importa este módulo y arma su propio pool.
+engine = crear_engine(nombre_aplicacion="informes")
+SessionLocal = crear_sesiones(engine)
+Base = declarative_base()
+
+get_db = dependencia_db(SessionLocal)
@@ -0,0 +1,195 @@
+# informes/mantenimiento_ventas.py
+#
+# Mantenimiento de las particiones mensuales de ventas / detalles_venta:
+#   1. Crea el mes actual y los siguientes (crear_particiones_ventas, ver la
+#      migración 0003), para que las ventas nuevas nunca caigan en DEFAULT.
+#   2. Archiva los meses más antiguos que VENTAS_RETENCION_MESES: cada
+#      partición se escribe a Parquet (zstd) en ARCHIVO_VENTAS_DIR y luego se
+#      separa y elimina de la base. informes sigue leyendo esos meses desde
+#      los archivos (archivo_ventas.py).
+#
+# Uso:
+#     python mantenimiento_ventas.py                # una pasada
+#     python mantenimiento_ventas.py --cada-horas 24  # en bucle (servicio)
+
+import argparse
+import logging
+import os
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+from archivo_ventas import ARCHIVO_VENTAS_DIR, ruta_mes
+from database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VENTAS_RETENCION_MESES = int(os.environ.get("VENTAS_RETENCION_MESES", "24"))
+VENTAS_MESES_ADELANTE = int(os.environ.get("VENTAS_MESES_ADELANTE", "3"))
+ARCHIVO_CHUNK_FILAS = int(os.environ.get("ARCHIVO_CHUNK_FILAS", "50000"))
+# Tiempo máximo esperando los bloqueos para separar una partición; si se
+# agota, el mes se reintenta en la próxima pasada.
+ARCHIVO_LOCK_TIMEOUT = os.environ.get("ARCHIVO_LOCK_TIMEOUT", "5s")
+
+# Las tablas se archivan en este orden y se separan en el inverso (los
+# detalles primero, por la FK hacia ventas).
+TABLAS = ("ventas", "detalles_venta")
+
+
+def crear_particiones() -> int:
+    with engine.begin() as conn:
+        creadas = conn.execute(text("SELECT crear_particiones_ventas(:meses)"), {"meses": VENTAS_MESES_ADELANTE}).scalar()
+    if creadas:
+        logger.info(f"Particiones de ventas creadas: {creadas}")
+    return creadas
+
+
+def _limite_retencion(hoy: date) -> date:
+    # Primer mes que se conserva en la base
+    total = hoy.year * 12 + (hoy.month - 1) - VENTAS_RETENCION_MESES
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def particiones_a_archivar(conn, hoy: date) -> list:
+    """Meses (primer día) de las particiones de ventas anteriores a la retención."""
+    filas = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'ventas' AND c.relname ~ '^ventas_p[0-9]{4}_[0-9]{2}$'
+    """)).scalars().all()
+    limite = _limite_retencion(hoy)
+    meses = sorted(date(int(nombre[8:12]), int(nombre[13:15]), 1) for nombre in filas)
+    return [mes for mes in meses if mes < limite]
+
+
+def _ruta_pendiente(tabla: str, mes: date) -> str:
+    # Archivo ya exportado cuya partición todavía puede seguir en la base.
+    # informes solo lee los '.parquet', así que este no se cuenta dos veces.
+    return ruta_mes(tabla, mes) + ".archivando"
+
+
+def _exportar(conn, tabla: str, mes: date) -> int:
+    """Escribe la partición completa a Parquet (como '.archivando') y devuelve las filas."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    particion = f"{tabla}_{mes.strftime('p%Y_%m')}"
+    ruta_tmp = _ruta_pendiente(tabla, mes)
+    os.makedirs(os.path.dirname(ruta_tmp), exist_ok=True)
+
+    # Las opciones van en la sentencia: en la conexión afectarían también
+    # al DETACH / DROP que se ejecutan después en la misma transacción.
+    consulta = text(f"SELECT * FROM {particion} ORDER BY fecha, id").execution_options(
+        stream_results=True, max_row_buffer=ARCHIVO_CHUNK_FILAS
+    )
+    bloques = pd.read_sql(consulta, conn, chunksize=ARCHIVO_CHUNK_FILAS)
+    filas = 0
+    writer = None
+    try:
+        for df in bloques:
+            if writer is None:
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                writer = pq.ParquetWriter(ruta_tmp, schema, compression="zstd")
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            filas += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # Partición vacía: no hay nada que leer después, no se escribe archivo
+        return 0
+
+    with open(ruta_tmp, "rb") as archivo:
+        os.fsync(archivo.fileno())
+    if pq.ParquetFile(ruta_tmp).metadata.num_rows != filas:
+        os.remove(ruta_tmp)
+        raise RuntimeError(f"El archivo de {particion} no tiene las {filas} filas esperadas")
+    return filas
+
+
+def _publicar(mes: date):
+    for tabla in TABLAS:
+        if os.path.exists(_ruta_pendiente(tabla, mes)):
+            os.replace(_ruta_pendiente(tabla, mes), ruta_mes(tabla, mes))
+
+
+def _descartar(mes: date):
+    for tabla in TABLAS:
+        if os.path.exists(_ruta_pendiente(tabla, mes)):
+            os.remove(_ruta_pendiente(tabla, mes))
+
+
+def archivar_mes(mes: date):
+    """
+    Archiva un mes en una sola transacción: se bloquean las dos particiones
+    contra escrituras, se exportan y recién entonces se separan y eliminan.
+    Los archivos se publican (renombran a .parquet) después del COMMIT; si
+    algo falla, la transacción se deshace, se descartan los archivos y los
+    datos siguen en la base.
+    """
+    sufijo = mes.strftime("p%Y_%m")
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{ARCHIVO_LOCK_TIMEOUT}'"))
+            for tabla in TABLAS:
+                conn.execute(text(f"LOCK TABLE {tabla}_{sufijo} IN SHARE MODE"))
+            filas = {tabla: _exportar(conn, tabla, mes) for tabla in TABLAS}
+            for tabla in reversed(TABLAS):
+                conn.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {tabla}_{sufijo}"))
+                conn.execute(text(f"DROP TABLE {tabla}_{sufijo}"))
+    except Exception:
+        _descartar(mes)
+        raise
+    _publicar(mes)
+    logger.info(f"Mes {mes:%Y-%m} archivado: {filas['ventas']} ventas, {filas['detalles_venta']} detalles.")
+
+
+def recuperar_pendientes():
+    """
+    Completa un archivado interrumpido entre el COMMIT y la publicación: si
+    quedó un '.archivando' y la partición ya no existe, se publica; si la
+    partición sigue en la base, el archivo se descarta.
+    """
+    directorio = os.path.join(ARCHIVO_VENTAS_DIR, "ventas")
+    if not os.path.isdir(directorio):
+        return
+    with engine.connect() as conn:
+        for nombre in os.listdir(directorio):
+            if not nombre.endswith(".parquet.archivando"):
+                continue
+            sufijo = nombre.split(".")[0]
+            mes = date(int(sufijo[1:5]), int(sufijo[6:8]), 1)
+            if conn.execute(text("SELECT to_regclass(:nombre)"), {"nombre": f"ventas_{sufijo}"}).scalar() is None:
+                _publicar(mes)
+                logger.info(f"Archivado pendiente del mes {mes:%Y-%m} publicado.")
+            else:
+                _descartar(mes)
+
+
+def ejecutar():
+    recuperar_pendientes()
+    crear_particiones()
+    with engine.connect() as conn:
+        meses = particiones_a_archivar(conn, date.today())
+    for mes in meses:
+        try:
+            archivar_mes(mes)
+        except Exception as e:
+            logger.error(f"No se pudo archivar el mes {mes:%Y-%m}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea particiones futuras de ventas y archiva las antiguas a Parquet.")
+    parser.add_argument("--cada-horas", type=float, default=None,
+                        help="Repetir cada N horas en vez de ejecutar una sola pasada.")
+    args = parser.parse_args()
+    while True:
+        ejecutar()
+        if args.cada_horas is None:
+            break
+        time.sleep(args.cada_horas * 3600)
@@ -0,0 +1,49 @@
+# informes/models.py
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, ForeignKeyConstraint
+from sqlalchemy.orm import relationship
+
+from database import Base
+
+# --- MODELOS DE DATOS ---
+# Se añaden 'back_populates' para que las relaciones sean bidireccionales y claras.
+# Se completan todos los campos de DetalleVenta.
+
+class Producto(Base):
+    __tablename__ = 'productos'
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String)
+    detalles_venta = relationship("DetalleVenta", back_populates="producto")
+
+# productos.stock es solo el stock plegado; el actual (plegado más los
+# movimientos pendientes de movimientos_stock) sale de esta vista.
+class StockActual(Base):
+    __tablename__ = 'stock_actual'
+    producto_id = Column(Integer, primary_key=True)
+    nombre = Column(String)
+    stock = Column(Integer)
+
+# ventas y detalles_venta están particionadas por mes sobre 'fecha'; el
+# detalle repite la fecha de su venta para que los filtros por rango
+# descarten particiones en ambas tablas.
+class Venta(Base):
+    __tablename__ = 'ventas'
+    id = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, primary_key=True)
+    detalles = relationship("DetalleVenta", back_populates="venta")
+
+class DetalleVenta(Base):
+    __tablename__ = 'detalles_venta'
+    __table_args__ = (
+        ForeignKeyConstraint(['venta_id', 'fecha'], ['ventas.id', 'ventas.fecha']),
+    )
+    id = Column(Integer, primary_key=True)
+    venta_id = Column(Integer)
+    producto_id = Column(Integer, ForeignKey('productos.id'))
+    cantidad = Column(Integer)
+    precio_unitario = Column(Float)
+    subtotal = Column(Float)
+    fecha = Column(DateTime, primary_key=True)
+
+    producto = relationship("Producto", back_populates="detalles_venta")
+    venta = relationship("Venta", back_populates="detalles")
@@ -0,0 +1,308 @@
+# informes/reportes.py
+#
+# Definición y generación de los reportes. Este módulo se importa dentro de los
+# procesos del pool de trabajos (ver trabajos.py), por lo que todo lo que se
+# ejecuta aquí corre FUERA del event loop de la API.
+#
+# pandas (y openpyxl, que carga pandas al escribir Excel) se importan dentro
+# de las funciones que los usan: la API importa este módulo (FORMATOS) y así
+# no paga esa carga al arrancar.
+
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, not_
+
+import archivo_ventas
+from database import SessionLocal
+from models import Producto, StockActual, Venta, DetalleVenta
+
+MEDIA_TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Formatos de salida. Parquet y Arrow IPC (stream) se escriben por bloques
+# desde un cursor del lado del servidor, así la memoria queda acotada al
+# tamaño del bloque aunque el rango tenga millones de filas.
+FORMATOS = {
+    "excel": {"extension": ".xlsx", "media_type": MEDIA_TYPE_EXCEL},
+    "parquet": {"extension": ".parquet", "media_type": "application/vnd.apache.parquet"},
+    "arrow": {"extension": ".arrows", "media_type": "application/vnd.apache.arrow.stream"},
+}
+REPORTES_CHUNK_FILAS = int(os.environ.get("REPORTES_CHUNK_FILAS", "50000"))
+# Las cajas sin conexión envían sus ventas con la fecha en que se hicieron,
+# hasta este número de días después (transacciones, POST /ventas/lote)
+VENTAS_ATRASO_MAXIMO_DIAS = int(os.environ.get("VENTAS_ATRASO_MAXIMO_DIAS", "7"))
+
+
+class ReporteVacio(Exception):
+    """La consulta del reporte no devolvió filas (se responde con 404)."""
+    pass
+
+
+# --- CONSULTAS DE CADA REPORTE ---
+# ventas y detalles_venta están particionadas por mes sobre 'fecha': los
+# filtros de rango se aplican a la fecha de AMBAS tablas (y el join incluye
+# la fecha) para que PostgreSQL descarte las particiones fuera del rango.
+
+def _fin_del_dia(fecha: date) -> datetime:
+    return datetime.combine(fecha, datetime.max.time())
+
+def _consulta_ventas(db, p):
+    desde, hasta = p["fecha_inicio"], _fin_del_dia(p["fecha_fin"])
+    return (
+        db.query(
+            Venta.fecha, Venta.id.label("id_venta"), Producto.nombre.label("producto"),
+            DetalleVenta.cantidad, func.coalesce(DetalleVenta.precio_unitario, 0).label("precio_unitario"),
+            func.coalesce(DetalleVenta.subtotal, 0).label("subtotal")
+        )
+        .select_from(Venta)
+        .join(DetalleVenta, (Venta.id == DetalleVenta.venta_id) & (Venta.fecha == DetalleVenta.fecha))
+        .join(Producto, DetalleVenta.producto_id == Producto.id)
+        .filter(Venta.fecha.between(desde, hasta), DetalleVenta.fecha.between(desde, hasta))
+        .order_by(Venta.fecha)
+    )
+
+def _consulta_top_vendidos(db, p):
+    return (
+        db.query(Producto.nombre.label("producto"), func.sum(DetalleVenta.cantidad).label("cantidad_total_vendida"))
+        .select_from(Producto)
+        .join(DetalleVenta, Producto.id == DetalleVenta.producto_id)
+        .filter(DetalleVenta.fecha.between(p["fecha_inicio"], _fin_del_dia(p["fecha_fin"])))
+        .group_by(Producto.nombre)
+        .order_by(func.sum(DetalleVenta.cantidad).desc())
+        .limit(p["limite"])
+    )
+
+def _consulta_stock_bajo(db, p):
+    return (
+        db.query(StockActual.producto_id.label("id"), StockActual.nombre, StockActual.stock)
+        .filter(StockActual.stock < p["umbral"])
+        .order_by(StockActual.stock.asc())
+    )
+
+def _consulta_sin_movimiento(db, p):
+    subquery = db.query(DetalleVenta.producto_id).filter(DetalleVenta.fecha >= p["fecha_inicio"]).distinct()
+    return (
+        db.query(StockActual.producto_id.label("id"), StockActual.nombre, StockActual.stock)
+        .filter(not_(StockActual.producto_id.in_(subquery)))
+        .order_by(StockActual.nombre)
+    )
+
+
+# --- MESES ARCHIVADOS ---
+# Los meses que mantenimiento_ventas.py sacó de la base se leen desde Parquet
+# (archivo_ventas.py) y se combinan con el resultado de la consulta. Cada
+# función recibe los bloques de la consulta a la base y devuelve los bloques
+# finales del reporte.
+
+def _nombres_productos(db) -> dict:
+    return dict(db.query(Producto.id, Producto.nombre).all())
+
+def _ventas_con_archivo(db, p, bloques):
+    # Los meses archivados son siempre anteriores a los que siguen en la
+    # base, así que van primero y el orden por fecha se mantiene.
+    nombres = _nombres_productos(db)
+    columnas = ["fecha", "venta_id", "producto_id", "cantidad", "precio_unitario", "subtotal"]
+    for df in archivo_ventas.leer_detalles(datetime.combine(p["fecha_inicio"], datetime.min.time()),
+                                           _fin_del_dia(p["fecha_fin"]), columnas):
+        # Igual que el JOIN con productos: se omiten productos eliminados
+        df["producto"] = df["producto_id"].map(nombres)
+        df = df[df["producto"].notna()].rename(columns={"venta_id": "id_venta"})
+        yield df[["fecha", "id_venta", "producto", "cantidad", "precio_unitario", "subtotal"]]
+    yield from bloques
+
+def _top_vendidos_con_archivo(db, p, bloques):
+    # El top hay que recalcularlo con los totales de ambas fuentes; la
+    # consulta a la base se rehace sin LIMIT agrupando por producto.
+    desde, hasta = datetime.combine(p["fecha_inicio"], datetime.min.time()), _fin_del_dia(p["fecha_fin"])
+    en_base = (
+        db.query(DetalleVenta.producto_id, func.sum(DetalleVenta.cantidad).label("cantidad"))
+        .filter(DetalleVenta.fecha.between(desde, hasta))
+        .group_by(DetalleVenta.producto_id)
+        .all()
+    )
+    import pandas as pd
+
+    partes = [pd.DataFrame(en_base, columns=["producto_id", "cantidad"])]
+    for df in archivo_ventas.leer_detalles(desde, hasta, ["producto_id", "cantidad"]):
+        partes.append(df.groupby("producto_id", as_index=False)["cantidad"].sum())
+    totales = pd.concat(partes).groupby("producto_id", as_index=False)["cantidad"].sum()
+    totales["producto"] = totales["producto_id"].map(_nombres_productos(db))
+    top = (
+        totales[totales["producto"].notna()]
+        .groupby("producto", as_index=False)["cantidad"].sum()
+        .rename(columns={"cantidad": "cantidad_total_vendida"})
+        .sort_values("cantidad_total_vendida", ascending=False)
+        .head(p["limite"])
+    )
+    yield top
+
+def _sin_movimiento_con_archivo(db, p, bloques):
+    vendidos = set()
+    for df in archivo_ventas.leer_detalles(datetime.combine(p["fecha_inicio"], datetime.min.time()), None, ["producto_id"]):
+        vendidos.update(df["producto_id"].unique().tolist())
+    for df in bloques:
+        yield df[~df["id"].isin(vendidos)]
+
+def _rango_archivado(tipo: str, p: dict) -> bool:
+    if "fecha_inicio" not in p or REPORTES[tipo].get("con_archivo") is None:
+        return False
+    return bool(archivo_ventas.archivos_en_rango(p["fecha_inicio"], p.get("fecha_fin")))
+
+
+# Cada reporte declara su consulta, la hoja de Excel, el nombre del archivo
+# descargado y el mensaje cuando no hay datos. 'por_rango' indica que el
+# resultado depende solo de las ventas entre fecha_inicio y fecha_fin, lo que
+# permite calcular una marca de agua barata para el caché de resultados.
+# 'con_archivo' combina el resultado con los meses archivados en Parquet.
+REPORTES = {
+    "ventas": {
+        "consulta": _consulta_ventas,
+        "hoja": "Reporte_Ventas",
+        "archivo": "reporte_ventas_{fecha_inicio}_a_{fecha_fin}",
+        "vacio": "No se encontraron ventas en el rango de fechas.",
+        "por_rango": True,
+        "con_archivo": _ventas_con_archivo,
+    },
+    "top-vendidos": {
+        "consulta": _consulta_top_vendidos,
+        "hoja": "Top_Productos_Vendidos",
+        "archivo": "top_productos_{fecha_inicio}_a_{fecha_fin}",
+        "vacio": "No se encontraron ventas para generar el top de productos.",
+        "por_rango": True,
+        "con_archivo": _top_vendidos_con_archivo,
+    },
+    "stock-bajo": {
+        "consulta": _consulta_stock_bajo,
+        "hoja": "Alertas_Stock_Bajo",
+        "archivo": "reporte_stock_bajo_{hoy}",
+        "vacio": "¡Buenas noticias! No hay productos con stock por debajo de {umbral}.",
+        "por_rango": False,
+    },
+    "sin-movimiento": {
+        "consulta": _consulta_sin_movimiento,
+        "hoja": "Productos_Sin_Movimiento",
+        "archivo": "reporte_sin_movimiento_desde_{fecha_inicio}",
+        "vacio": "¡Buenas noticias! Todos los productos han tenido movimiento desde la fecha especificada.",
+        "por_rango": False,
+        "con_archivo": _sin_movimiento_con_archivo,
+    },
+}
+
+
+def nombre_archivo(tipo: str, parametros: dict, formato: str = "excel") -> str:
+    definicion = REPORTES[tipo]
+    return definicion["archivo"].format(hoy=date.today().isoformat(), **parametros) + FORMATOS[formato]["extension"]
+
+
+def rango_cerrado(parametros: dict) -> bool:
+    """
+    Un rango que termina antes de hoy menos VENTAS_ATRASO_MAXIMO_DIAS ya no
+    puede recibir ventas nuevas (ni las atrasadas de una caja sin conexión).
+    """
+    return parametros["fecha_fin"] < date.today() - timedelta(days=VENTAS_ATRASO_MAXIMO_DIAS)
+
+
+def marca_de_agua(tipo: str, parametros: dict):
+    """
+    Devuelve un valor que cambia si cambian los datos de los que depende el
+    reporte, o None si el reporte no se puede cachear de forma segura.
+    - Rangos cerrados (ver rango_cerrado): los datos no cambian, la marca es
+      constante y el resultado vale indefinidamente (sin consultar la BD).
+    - Rangos abiertos: se cuenta las ventas del rango y se toma el mayor
+      id; cualquier venta nueva invalida el resultado cacheado.
+    """
+    if not REPORTES[tipo]["por_rango"]:
+        return None
+    if rango_cerrado(parametros):
+        return "cerrado"
+    db = SessionLocal()
+    try:
+        total, max_id = (
+            db.query(func.count(Venta.id), func.max(Venta.id))
+            .filter(Venta.fecha.between(parametros["fecha_inicio"], _fin_del_dia(parametros["fecha_fin"])))
+            .one()
+        )
+        return [total, max_id]
+    finally:
+        db.close()
+
+
+def _leer_bloques(db, query):
+    # stream_results usa un cursor con nombre en PostgreSQL: las filas llegan
+    # de a REPORTES_CHUNK_FILAS en vez de traerse todas a memoria. Es un
+    # generador: la consulta se ejecuta recién al empezar a iterar.
+    # Las opciones van en la sentencia y no en la conexión, que se sigue
+    # usando para otras consultas de la sesión.
+    import pandas as pd
+
+    consulta = query.statement.execution_options(stream_results=True, max_row_buffer=REPORTES_CHUNK_FILAS)
+    yield from pd.read_sql(consulta, db.connection(), chunksize=REPORTES_CHUNK_FILAS)
+
+
+def _escribir_excel(bloques, definicion, ruta_destino: str) -> int:
+    import pandas as pd
+
+    partes = [df for df in bloques if not df.empty]
+    if not partes:
+        return 0
+    df = pd.concat(partes, ignore_index=True)
+    # Se pasa un archivo abierto: pandas valida la extensión cuando recibe una
+    # ruta, y la ruta temporal de trabajos.py termina en '.tmp'.
+    with open(ruta_destino, "wb") as archivo, pd.ExcelWriter(archivo, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name=definicion["hoja"])
+    return len(df)
+
+
+def _escribir_columnar(bloques, formato: str, ruta_destino: str) -> int:
+    # pyarrow solo se necesita para estos formatos; se importa aquí para no
+    # cargarlo en los procesos que solo generan Excel.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filas = 0
+    schema = None
+    sink = None
+    writer = None
+    try:
+        for df in bloques:
+            if df.empty:
+                continue
+            if writer is None:
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                if formato == "parquet":
+                    writer = pq.ParquetWriter(ruta_destino, schema, compression="zstd")
+                else:
+                    sink = pa.OSFile(ruta_destino, "wb")
+                    writer = pa.ipc.new_stream(sink, schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            filas += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+    return filas
+
+
+def generar_reporte(tipo: str, parametros: dict, ruta_destino: str, formato: str = "excel") -> int:
+    """
+    Ejecuta la consulta del reporte y escribe el archivo en 'ruta_destino' en
+    el formato pedido. Se ejecuta en un proceso del pool. Devuelve la cantidad
+    de filas.
+    """
+    definicion = REPORTES[tipo]
+    db = SessionLocal()
+    try:
+        bloques = _leer_bloques(db, definicion["consulta"](db, parametros))
+        if _rango_archivado(tipo, parametros):
+            bloques = definicion["con_archivo"](db, parametros, bloques)
+        if formato == "excel":
+            filas = _escribir_excel(bloques, definicion, ruta_destino)
+        else:
+            filas = _escribir_columnar(bloques, formato, ruta_destino)
+    finally:
+        db.close()
+
+    if filas == 0:
+        raise ReporteVacio(definicion["vacio"].format(**parametros))
+    return filas
@@ -0,0 +1,225 @@
+# informes/trabajos.py
+#
+# Cola local de trabajos para generar reportes fuera del event loop.
+# La generación (consulta + serialización a Excel/Parquet/Arrow) es CPU/IO bloqueante, así
+# que se ejecuta en un ProcessPoolExecutor. Los resultados quedan en el caché
+# en disco (cache_reportes.py) y se reutilizan mientras la clave
+# (tipo, parámetros, marca de agua) no cambie.
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from cache_reportes import CacheReportes
+from reportes import generar_reporte, marca_de_agua, nombre_archivo, ReporteVacio
+
+logger = logging.getLogger(__name__)
+
+REPORTES_DIR = os.environ.get("REPORTES_DIR", "/tmp/informes_reportes")
+INFORMES_WORKERS = int(os.environ.get("INFORMES_WORKERS", "2"))
+# Tamaño máximo del caché de reportes en disco (por defecto 512 MB)
+REPORTES_CACHE_MAX_BYTES = int(os.environ.get("REPORTES_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Tiempo que se conserva el registro de un trabajo (y su archivo si no es cacheable)
+TRABAJOS_TTL_SEGUNDOS = int(os.environ.get("TRABAJOS_TTL_SEGUNDOS", "3600"))
+
+# Estados posibles de un trabajo
+PENDIENTE = "pendiente"
+COMPLETADO = "completado"
+VACIO = "vacio"
+ERROR = "error"
+
+_executor = None
+_cache = None
+# trabajo_id -> dict con el estado del trabajo.
+# Nota: el registro vive en memoria del proceso de la API. El estado y la
+# descarga buscan el trabajo_id aquí aunque el archivo ya esté en el caché en
+# disco, así que con varios workers de gunicorn un trabajo creado en otro
+# worker da 404: informes corre con un solo worker (GUNICORN_WORKERS=1 en
+# docker-compose.yml).
+_trabajos = {}
+# clave de caché -> trabajo_id en curso, para no generar dos veces lo mismo
+_en_curso = {}
+
+
+def get_cache() -> CacheReportes:
+    global _cache
+    if _cache is None:
+        _cache = CacheReportes(REPORTES_DIR, REPORTES_CACHE_MAX_BYTES)
+    return _cache
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # 'spawn' evita heredar conexiones de la base de datos y hilos del
+        # proceso padre: cada worker crea su propio engine al importar reportes.
+        _executor = ProcessPoolExecutor(
+            max_workers=INFORMES_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def cerrar_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def clave_cache(tipo: str, parametros: dict, formato: str, marca) -> str:
+    contenido = json.dumps({"tipo": tipo, "parametros": parametros, "formato": formato, "marca": marca},
+                           sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def ruta_temporal() -> str:
+    # Los reportes no cacheables se guardan fuera del directorio del caché
+    # para que no cuenten en su tamaño ni se desalojen antes de descargarse.
+    directorio = os.path.join(REPORTES_DIR, "temporales")
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, uuid.uuid4().hex)
+
+
+def _generar_en_proceso(tipo: str, parametros: dict, formato: str, ruta: str) -> int:
+    # Escribimos a un archivo temporal y lo renombramos al final para que
+    # nunca se sirva un archivo a medio escribir.
+    ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        filas = generar_reporte(tipo, parametros, ruta_tmp, formato)
+        os.replace(ruta_tmp, ruta)
+        return filas
+    finally:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+
+
+def _limpiar_antiguos():
+    ahora = datetime.utcnow()
+    for trabajo_id, trabajo in list(_trabajos.items()):
+        if trabajo["terminado"] is None:
+            continue
+        if (ahora - trabajo["terminado"]).total_seconds() < TRABAJOS_TTL_SEGUNDOS:
+            continue
+        del _trabajos[trabajo_id]
+        # Los resultados no cacheables se borran junto con su trabajo
+        if trabajo["clave"] is None and os.path.exists(trabajo["ruta"]):
+            os.remove(trabajo["ruta"])
+
+
+def _nuevo_trabajo(tipo: str, parametros: dict, formato: str, clave, ruta) -> dict:
+    trabajo = {
+        "trabajo_id": uuid.uuid4().hex,
+        "tipo": tipo,
+        "parametros": parametros,
+        "formato": formato,
+        "estado": PENDIENTE,
+        "creado": datetime.utcnow(),
+        "terminado": None,
+        "archivo": nombre_archivo(tipo, parametros, formato),
+        "ruta": ruta,
+        "clave": clave,
+        "inmutable": False,
+        "detalle": None,
+        "futuro": None,
+    }
+    _trabajos[trabajo["trabajo_id"]] = trabajo
+    return trabajo
+
+
+def _al_terminar(trabajo: dict, futuro: asyncio.Future):
+    if trabajo["estado"] != PENDIENTE:
+        return
+    trabajo["terminado"] = datetime.utcnow()
+    if trabajo["clave"] is not None:
+        _en_curso.pop(trabajo["clave"], None)
+    error = futuro.exception()
+    if error is None:
+        trabajo["estado"] = COMPLETADO
+        if trabajo["clave"] is not None:
+            get_cache().registrar(trabajo["clave"])
+    elif isinstance(error, ReporteVacio):
+        trabajo["estado"] = VACIO
+        trabajo["detalle"] = str(error)
+    else:
+        logger.error(f"Error generando el reporte {trabajo['tipo']} ({trabajo['trabajo_id']}): {error}")
+        trabajo["estado"] = ERROR
+        trabajo["detalle"] = str(error)
+
+
+async def encolar(tipo: str, parametros: dict, formato: str = "excel") -> dict:
+    """
+    Registra un trabajo de generación. Si el resultado ya está en caché el
+    trabajo nace completado; si la misma clave se está generando, se devuelve
+    el trabajo en curso.
+    """
+    _limpiar_antiguos()
+    loop = asyncio.get_running_loop()
+    # La marca de agua es una consulta corta, pero igual la sacamos del loop.
+    marca = await loop.run_in_executor(None, marca_de_agua, tipo, parametros)
+    clave = clave_cache(tipo, parametros, formato, marca) if marca is not None else None
+
+    inmutable = marca == "cerrado"
+
+    if clave is not None:
+        if clave in _en_curso:
+            return _trabajos[_en_curso[clave]]
+        ruta = get_cache().obtener(clave)
+        if ruta is not None:
+            trabajo = _nuevo_trabajo(tipo, parametros, formato, clave, ruta)
+            trabajo["inmutable"] = inmutable
+            trabajo["estado"] = COMPLETADO
+            trabajo["terminado"] = trabajo["creado"]
+            return trabajo
+        ruta = get_cache().ruta(clave)
+    else:
+        ruta = ruta_temporal()
+
+    trabajo = _nuevo_trabajo(tipo, parametros, formato, clave, ruta)
+    trabajo["inmutable"] = inmutable
+    futuro = asyncio.wrap_future(get_executor().submit(_generar_en_proceso, tipo, parametros, formato, ruta))
+    futuro.add_done_callback(lambda f: _al_terminar(trabajo, f))
+    trabajo["futuro"] = futuro
+    if clave is not None:
+        _en_curso[clave] = trabajo["trabajo_id"]
+    return trabajo
+
+
+async def esperar(trabajo: dict) -> dict:
+    """Espera (sin bloquear el event loop) a que el trabajo termine."""
+    if trabajo["futuro"] is not None:
+        try:
+            await asyncio.shield(trabajo["futuro"])
+        except Exception:
+            # El estado y el detalle ya quedaron registrados en _al_terminar
+            pass
+        # El callback de done puede no haber corrido aún en esta iteración
+        if trabajo["estado"] == PENDIENTE:
+            _al_terminar(trabajo, trabajo["futuro"])
+    return trabajo
+
+
+def obtener(trabajo_id: str):
+    return _trabajos.get(trabajo_id)
+
+
+def a_respuesta(trabajo: dict) -> dict:
+    respuesta = {
+        "trabajo_id": trabajo["trabajo_id"],
+        "tipo": trabajo["tipo"],
+        "formato": trabajo["formato"],
+        "estado": trabajo["estado"],
+        "creado": trabajo["creado"],
+        "terminado": trabajo["terminado"],
+        "detalle": trabajo["detalle"],
+        "url_estado": f"/api/informes/trabajos/{trabajo['trabajo_id']}",
+    }
+    if trabajo["estado"] == COMPLETADO:
+        respuesta["url_descarga"] = f"/api/informes/trabajos/{trabajo['trabajo_id']}/descarga"
+    return respuesta
@@ -0,0 +1,288 @@
+# inventario/app/backfill_stock.py
+#
+# Reconciliación del stock después de una caída de inventario (o de su
+# consumidor). En vez de esperar a que consumir_movimientos_stock procese el
+# backlog de 'topic_ventas' y 'topic_dispensaciones' lote por lote, aplica en
+# una sola transacción todo lo pendiente leyendo los registros de la base:
+#
+#   1. Toma una foto del grupo 'inventario-group': offset confirmado y último
+#      offset de cada partición (el lag).
+#   2. Lee todos los mensajes sin consumir hasta el final de la foto para
+#      saber desde qué fecha hay eventos pendientes (menos --margen-minutos).
+#      No basta con el primero de cada partición: las ventas sin conexión
+#      (/ventas/lote) llegan con la fecha de la caja, hasta
+#      VENTAS_ATRASO_MAXIMO_DIAS atrás, en cualquier punto del backlog. Los
+#      mensajes ilegibles (no JSON o sin fecha) se saltan, como en el
+#      consumidor.
+#   3. En una transacción: anota en 'eventos_procesados' cada venta (con sus
+#      detalles) y cada dispensación desde esa fecha que todavía no estaba, e
+#      inserta sus descuentos en 'movimientos_stock'. Lo que el consumidor ya
+#      había aplicado está anotado y no se repite. Antes del COMMIT se
+#      comprueba que cada evento leído en el paso 2 quedó anotado; si falta
+#      alguno se deshace todo y no se mueven los offsets.
+#   4. Confirma para el grupo los offsets de la foto: el consumidor retoma
+#      desde ahí y los eventos posteriores que ya se aplicaron en el paso 3
+#      se saltan por 'eventos_procesados'.
+#
+# Las compras recibidas no pasan por Kafka (recibir_compra anota sus
+# movimientos en movimientos_stock en la misma petición), así que no quedan
+# pendientes tras una caída.
+#
+# Ejecutar con el servicio inventario detenido: Kafka no acepta offsets de
+# fuera del grupo mientras el consumidor tenga miembros activos.
+#
+# Uso:
+#     python -m app.backfill_stock             # reconcilia si el lag supera --umbral
+#     python -m app.backfill_stock --simular   # muestra lo que haría, sin cambios
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from kafka import KafkaConsumer, TopicPartition
+from kafka.structs import OffsetAndMetadata
+from sqlalchemy import text
+
+from .database import engine
+from .kafka_consumer import (
+    KAFKA_BOOTSTRAP_SERVERS, KAFKA_GRUPO, TOPIC_DISPENSACIONES, TOPIC_VENTAS, _descuentos_del_mensaje,
+    _deserializar, _items,
+)
+from .kafka_producer import publicador, publicar_cambios_stock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Una sola sentencia: anota los eventos pendientes y agrega sus descuentos al
+# libro de movimientos (migración 0007). Un tipo sin fecha (sin lag en su
+# topic) no se toca.
+SQL_RECONCILIAR = text("""
+    WITH ventas_nuevas AS (
+        INSERT INTO eventos_procesados (tipo, referencia_id)
+        SELECT DISTINCT 'venta', d.venta_id
+        FROM detalles_venta d
+        WHERE CAST(:desde_ventas AS timestamp) IS NOT NULL AND d.fecha >= :desde_ventas
+        ON CONFLICT DO NOTHING
+        RETURNING referencia_id
+    ), dispensaciones_nuevas AS (
+        INSERT INTO eventos_procesados (tipo, referencia_id)
+        SELECT 'dispensacion', d.id
+        FROM dispensaciones d
+        WHERE CAST(:desde_dispensaciones AS timestamp) IS NOT NULL AND d.fecha_dispensacion >= :desde_dispensaciones
+        ON CONFLICT DO NOTHING
+        RETURNING referencia_id
+    ), descuentos AS (
+        SELECT 'venta' AS tipo, d.venta_id AS referencia_id, d.producto_id, d.cantidad
+        FROM detalles_venta d
+        JOIN ventas_nuevas n ON n.referencia_id = d.venta_id
+        WHERE d.fecha >= :desde_ventas
+        UNION ALL
+        SELECT 'dispensacion', d.id, d.producto_id, d.cantidad
+        FROM dispensaciones d
+        JOIN dispensaciones_nuevas n ON n.referencia_id = d.id
+    ), movimientos AS (
+        INSERT INTO movimientos_stock (producto_id, tipo, referencia_id, cantidad)
+        SELECT d.producto_id, d.tipo, d.referencia_id, -d.cantidad
+        FROM descuentos d
+        JOIN productos p ON p.id = d.producto_id
+        RETURNING producto_id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM ventas_nuevas) AS ventas,
+        (SELECT COUNT(*) FROM dispensaciones_nuevas) AS dispensaciones,
+        (SELECT COALESCE(array_agg(DISTINCT producto_id), '{}') FROM movimientos) AS productos
+""")
+
+# Eventos leídos de Kafka que siguen sin anotar (se mira después de
+# SQL_RECONCILIAR, en la misma transacción)
+SQL_EVENTOS_SIN_APLICAR = text("""
+    SELECT e.tipo, e.referencia_id
+    FROM unnest(CAST(:tipos AS varchar[]), CAST(:ids AS integer[])) AS e(tipo, referencia_id)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM eventos_procesados p WHERE p.tipo = e.tipo AND p.referencia_id = e.referencia_id
+    )
+    LIMIT 10
+""")
+
+
+def _offset(offset: int) -> OffsetAndMetadata:
+    # kafka-python >= 2.1 agrega leader_epoch a OffsetAndMetadata
+    if "leader_epoch" in OffsetAndMetadata._fields:
+        return OffsetAndMetadata(offset, "", -1)
+    return OffsetAndMetadata(offset, "")
+
+
+def _fecha(valor) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _fecha_del_mensaje(topic: str, datos) -> Optional[datetime]:
+    """Fecha más antigua del mensaje; None si no es un dict o no trae ninguna válida."""
+    if not isinstance(datos, dict):
+        return None
+    if topic == TOPIC_VENTAS:
+        fechas = [_fecha(datos.get("fecha"))]
+    else:
+        fechas = [_fecha(d.get("fecha")) for d in _items(datos, "dispensaciones")]
+    fechas = [f for f in fechas if f is not None]
+    return min(fechas) if fechas else None
+
+
+def foto_del_grupo(consumer: KafkaConsumer) -> Dict[TopicPartition, dict]:
+    """Para cada partición: offset desde el que retomaría el grupo, último offset y lag."""
+    particiones = [
+        TopicPartition(topic, particion)
+        for topic in (TOPIC_VENTAS, TOPIC_DISPENSACIONES)
+        for particion in sorted(consumer.partitions_for_topic(topic) or [])
+    ]
+    consumer.assign(particiones)
+    inicios = consumer.beginning_offsets(particiones)
+    finales = consumer.end_offsets(particiones)
+    foto = {}
+    for tp in particiones:
+        confirmado = consumer.committed(tp)
+        # Sin offset confirmado el consumidor empieza por el principio (auto_offset_reset='earliest')
+        posicion = confirmado if confirmado is not None else inicios[tp]
+        foto[tp] = {
+            "posicion": posicion,
+            "inicio": inicios[tp],
+            "final": finales[tp],
+            "lag": max(finales[tp] - posicion, 0),
+        }
+    return foto
+
+
+def leer_pendientes(consumer: KafkaConsumer, foto: dict, saltar_borrados: bool = False,
+                    timeout_segundos: float = 30) -> Tuple[Dict[str, datetime], Dict[str, set]]:
+    """
+    Lee todos los mensajes sin consumir hasta el final de la foto. Devuelve la
+    fecha más antigua por topic y los eventos (tipo -> ids) que traen. Los
+    mensajes ilegibles (no JSON o sin fecha) se saltan. Con saltar_borrados
+    se empieza por el primer offset que siga en Kafka.
+    """
+    pendientes = {tp for tp, datos in foto.items() if datos["lag"] > 0}
+    for tp in pendientes:
+        posicion = foto[tp]["posicion"]
+        if posicion < foto[tp]["inicio"]:
+            if not saltar_borrados:
+                raise SystemExit(
+                    f"{tp.topic}[{tp.partition}]: los mensajes desde el offset {posicion} ya se "
+                    f"borraron por retención; indique la fecha con --desde."
+                )
+            posicion = foto[tp]["inicio"]
+        consumer.seek(tp, posicion)
+
+    fechas = {}
+    eventos = {"venta": set(), "dispensacion": set()}
+    limite = time.monotonic() + timeout_segundos
+    while pendientes and time.monotonic() < limite:
+        for tp, mensajes in consumer.poll(timeout_ms=1000).items():
+            if tp not in pendientes:
+                continue
+            # Mientras lleguen mensajes no se corta por tiempo
+            limite = time.monotonic() + timeout_segundos
+            for mensaje in mensajes:
+                if mensaje.offset >= foto[tp]["final"]:
+                    break
+                datos = _deserializar(mensaje.value)
+                fecha = _fecha_del_mensaje(tp.topic, datos)
+                if fecha is not None and (tp.topic not in fechas or fecha < fechas[tp.topic]):
+                    fechas[tp.topic] = fecha
+                for tipo, referencia_id, _, _ in _descuentos_del_mensaje(tp.topic, datos):
+                    eventos[tipo].add(referencia_id)
+            if mensajes[-1].offset + 1 >= foto[tp]["final"]:
+                pendientes.discard(tp)
+                consumer.pause(tp)
+    if pendientes:
+        raise SystemExit(f"No se pudieron leer los mensajes pendientes de {sorted(map(str, pendientes))}.")
+    return fechas, eventos
+
+
+def reconciliar(desde_ventas: Optional[datetime], desde_dispensaciones: Optional[datetime],
+                eventos: Dict[str, set], simular: bool) -> dict:
+    with engine.connect() as conn:
+        transaccion = conn.begin()
+        fila = dict(conn.execute(SQL_RECONCILIAR, {
+            "desde_ventas": desde_ventas, "desde_dispensaciones": desde_dispensaciones,
+        }).mappings().one())
+        # Si un evento leído de Kafka no quedó anotado, mover los offsets lo
+        # perdería: se deshace todo y el backlog queda para el consumidor
+        tipos = [tipo for tipo, ids in eventos.items() for _ in ids]
+        ids = [referencia_id for ids_tipo in eventos.values() for referencia_id in ids_tipo]
+        faltantes = conn.execute(SQL_EVENTOS_SIN_APLICAR, {"tipos": tipos, "ids": ids}).all()
+        if faltantes:
+            transaccion.rollback()
+            raise SystemExit(
+                f"Hay eventos pendientes en Kafka que no se encontraron desde la fecha de reconciliación "
+                f"(p. ej. {[tuple(f) for f in faltantes[:3]]}); no se aplicó nada. Indique una fecha anterior "
+                f"con --desde o deje que el consumidor procese el backlog."
+            )
+        fila["productos"] = [dict(p) for p in conn.execute(text(
+            "SELECT producto_id, nombre, stock FROM stock_actual WHERE producto_id = ANY(:productos)"
+        ), {"productos": fila["productos"]}).mappings()]
+        if simular:
+            transaccion.rollback()
+        else:
+            transaccion.commit()
+    return fila
+
+
+def ejecutar(umbral: int, margen: timedelta, desde: Optional[datetime], simular: bool, forzar: bool):
+    consumer = KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=KAFKA_GRUPO,
+        enable_auto_commit=False,
+        api_version=(2, 8, 1),
+    )
+    try:
+        foto = foto_del_grupo(consumer)
+        for tp, datos in foto.items():
+            logger.info(f"{tp.topic}[{tp.partition}]: offset {datos['posicion']} de {datos['final']}, lag {datos['lag']}")
+        lag_total = sum(datos["lag"] for datos in foto.values())
+        if lag_total == 0:
+            logger.info("El consumidor está al día, no hay nada que reconciliar.")
+            return
+        if lag_total < umbral and not forzar:
+            logger.info(f"Lag de {lag_total} mensaje(s), menor que --umbral {umbral}: el consumidor lo procesa solo.")
+            return
+
+        fechas, eventos = leer_pendientes(consumer, foto, saltar_borrados=desde is not None)
+        if desde is not None:
+            fechas = {topic: desde for topic in {tp.topic for tp, datos in foto.items() if datos["lag"] > 0}}
+        else:
+            fechas = {topic: fecha - margen for topic, fecha in fechas.items()}
+        logger.info(f"Reconciliando desde: {', '.join(f'{t} {f.isoformat()}' for t, f in sorted(fechas.items()))}")
+
+        resultado = reconciliar(fechas.get(TOPIC_VENTAS), fechas.get(TOPIC_DISPENSACIONES), eventos, simular)
+        logger.info(
+            f"{'[simulación] ' if simular else ''}{resultado['ventas']} venta(s) y {resultado['dispensaciones']} "
+            f"dispensación(es) pendientes; {len(resultado['productos'])} producto(s) actualizados."
+        )
+        if simular:
+            return
+
+        consumer.commit({tp: _offset(datos["final"]) for tp, datos in foto.items() if datos["lag"] > 0})
+        logger.info("Offsets del grupo movidos al final de la foto; el consumidor retoma desde ahí.")
+        publicar_cambios_stock(resultado["productos"])
+    finally:
+        consumer.close()
+        publicador.cerrar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcilia el stock pendiente de Kafka con SQL por lotes y adelanta el consumidor.")
+    parser.add_argument("--umbral", type=int, default=1000,
+                        help="Lag mínimo (mensajes) para reconciliar; por debajo el consumidor se pone al día solo.")
+    parser.add_argument("--margen-minutos", type=float, default=60,
+                        help="Minutos antes del mensaje pendiente más antiguo desde los que se revisan ventas y dispensaciones.")
+    parser.add_argument("--desde", type=datetime.fromisoformat, default=None,
+                        help="Fecha (ISO, misma zona que las tablas) desde la que reconciliar, en vez de leerla de Kafka.")
+    parser.add_argument("--simular", action="store_true", help="Calcula todo pero deshace la transacción y no mueve offsets.")
+    parser.add_argument("--forzar", action="store_true", help="Reconcilia aunque el lag sea menor que --umbral.")
+    args = parser.parse_args()
+    ejecutar(args.umbral, timedelta(minutes=args.margen_minutos), args.desde, args.simular, args.forzar)
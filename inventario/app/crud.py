@@ -1,24 +1,88 @@
 # inventario/app/crud.py
 
+from typing import Optional
+
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 # --- CORRECCIÓN EN LA IMPORTACIÓN ---
 from app import models, schemas # Antes era 'import models, schemas'
+from comun.cambios import leer_cambios
+from comun.respuestas import filas_como_dicts
 
 
 def get_producto(db: Session, producto_id: int):
     return db.query(models.Producto).filter(models.Producto.id == producto_id).first()
 
+# Columnas de la lista de productos, en el orden de schemas.Producto
+COLUMNAS_PRODUCTO = ("nombre", "descripcion", "precio_venta", "stock", "id")
+
 def get_productos(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Producto).offset(skip).limit(limit).all()
+    # Solo lectura: se piden las columnas y se devuelven dicts, sin cargar
+    # objetos del ORM (la ruta los serializa directo con RespuestaJSON)
+    filas = (
+        db.query(*(getattr(models.Producto, columna) for columna in COLUMNAS_PRODUCTO))
+        .offset(skip).limit(limit).all()
+    )
+    return filas_como_dicts(COLUMNAS_PRODUCTO, filas)
+
+# --- CAMBIOS DESDE UNA VERSIÓN (caché del catálogo en el POS) ---
+# La versión es el id de la transacción que escribió el cambio (migración
+# 0008); ver comun/cambios.py. El stock cambia con los movimientos, por eso
+# también cuentan los productos con movimientos nuevos.
+
+SQL_PRODUCTOS_CAMBIADOS = text("""
+    WITH cambiados AS (
+        SELECT id FROM productos WHERE version >= :desde AND version < :hasta
+        UNION
+        SELECT producto_id FROM movimientos_stock WHERE version >= :desde AND version < :hasta
+    )
+    SELECT p.nombre, p.descripcion, p.precio_venta, s.stock, p.id
+    FROM cambiados c
+    JOIN productos p ON p.id = c.id
+    JOIN stock_actual s ON s.producto_id = p.id
+""")
+
+SQL_TODOS_LOS_PRODUCTOS = text("""
+    SELECT p.nombre, p.descripcion, p.precio_venta, s.stock, p.id
+    FROM productos p JOIN stock_actual s ON s.producto_id = p.id
+""")
+
+SQL_PRODUCTOS_ELIMINADOS = text(
+    "SELECT producto_id FROM productos_eliminados WHERE version >= :desde AND version < :hasta"
+)
+
+def get_cambios_productos(db: Session, desde: int = 0) -> dict:
+    """
+    Productos creados o modificados (datos o stock) y eliminados desde la
+    versión 'desde'. Con desde=0 devuelve el catálogo completo.
+    """
+    cambios = leer_cambios(db, desde, SQL_TODOS_LOS_PRODUCTOS, SQL_PRODUCTOS_CAMBIADOS, SQL_PRODUCTOS_ELIMINADOS)
+    cambios["productos"] = filas_como_dicts(COLUMNAS_PRODUCTO, cambios.pop("filas"))
+    return cambios
 
 def create_producto(db: Session, producto: schemas.ProductoCreate):
     # Usamos .model_dump() que es el sucesor de .dict() en Pydantic V2
-    db_producto = models.Producto(**producto.model_dump())
+    datos = producto.model_dump()
+    stock_inicial = datos.pop("stock", 0)
+    db_producto = models.Producto(**datos, stock_plegado=0)
     db.add(db_producto)
+    db.flush()
+    # El stock inicial entra al libro como cualquier otro movimiento
+    if stock_inicial:
+        db.add(models.MovimientoStock(
+            producto_id=db_producto.id, tipo="inicial", referencia_id=db_producto.id, cantidad=stock_inicial
+        ))
     db.commit()
     db.refresh(db_producto)
     return db_producto
 
+def get_movimientos(db: Session, producto_id: int, antes_de: Optional[int] = None, limit: int = 50):
+    """Movimientos de stock del producto, del más reciente al más antiguo (cursor por id)."""
+    query = db.query(models.MovimientoStock).filter(models.MovimientoStock.producto_id == producto_id)
+    if antes_de is not None:
+        query = query.filter(models.MovimientoStock.id < antes_de)
+    return query.order_by(models.MovimientoStock.id.desc()).limit(limit).all()
+
 def create_orden_compra(db: Session, orden: schemas.OrdenCompraCreate):
     # Creamos la orden de compra principal
     db_orden = models.OrdenCompra(proveedor=orden.proveedor)
@@ -40,25 +104,39 @@ def recibir_compra(db: Session, compra_id: int):
     if not db_orden or db_orden.estado == 'recibida':
         return None
     
-    # Actualizamos el stock por cada producto en la orden
+    # Un movimiento por cada producto de la orden; la fila del producto no se bloquea
     for detalle in db_orden.detalles:
-        producto = db.query(models.Producto).filter(models.Producto.id == detalle.producto_id).first()
-        if producto:
-            producto.stock += detalle.cantidad
+        if detalle.producto is not None:
+            db.add(models.MovimientoStock(
+                producto_id=detalle.producto_id, tipo="compra", referencia_id=db_orden.id, cantidad=detalle.cantidad
+            ))
     
     db_orden.estado = 'recibida'
     db.commit()
     db.refresh(db_orden)
     return db_orden
 
+SQL_AJUSTE_STOCK = text("""
+    INSERT INTO movimientos_stock (producto_id, tipo, cantidad)
+    SELECT producto_id, 'ajuste', :nuevo - stock FROM stock_actual
+    WHERE producto_id = :producto_id AND stock <> :nuevo
+""")
+
 # --- AÑADE ESTA FUNCIÓN PARA ACTUALIZAR ---
 def update_producto(db: Session, producto_id: int, producto: schemas.ProductoCreate):
     db_producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
     if db_producto:
         # Actualiza los campos del producto existente con los nuevos datos
         update_data = producto.model_dump(exclude_unset=True)
+        nuevo_stock = update_data.pop("stock", None)
         for key, value in update_data.items():
             setattr(db_producto, key, value)
+        # Fijar el stock a mano es un ajuste por la diferencia con el actual.
+        # La diferencia se calcula en la misma sentencia que inserta el ajuste:
+        # con el stock leído antes en Python, un movimiento que el consumidor
+        # registre entre la lectura y el INSERT quedaría deshecho.
+        if nuevo_stock is not None:
+            db.execute(SQL_AJUSTE_STOCK, {"producto_id": producto_id, "nuevo": nuevo_stock})
         db.commit()
         db.refresh(db_producto)
     return db_producto
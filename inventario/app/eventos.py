@@ -0,0 +1,71 @@
+# inventario/app/eventos.py
+#
+# Stream de cambios de stock para las cajas (GET /api/inventario/eventos).
+#
+# Cada worker web escucha 'topic_inventario' (sin group_id, desde el final,
+# como la caché de roles) y pasa los cambios a su canal SSE. Ahí llegan todos
+# los cambios de stock: los descuentos por ventas y dispensaciones que aplica
+# el consumidor (servicio inventario_consumidor), las compras recibidas y el
+# alta, edición y borrado de productos. El hilo se inicia con la primera
+# conexión: un worker sin clientes no consume el topic.
+
+import json
+import logging
+import threading
+import time
+
+from comun.sse import CanalSSE
+
+from .kafka_consumer import KAFKA_BOOTSTRAP_SERVERS
+from .kafka_producer import TOPIC_INVENTARIO
+
+logger = logging.getLogger(__name__)
+
+# Un evento 'stock' lleva {"productos": [{producto_id, nombre, stock} o
+# {producto_id, eliminado: true}, ...]}, con el último estado de cada producto
+canal_stock = CanalSSE("inventario_stock", "stock", armar=lambda cambios: {"productos": list(cambios.values())})
+
+_lock = threading.Lock()
+_escuchando = False
+
+
+def cambios_del_evento(evento: dict) -> dict:
+    """producto_id -> estado a enviar, a partir de un evento de 'topic_inventario'."""
+    if evento.get("accion") == "STOCK_ACTUALIZADO":
+        return {p["producto_id"]: p for p in evento.get("productos", [])}
+    if evento.get("accion") == "PRODUCTO_ELIMINADO":
+        return {evento["producto_id"]: {"producto_id": evento["producto_id"], "eliminado": True}}
+    return {}
+
+
+def iniciar():
+    """Inicia (una sola vez por proceso) el hilo que alimenta canal_stock."""
+    global _escuchando
+    with _lock:
+        if _escuchando:
+            return
+        _escuchando = True
+    hilo = threading.Thread(target=_consumir, daemon=True)
+    hilo.start()
+
+
+def _consumir():
+    from kafka import KafkaConsumer
+
+    while True:
+        try:
+            consumer = KafkaConsumer(
+                TOPIC_INVENTARIO,
+                bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+                value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+                group_id=None,
+                auto_offset_reset="latest",
+            )
+            # Lo que cambió mientras no se escuchaba: que los clientes relean
+            canal_stock.resincronizar()
+            logger.info(f"Stream de stock escuchando '{TOPIC_INVENTARIO}'.")
+            for message in consumer:
+                canal_stock.publicar(cambios_del_evento(message.value))
+        except Exception as e:
+            logger.error(f"Consumidor del stream de stock detenido, se reintenta: {e}")
+            time.sleep(5)
@@ -1,67 +1,284 @@
 # inventario/app/kafka_consumer.py
+#
+# Consumidor de los eventos que descuentan stock: las ventas de transacciones
+# ('topic_ventas') y las dispensaciones de pacientes ('topic_dispensaciones',
+# accion DISPENSACION_REGISTRADA).
+#
+# Los mensajes se procesan por lotes (hasta KAFKA_LOTE_MAXIMO por poll): todo
+# el lote se aplica en una transacción con un solo INSERT en el libro de
+# movimientos de stock (movimientos_stock). Kafka entrega cada mensaje al menos una vez, así
+# que cada evento se anota en 'eventos_procesados' (tipo, id) en la misma
+# transacción; los que ya estaban anotados no se vuelven a descontar. Los
+# offsets se confirman recién después del COMMIT. plegado_stock.py poda las
+# anotaciones más viejas que la retención de los topics.
+#
+# Un lote que falla se reintenta KAFKA_REINTENTOS_LOTE veces; después se
+# aplica de a un mensaje, cada uno en su transacción, y el que vuelve a
+# fallar (con la base respondiendo) se aparta en 'topic_inventario_rechazados'
+# en vez de frenar todos los descuentos. Si la base no responde no se aparta
+# nada: el lote se reintenta entero.
+#
+# Corre en su propio proceso (servicio inventario_consumidor), no en los
+# workers de la API: con varios workers habría un consumidor por worker.
+#
+#     python -m app.kafka_consumer
+#
+# Sus métricas (lag, duración de las consultas) se exponen en
+# http://...:METRICAS_PUERTO/metrics.
 
 import json
 import logging
 import os
+import time
 from kafka import KafkaConsumer
 from kafka.errors import KafkaError
+from sqlalchemy import text
+
+from comun.kafka import MedidorLag
 
 # Usamos importaciones relativas para que funcione con tu estructura
-from .database import SessionLocal
-from .models import Producto
+from .database import engine
+from .kafka_producer import publicar_cambios_stock, publicar_mensaje_rechazado
 
 KAFKA_BOOTSTRAP_SERVERS = os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
 TOPIC_VENTAS = "topic_ventas"
+TOPIC_DISPENSACIONES = "topic_dispensaciones"
+KAFKA_GRUPO = 'inventario-group'
+KAFKA_LOTE_MAXIMO = int(os.environ.get("KAFKA_LOTE_MAXIMO", "500"))
+# Espera antes de reintentar un lote que falló
+KAFKA_REINTENTO_SEGUNDOS = float(os.environ.get("KAFKA_REINTENTO_SEGUNDOS", "5"))
+# Intentos del lote completo antes de aplicarlo de a un mensaje
+KAFKA_REINTENTOS_LOTE = int(os.environ.get("KAFKA_REINTENTOS_LOTE", "3"))
+# Los ids y cantidades van a columnas integer (int4)
+INT4_MAXIMO = 2**31 - 1
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def consumir_ventas():
+
+def _deserializar(valor: bytes):
+    # Un mensaje que no es JSON no debe detener el consumidor: llega como
+    # None y se descarta al traducirlo
+    try:
+        return json.loads(valor.decode('utf-8'))
+    except ValueError:
+        logger.warning(f"Mensaje que no es JSON, se ignora: {valor[:200]!r}")
+        return None
+
+
+def _entero_valido(valor) -> bool:
+    # bool es subclase de int: True no es un id
+    return isinstance(valor, int) and not isinstance(valor, bool) and 0 < valor <= INT4_MAXIMO
+
+
+def _items(datos: dict, clave: str) -> list:
+    items = datos.get(clave)
+    return [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+
+
+def _descuentos_del_mensaje(topic: str, datos) -> list:
     """
-    Función que se ejecuta en un hilo para escuchar y procesar eventos de venta.
+    Traduce un mensaje a [(tipo, referencia_id, producto_id, cantidad), ...].
+    Una venta es un solo evento ('venta', venta_id); en una dispensación cada
+    fila es su propio evento ('dispensacion', id). Los items con ids o
+    cantidades que no son enteros positivos dentro de int4 se saltan.
+    """
+    if not isinstance(datos, dict):
+        logger.warning(f"Mensaje de {topic} con formato inválido, se ignora: {datos}")
+        return []
+    descuentos = []
+    if topic == TOPIC_VENTAS:
+        venta_id = datos.get("venta_id")
+        if not _entero_valido(venta_id):
+            logger.warning(f"Venta sin venta_id válido, se ignora: {datos}")
+            return []
+        for item in _items(datos, "productos"):
+            descuentos.append(("venta", venta_id, item.get("producto_id"), item.get("cantidad")))
+    elif topic == TOPIC_DISPENSACIONES:
+        if datos.get("accion") != "DISPENSACION_REGISTRADA":
+            return []
+        for item in _items(datos, "dispensaciones"):
+            descuentos.append(("dispensacion", item.get("dispensacion_id"), item.get("producto_id"), item.get("cantidad")))
+
+    validos = []
+    for tipo, referencia_id, producto_id, cantidad in descuentos:
+        if not (_entero_valido(referencia_id) and _entero_valido(producto_id) and _entero_valido(cantidad)):
+            logger.warning(f"Item inválido en {topic}, saltando: {datos}")
+            continue
+        validos.append((tipo, referencia_id, producto_id, cantidad))
+    return validos
+
+
+def descuentos_del_lote(mensajes) -> list:
+    """
+    Descuentos de todos los mensajes de un lote. Si el mismo evento llega
+    repetido dentro del lote, solo se toma la primera vez.
+    """
+    descuentos = []
+    vistos = set()
+    for message in mensajes:
+        del_mensaje = _descuentos_del_mensaje(message.topic, message.value)
+        descuentos.extend(d for d in del_mensaje if (d[0], d[1]) not in vistos)
+        vistos.update((d[0], d[1]) for d in del_mensaje)
+    return descuentos
+
+
+def aplicar_descuentos(conn, descuentos: list) -> list:
+    """
+    Aplica los descuentos de un lote en la transacción de 'conn' y devuelve
+    los cambios de stock [{producto_id, nombre, stock}, ...]. Los eventos ya
+    procesados en lotes anteriores se saltan.
+    """
+    eventos = sorted({(tipo, referencia_id) for tipo, referencia_id, _, _ in descuentos})
+    if not eventos:
+        return []
+    nuevos = set(conn.execute(text("""
+        INSERT INTO eventos_procesados (tipo, referencia_id)
+        SELECT * FROM unnest(CAST(:tipos AS varchar[]), CAST(:ids AS integer[]))
+        ON CONFLICT DO NOTHING
+        RETURNING tipo, referencia_id
+    """), {"tipos": [e[0] for e in eventos], "ids": [e[1] for e in eventos]}).tuples())
+
+    aplicar = [d for d in descuentos if (d[0], d[1]) in nuevos]
+    if len(nuevos) < len(eventos):
+        logger.info(f"{len(eventos) - len(nuevos)} evento(s) ya procesados, no se descuentan de nuevo.")
+    if not aplicar:
+        return []
+
+    # Un solo INSERT en el libro para todo el lote (migración 0007): las
+    # filas de productos no se bloquean, el plegado las actualiza después
+    encontrados = set(conn.execute(text("""
+        INSERT INTO movimientos_stock (producto_id, tipo, referencia_id, cantidad)
+        SELECT v.producto_id, v.tipo, v.referencia_id, -v.cantidad
+        FROM unnest(CAST(:tipos AS varchar[]), CAST(:ids AS integer[]), CAST(:productos AS integer[]),
+                    CAST(:cantidades AS integer[])) AS v(tipo, referencia_id, producto_id, cantidad)
+        JOIN productos p ON p.id = v.producto_id
+        RETURNING producto_id
+    """), {
+        "tipos": [d[0] for d in aplicar], "ids": [d[1] for d in aplicar],
+        "productos": [d[2] for d in aplicar], "cantidades": [d[3] for d in aplicar],
+    }).scalars())
+
+    for producto_id in sorted({d[2] for d in aplicar}):
+        if producto_id not in encontrados:
+            logger.warning(f"Producto con ID {producto_id} no encontrado en el inventario.")
+    if not encontrados:
+        return []
+    filas = conn.execute(text("""
+        SELECT producto_id, nombre, stock FROM stock_actual WHERE producto_id = ANY(:productos)
+    """), {"productos": sorted(encontrados)}).all()
+    return [{"producto_id": fila[0], "nombre": fila[1], "stock": fila[2]} for fila in filas]
+
+
+def _volver_al_inicio_del_lote(consumer, lote: dict):
+    # Sin commit de offsets el lote se volvería a leer recién al reiniciar;
+    # se reposiciona cada partición en su primer mensaje para reintentarlo.
+    for particion, mensajes in lote.items():
+        consumer.seek(particion, mensajes[0].offset)
+
+
+def _aplicar_mensajes(mensajes) -> tuple:
+    """Aplica los mensajes en una transacción; devuelve (descuentos, cambios_stock)."""
+    descuentos = descuentos_del_lote(mensajes)
+    with engine.begin() as conn:
+        return descuentos, aplicar_descuentos(conn, descuentos)
+
+
+def _base_responde() -> bool:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+def _aplicar_de_a_uno(lote: dict) -> tuple:
+    """
+    Aplica cada mensaje del lote en su propia transacción y aparta los que
+    fallan. Los ya aplicados en un intento anterior se saltan por
+    eventos_procesados. Si la base no responde se corta con la excepción
+    (el lote se reintenta entero): el error no es del mensaje.
+    """
+    descuentos, cambios_stock = [], {}
+    for mensajes in lote.values():
+        for message in mensajes:
+            try:
+                del_mensaje, cambios = _aplicar_mensajes([message])
+            except Exception as e:
+                if not _base_responde():
+                    raise
+                logger.error(f"Mensaje apartado ({message.topic}, partición {message.partition}, "
+                             f"offset {message.offset}): {e}")
+                publicar_mensaje_rechazado(message.topic, message.partition, message.offset, message.value, str(e))
+                continue
+            descuentos.extend(del_mensaje)
+            cambios_stock.update((c["producto_id"], c) for c in cambios)
+    return descuentos, list(cambios_stock.values())
+
+
+def consumir_movimientos_stock():
+    """
+    Función que se ejecuta en un hilo para escuchar y procesar los eventos
+    de venta y de dispensación.
     """
     logger.info("Iniciando consumidor de Kafka...")
     try:
         consumer = KafkaConsumer(
             TOPIC_VENTAS,
+            TOPIC_DISPENSACIONES,
             bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            value_deserializer=lambda v: json.loads(v.decode('utf-8')),
-            group_id='inventario-group',
+            value_deserializer=_deserializar,
+            group_id=KAFKA_GRUPO,
             auto_offset_reset='earliest',
+            enable_auto_commit=False,
             api_version=(2, 8, 1)
         )
-        logger.info(f"Consumidor de Kafka conectado y escuchando el topic '{TOPIC_VENTAS}'.")
+        logger.info(f"Consumidor de Kafka conectado y escuchando '{TOPIC_VENTAS}' y '{TOPIC_DISPENSACIONES}'.")
     except KafkaError as e:
         logger.error(f"Error fatal al conectar el consumidor de Kafka: {e}")
         return
 
-    db_session = SessionLocal()
-    for message in consumer:
+    lag = MedidorLag(KAFKA_GRUPO)
+    fallos = 0  # Intentos fallidos seguidos
+    while True:
+        lote = consumer.poll(timeout_ms=1000, max_records=KAFKA_LOTE_MAXIMO)
+        lag.actualizar(consumer)
+        if not lote:
+            continue
+
         try:
-            datos_venta = message.value
-            logger.info(f"Venta recibida de Kafka: {datos_venta}")
+            if fallos < KAFKA_REINTENTOS_LOTE:
+                descuentos, cambios_stock = _aplicar_mensajes(m for mensajes in lote.values() for m in mensajes)
+            else:
+                descuentos, cambios_stock = _aplicar_de_a_uno(lote)
+            consumer.commit()
+        except Exception as e:
+            fallos += 1
+            logger.error(f"Error procesando un lote de {sum(len(m) for m in lote.values())} mensaje(s) "
+                         f"(intento {fallos}): {e}")
+            _volver_al_inicio_del_lote(consumer, lote)
+            time.sleep(KAFKA_REINTENTO_SEGUNDOS)
+            continue
+        fallos = 0
 
-            productos_vendidos = datos_venta.get("productos", [])
-            for item in productos_vendidos:
-                producto_id = item.get("producto_id")
-                cantidad_vendida = item.get("cantidad")
+        logger.info(f"Lote procesado: {len(descuentos)} item(s), {len(cambios_stock)} producto(s) actualizados.")
+        publicar_cambios_stock(cambios_stock)
 
-                if not producto_id or not isinstance(cantidad_vendida, int):
-                    logger.warning(f"Mensaje de venta inválido, saltando item: {item}")
-                    continue
 
-                producto_a_actualizar = db_session.query(Producto).filter(Producto.id == producto_id).with_for_update().first()
+if __name__ == "__main__":
+    import signal
+    import sys
 
-                if producto_a_actualizar:
-                    producto_a_actualizar.stock -= cantidad_vendida
-                    logger.info(f"Stock del producto {producto_id} actualizado. Nuevo stock: {producto_a_actualizar.stock}")
-                else:
-                    logger.warning(f"Producto con ID {producto_id} no encontrado en el inventario.")
+    from prometheus_client import start_http_server
 
-            db_session.commit()
+    from .kafka_producer import publicador
 
-        except Exception as e:
-            logger.error(f"Error procesando el mensaje de venta: {e}")
-            db_session.rollback()
-
-    db_session.close()
\ No newline at end of file
+    # docker stop manda SIGTERM: se sale por el finally para enviar los
+    # cambios de stock que sigan en la cola
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    start_http_server(int(os.environ.get("METRICAS_PUERTO", "9100")))
+    try:
+        consumir_movimientos_stock()
+    finally:
+        publicador.cerrar()
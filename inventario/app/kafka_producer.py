@@ -1,58 +1,34 @@
-from kafka import KafkaProducer
-from kafka.errors import NoBrokersAvailable
-import json
-import time
-import os
-
-_producer_instance = None
-KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092')
-
-def get_kafka_producer():
-    global _producer_instance
-    if _producer_instance is None:
-        print(f"INFO: Intentando conectar KafkaProducer a: {KAFKA_BOOTSTRAP_SERVERS}")
-        max_retries = 5
-        retry_delay = 5  # segundos
-        for attempt in range(max_retries):
-            try:
-                _producer_instance = KafkaProducer(
-                    bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-                    value_serializer=lambda m: json.dumps(m).encode('utf-8'),
-                    client_id='inventario-service-producer',
-                )
-                print("INFO: KafkaProducer conectado exitosamente.")
-                break
-            except NoBrokersAvailable as e:
-                print(f"WARN: Intento {attempt + 1}/{max_retries} fallido al conectar con Kafka (NoBrokersAvailable): {e}")
-                if attempt + 1 == max_retries:
-                    print("ERROR: Máximo de reintentos alcanzado. Falló la conexión con Kafka.")
-                    _producer_instance = None
-                else:
-                    print(f"INFO: Reintentando conexión con Kafka en {retry_delay} segundos...")
-                    time.sleep(retry_delay)
-            except Exception as e:
-                print(f"WARN: Intento {attempt + 1}/{max_retries} fallido al conectar con Kafka (Otro Error): {e}")
-                if attempt + 1 == max_retries:
-                    print("ERROR: Máximo de reintentos alcanzado. Falló la conexión con Kafka.")
-                    _producer_instance = None
-                else:
-                    print(f"INFO: Reintentando conexión con Kafka en {retry_delay} segundos...")
-                    time.sleep(retry_delay)
-    
-    if _producer_instance is None:
-        print("ERROR: KafkaProducer no está inicializado después de los reintentos. Los eventos no se enviarán.")
-            
-    return _producer_instance
+from comun.kafka import PublicadorKafka
+
+TOPIC_INVENTARIO = "topic_inventario"
+
+# Publicador compartido (comun/kafka.py): enviar_evento no espera a Kafka,
+# encola el mensaje y un hilo lo envía en segundo plano.
+publicador = PublicadorKafka(client_id='inventario-service-producer')
 
 def enviar_evento(topic: str, mensaje: dict):
-    producer = get_kafka_producer()
-    if producer:
-        try:
-            print(f"INFO: Enviando evento a Kafka (topic: {topic}): {mensaje}")
-            future = producer.send(topic, mensaje)
-            producer.flush()
-            print("INFO: Evento flusheado a Kafka.")
-        except Exception as e:
-            print(f"ERROR: Error al enviar evento a Kafka: {e}")
-    else:
-        print(f"ERROR: No se pudo enviar evento a Kafka porque el productor no está disponible. Mensaje: {mensaje}")
+    publicador.publicar(topic, mensaje)
+
+# --- EVENTOS DE INVENTARIO ---
+# Otros servicios (p. ej. el dashboard de informes) mantienen su copia del
+# stock a partir de estos eventos en vez de releer la tabla de productos.
+
+def publicar_cambios_stock(productos: list):
+    """'productos' es una lista de dicts con producto_id, nombre y stock."""
+    if not productos:
+        return
+    enviar_evento(TOPIC_INVENTARIO, {"accion": "STOCK_ACTUALIZADO", "productos": productos})
+
+def publicar_producto_eliminado(producto_id: int):
+    enviar_evento(TOPIC_INVENTARIO, {"accion": "PRODUCTO_ELIMINADO", "producto_id": producto_id})
+
+# --- MENSAJES RECHAZADOS ---
+# Mensajes de ventas o dispensaciones que el consumidor no pudo aplicar ni
+# de a uno: quedan apartados aquí (con su origen y el error) para revisarlos
+# sin frenar el resto de los descuentos.
+TOPIC_RECHAZADOS = "topic_inventario_rechazados"
+
+def publicar_mensaje_rechazado(topic: str, particion: int, offset: int, valor, error: str):
+    enviar_evento(TOPIC_RECHAZADOS, {
+        "topic": topic, "particion": particion, "offset": offset, "valor": valor, "error": error,
+    })
@@ -1,26 +1,47 @@
 # inventario/app/main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from threading import Thread  # <-- 1. IMPORTAR THREAD
-from app import models
 from app.database import engine
 from app.routes import productos, compras
-from app.kafka_consumer import consumir_ventas # <-- 2. IMPORTAR NUESTRA FUNCIÓN
+from app.kafka_consumer import consumir_movimientos_stock # <-- 2. IMPORTAR NUESTRA FUNCIÓN
+from app.kafka_producer import publicador
+from comun.db import calentar_pool
+from comun.roles import cliente_roles
+from comun.metricas import instalar_metricas
+from comun.respuestas import instalar_compresion
+from comun.salud import instalar_salud
 
-models.Base.metadata.create_all(bind=engine)
+# --- 3. CONSUMIDOR DE KAFKA ---
+# Normalmente corre aparte (python -m app.kafka_consumer, servicio
+# inventario_consumidor); con INVENTARIO_CONSUMIDOR_EN_WEB=true se inicia un
+# hilo en cada worker, útil al correr un solo uvicorn en desarrollo.
+CONSUMIDOR_EN_WEB = os.getenv("INVENTARIO_CONSUMIDOR_EN_WEB", "false").lower() == "true"
 
-app = FastAPI(title="Microservicio de Inventario")
-
-# --- 3. INICIAMOS EL CONSUMIDOR EN SEGUNDO PLANO ---
-@app.on_event("startup")
-async def startup_event():
-    thread = Thread(target=consumir_ventas)
-    thread.daemon = True
-    thread.start()
+#
+# El esquema lo crean las migraciones (servicio migraciones), no el arranque.
+# Postgres y Kafka se conectan en segundo plano: el worker atiende en cuanto
+# arranca y /listo indica cuándo la base responde.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    calentar_pool(engine)
+    publicador.iniciar()
+    if CONSUMIDOR_EN_WEB:
+        thread = Thread(target=consumir_movimientos_stock)
+        thread.daemon = True
+        thread.start()
+    # Cambios de rol publicados por usuarios (caché de roles de compras)
+    cliente_roles.escuchar_cambios()
+    yield
+    # Envía los eventos que sigan en la cola antes de terminar
+    publicador.cerrar()
 # ----------------------------------------------------
 
+app = FastAPI(title="Microservicio de Inventario", lifespan=lifespan)
+
 allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000")
 origins = [origin.strip() for origin in allowed_origins_str.split(',')]
 
@@ -32,6 +53,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas de Prometheus (/metrics), chequeos de salud (/salud, /listo) y
+# compresión brotli/gzip de las respuestas grandes (menos el stream de eventos,
+# que tiene que llegar al cliente evento por evento)
+instalar_metricas(app)
+instalar_compresion(app, excluir=[r"/eventos$"])
+instalar_salud(app, engine=engine, publicador=publicador)
+
 app.include_router(productos.router, prefix="/api/inventario", tags=["Productos"])
 app.include_router(compras.router, prefix="/api/compras", tags=["Compras"])
 
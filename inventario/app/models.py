@@ -1,12 +1,29 @@
 # inventario/app/models.py
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, DateTime, Boolean, FetchedValue, func, select
+from sqlalchemy.orm import relationship, column_property
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
 Base = declarative_base()
 
+# Libro de movimientos de stock (migración 0007). Cada venta, dispensación,
+# compra recibida o ajuste inserta una fila con la cantidad con signo; nadie
+# actualiza la fila del producto. plegado_stock.py suma periódicamente los
+# movimientos pendientes a productos.stock y los marca como plegados.
+class MovimientoStock(Base):
+    __tablename__ = "movimientos_stock"
+
+    id = Column(BigInteger, primary_key=True)
+    producto_id = Column(Integer, nullable=False)
+    tipo = Column(String, nullable=False) # inicial, venta, dispensacion, compra, ajuste
+    referencia_id = Column(Integer, nullable=True)
+    cantidad = Column(Integer, nullable=False)
+    creado_en = Column(DateTime, default=datetime.datetime.utcnow)
+    plegado = Column(Boolean, default=False, nullable=False)
+    # Id de la transacción que lo insertó (la pone la base, migración 0008)
+    version = Column(BigInteger, nullable=False, server_default=FetchedValue())
+
 class Producto(Base):
     __tablename__ = "productos"
 
@@ -14,7 +31,21 @@ class Producto(Base):
     nombre = Column(String, index=True, nullable=False)
     descripcion = Column(String, nullable=True)
     precio_venta = Column(Float, nullable=False)
-    stock = Column(Integer, default=0) # El stock vive directamente en el producto
+    # Stock hasta el último plegado; no se modifica desde las rutas
+    stock_plegado = Column("stock", Integer, default=0)
+    # Versión del último cambio de nombre, descripción o precio: id de la
+    # transacción, la pone la base (migración 0008, /cambios)
+    version = Column(BigInteger, nullable=False, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    # Stock actual: el plegado más los movimientos pendientes (igual que la vista stock_actual)
+    stock = column_property(
+        stock_plegado + func.coalesce(
+            select(func.sum(MovimientoStock.cantidad))
+            .where(MovimientoStock.producto_id == id, ~MovimientoStock.plegado)
+            .correlate_except(MovimientoStock)
+            .scalar_subquery(),
+            0,
+        )
+    )
 
 class OrdenCompra(Base):
     __tablename__ = "ordenes_compra"
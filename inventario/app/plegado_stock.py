@@ -0,0 +1,108 @@
+# inventario/app/plegado_stock.py
+#
+# Plegado del libro de movimientos de stock (migración 0007): suma a
+# productos.stock los movimientos pendientes y los marca como plegados, todo
+# en la misma transacción. Así la lectura del stock actual (vista
+# stock_actual / Producto.stock) solo recorre los movimientos desde el último
+# plegado, y las ventas nunca esperan el bloqueo de la fila del producto: la
+# única escritura sobre productos es la de esta pasada.
+#
+# Los movimientos se procesan en lotes de --lote con SKIP LOCKED (no espera a
+# los que otra transacción tenga tomados) y un bloqueo advisory evita dos
+# plegados simultáneos.
+#
+# Cada pasada también poda 'eventos_procesados' (migraciones 0005 y 0010):
+# una fila solo sirve mientras su mensaje pueda volver a entregarse. Kafka
+# guarda los mensajes 7 días (log.retention.hours por defecto) y
+# backfill_stock.py revisa ventas desde la fecha más antigua pendiente, que
+# puede llevar hasta VENTAS_ATRASO_MAXIMO_DIAS (7) de atraso en las ventas
+# sin conexión; EVENTOS_PROCESADOS_RETENCION_DIAS deja además un día de
+# margen. Si se alarga la retención del topic hay que alargar esta.
+#
+# Uso:
+#     python -m app.plegado_stock                     # una pasada
+#     python -m app.plegado_stock --cada-segundos 60  # en bucle (servicio)
+
+import argparse
+import logging
+import os
+import time
+
+from sqlalchemy import text
+
+from .database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EVENTOS_PROCESADOS_RETENCION_DIAS = int(os.getenv("EVENTOS_PROCESADOS_RETENCION_DIAS", "15"))
+
+SQL_PLEGAR_LOTE = text("""
+    WITH lote AS (
+        SELECT id FROM movimientos_stock WHERE NOT plegado
+        LIMIT :lote
+        FOR UPDATE SKIP LOCKED
+    ), plegados AS (
+        UPDATE movimientos_stock m SET plegado = true
+        FROM lote WHERE m.id = lote.id
+        RETURNING m.producto_id, m.cantidad
+    ), actualizados AS (
+        UPDATE productos p SET stock = p.stock + t.cantidad
+        FROM (SELECT producto_id, SUM(cantidad) AS cantidad FROM plegados GROUP BY producto_id) AS t
+        WHERE p.id = t.producto_id
+        RETURNING p.id
+    )
+    SELECT (SELECT COUNT(*) FROM plegados), (SELECT COUNT(*) FROM actualizados)
+""")
+
+SQL_PODAR_EVENTOS = text("""
+    DELETE FROM eventos_procesados
+    WHERE (tipo, referencia_id) IN (
+        SELECT tipo, referencia_id FROM eventos_procesados
+        WHERE procesado_en < (now() AT TIME ZONE 'utc') - make_interval(days => :dias)
+        LIMIT :lote
+    )
+""")
+
+
+def plegar(lote: int = 10000) -> int:
+    """Pliega todos los movimientos pendientes; devuelve cuántos plegó."""
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('plegado_stock'))")).scalar():
+                logger.info("Otro plegado está en curso, se omite esta pasada.")
+                return total
+            movimientos, productos = conn.execute(SQL_PLEGAR_LOTE, {"lote": lote}).one()
+        total += movimientos
+        if movimientos:
+            logger.info(f"Plegados {movimientos} movimiento(s) en {productos} producto(s).")
+        if movimientos < lote:
+            return total
+
+
+def podar_eventos(dias: int = EVENTOS_PROCESADOS_RETENCION_DIAS, lote: int = 10000) -> int:
+    """Borra de eventos_procesados los eventos de hace más de 'dias'; devuelve cuántos."""
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            borrados = conn.execute(SQL_PODAR_EVENTOS, {"dias": dias, "lote": lote}).rowcount
+        total += borrados
+        if borrados < lote:
+            if total:
+                logger.info(f"Podados {total} evento(s) procesados de hace más de {dias} días.")
+            return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pliega los movimientos de stock pendientes en productos.stock")
+    parser.add_argument("--cada-segundos", type=float, default=None, help="Repite la pasada cada N segundos")
+    parser.add_argument("--lote", type=int, default=10000, help="Movimientos por transacción")
+    args = parser.parse_args()
+
+    while True:
+        plegar(args.lote)
+        podar_eventos(lote=args.lote)
+        if args.cada_segundos is None:
+            break
+        time.sleep(args.cada_segundos)
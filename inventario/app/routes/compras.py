@@ -1,6 +1,7 @@
 # inventario/app/routes/compras.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
+from typing import Optional
 from sqlalchemy.orm import Session
 
 # Importamos todo lo que necesitamos
@@ -8,25 +9,40 @@ from app import crud, schemas
 from app.database import get_db
 # ¡Aquí está la clave! Importamos el validador de tokens
 from app.security import get_token_payload 
+from app.kafka_producer import publicar_cambios_stock
+from comun.roles import RolesNoDisponibles
+from comun.token_roles import resolver_rol, CABECERA_TOKEN_ROL
 
 router = APIRouter()
 
+# Roles que pueden gestionar las órdenes de compra
+ROLES_COMPRAS = ("admin_inventario", "admin_general")
+
+def verificar_rol_compras(
+    payload: dict = Depends(get_token_payload),
+    token_rol: Optional[str] = Header(None, alias=CABECERA_TOKEN_ROL)
+):
+    # El rol sale del token de rol firmado por usuarios (verificado aquí
+    # mismo) o, si no viene, del caché de comun.roles.
+    try:
+        permitido = resolver_rol(payload.get("sub"), token_rol) in ROLES_COMPRAS
+    except RolesNoDisponibles:
+        raise HTTPException(status_code=503, detail="No se pudo verificar el rol del usuario.")
+    if not permitido:
+        raise HTTPException(status_code=403, detail="No tienes permisos para gestionar órdenes de compra.")
+
 @router.post("/", response_model=schemas.OrdenCompra)
 def crear_orden_compra(
     orden: schemas.OrdenCompraCreate, 
     db: Session = Depends(get_db),
     # Añadimos la dependencia de seguridad. Si el token no es válido, la petición se detiene aquí.
-    payload: dict = Depends(get_token_payload) 
+    payload: dict = Depends(get_token_payload),
+    _rol: None = Depends(verificar_rol_compras)
 ):
     """
     Crea una nueva orden de compra.
-    Protegido por autenticación. Solo usuarios con token válido pueden acceder.
+    Protegido por autenticación. Solo admin_inventario o admin_general.
     """
-    # Futura mejora: Podrías verificar el rol del usuario aquí.
-    # user_id = payload.get("sub")
-    # if not user_has_role(db, user_id, "admin_inventario"):
-    #     raise HTTPException(status_code=403, detail="No tienes permisos para crear órdenes de compra.")
-    
     return crud.create_orden_compra(db=db, orden=orden)
 
 @router.post("/{compra_id}/recibir", status_code=200)
@@ -34,14 +50,20 @@ def recibir_orden_compra(
     compra_id: int, 
     db: Session = Depends(get_db),
     # Protegemos también este endpoint.
-    payload: dict = Depends(get_token_payload)
+    payload: dict = Depends(get_token_payload),
+    _rol: None = Depends(verificar_rol_compras)
 ):
     """
     Marca una orden de compra como recibida y actualiza el stock de los productos.
-    Protegido por autenticación.
+    Protegido por autenticación. Solo admin_inventario o admin_general.
     """
     orden_actualizada = crud.recibir_compra(db=db, compra_id=compra_id)
     if not orden_actualizada:
         raise HTTPException(status_code=404, detail="Orden de compra no encontrada o ya ha sido recibida.")
+
+    publicar_cambios_stock([
+        {"producto_id": d.producto.id, "nombre": d.producto.nombre, "stock": d.producto.stock}
+        for d in orden_actualizada.detalles if d.producto is not None
+    ])
     
     return {"mensaje": f"Orden {compra_id} recibida. El stock ha sido actualizado exitosamente."}
\ No newline at end of file
@@ -1,17 +1,27 @@
 # inventario/app/routes/productos.py (Versión Reparada con la importación correcta)
 
-from fastapi import APIRouter, Depends, HTTPException
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app import crud, schemas
 from app.database import get_db
 # --- CORRECCIÓN AQUÍ ---
 # Importamos la función con su nombre correcto desde tu archivo security.py
 from app.security import get_token_payload 
+from app.kafka_producer import publicar_cambios_stock, publicar_producto_eliminado
+from app import eventos
+from comun.respuestas import RespuestaJSON, respuesta_json_cacheable
 
 router = APIRouter()
 
+# El catálogo lleva ETag y Cache-Control: nginx (frontend/nginx.conf) lo
+# guarda CATALOGO_CACHE_SEGUNDOS en su micro-caché (s-maxage) y después lo
+# revalida con el ETag; el navegador revalida siempre (max-age=0).
+CATALOGO_CACHE_SEGUNDOS = int(os.getenv("CATALOGO_CACHE_SEGUNDOS", "2"))
+
 @router.post("/", response_model=schemas.Producto)
 def crear_producto(
     producto: schemas.ProductoCreate, 
@@ -19,17 +29,48 @@ def crear_producto(
     # Y la usamos aquí
     payload: dict = Depends(get_token_payload) 
 ):
-    return crud.create_producto(db=db, producto=producto)
+    db_producto = crud.create_producto(db=db, producto=producto)
+    publicar_cambios_stock([{"producto_id": db_producto.id, "nombre": db_producto.nombre, "stock": db_producto.stock}])
+    return db_producto
 
 @router.get("/", response_model=List[schemas.Producto])
 def leer_productos(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db),
     # Y aquí
     payload: dict = Depends(get_token_payload)
 ):
-    return crud.get_productos(db, skip=skip, limit=limit)
+    # Las filas van directo a JSON (orjson), sin un modelo de Pydantic por
+    # producto; response_model queda para la documentación
+    return respuesta_json_cacheable(request, crud.get_productos(db, skip=skip, limit=limit),
+                                    f"max-age=0, s-maxage={CATALOGO_CACHE_SEGUNDOS}")
+
+@router.get("/cambios", response_model=schemas.CambiosCatalogo)
+def leer_cambios_productos(
+    desde: int = Query(0, ge=0, description="Valor 'version' de la respuesta anterior (0: catálogo completo)"),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    """
+    Cambios del catálogo desde la versión 'desde': productos nuevos o con
+    otro nombre, precio o stock, e ids de los eliminados. El POS guarda el
+    catálogo en el navegador y consulta solo esto.
+    """
+    return RespuestaJSON(crud.get_cambios_productos(db, desde=desde))
+
+@router.get("/eventos")
+async def eventos_stock(payload: dict = Depends(get_token_payload)):
+    """
+    Stream (text/event-stream) de cambios de stock. Evento 'stock':
+    {"productos": [...]} con el último estado de cada producto que cambió,
+    agrupados cada SSE_INTERVALO_SEGUNDOS. Evento 'resincronizar': el
+    cliente vuelve a leer /cambios. Al conectarse, el cliente también lee
+    /cambios: el stream solo trae lo que cambia desde ese momento.
+    """
+    eventos.iniciar()
+    return eventos.canal_stock.respuesta()
 
 @router.put("/{producto_id}", response_model=schemas.Producto)
 def actualizar_producto_endpoint(
@@ -42,8 +83,22 @@ def actualizar_producto_endpoint(
     db_producto = crud.update_producto(db, producto_id=producto_id, producto=producto_update)
     if db_producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    publicar_cambios_stock([{"producto_id": db_producto.id, "nombre": db_producto.nombre, "stock": db_producto.stock}])
     return db_producto
 
+@router.get("/{producto_id}/movimientos", response_model=List[schemas.MovimientoStock])
+def leer_movimientos_producto(
+    producto_id: int,
+    antes_de: Optional[int] = Query(None, description="Id del último movimiento de la página anterior"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    """Historial de movimientos de stock del producto, del más reciente al más antiguo."""
+    if crud.get_producto(db, producto_id=producto_id) is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return crud.get_movimientos(db, producto_id=producto_id, antes_de=antes_de, limit=limit)
+
 @router.delete("/{producto_id}", status_code=204)
 def eliminar_producto_endpoint(
     producto_id: int,
@@ -54,4 +109,5 @@ def eliminar_producto_endpoint(
     db_producto = crud.delete_producto(db, producto_id=producto_id)
     if db_producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    publicar_producto_eliminado(producto_id)
     # No se devuelve contenido, solo el status 204
\ No newline at end of file
@@ -1,5 +1,7 @@
 # inventario/app/schemas.py
 
+from datetime import datetime
+
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -19,6 +21,24 @@ class Producto(ProductoBase):
     class Config:
         from_attributes = True # CORRECCIÓN: 'orm_mode' cambiado a 'from_attributes'
 
+# Respuesta de GET /api/inventario/cambios
+class CambiosCatalogo(BaseModel):
+    version: int
+    completo: bool
+    productos: List[Producto]
+    eliminados: List[int]
+
+# --- Esquemas para Movimientos de Stock ---
+class MovimientoStock(BaseModel):
+    id: int
+    tipo: str
+    referencia_id: Optional[int] = None
+    cantidad: int
+    creado_en: datetime
+
+    class Config:
+        from_attributes = True
+
 # --- Esquemas para Orden de Compra ---
 class DetalleOrdenCompraBase(BaseModel):
     producto_id: int
@@ -0,0 +1,19 @@
+# migraciones/env_db.py
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def get_database_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    return (
+        f"postgresql://{os.getenv('POSTGRES_USER', 'admin')}:"
+        f"{os.getenv('POSTGRES_PASSWORD', 'admin')}@"
+        f"{os.getenv('POSTGRES_HOST', 'postgres')}/"
+        f"{os.getenv('POSTGRES_DB', 'farmacia')}"
+    )
@@ -0,0 +1,270 @@
+# migraciones/verificar_planes.py
+#
+# Regresión de planes de consulta: ejecuta EXPLAIN sobre cada consulta de las
+# rutas calientes y verifica que el plan use los índices esperados.
+# Se corre después de 'alembic upgrade head' (en CI o a mano):
+#
+#     python verificar_planes.py
+#
+# Con tablas pequeñas PostgreSQL prefiere un Seq Scan aunque exista el índice,
+# por eso se desactiva enable_seqscan dentro de la transacción: lo que se
+# comprueba es que el índice EXISTA y SEA UTILIZABLE por la consulta, no el
+# costo con los datos actuales. La transacción se deshace al final.
+#
+# ventas y detalles_venta están particionadas por mes (migración 0003): en el
+# plan aparecen los índices de cada partición, que se traducen al índice de
+# la tabla padre. Además se verifica la poda de particiones: una consulta de
+# un mes debe leer solo la partición de ese mes en cada tabla.
+#
+# Un índice esperado puede ser una tupla de alternativas: basta con que el
+# plan use una. Es para las consultas que dos índices resuelven igual de
+# bien, donde cuál elige el planner depende del tamaño y la hinchazón de
+# cada uno y no de un cambio en la consulta.
+
+import json
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+
+from env_db import get_database_url
+
+# Un rango dentro del mes actual: su partición siempre existe
+MES_ACTUAL = date.today().replace(day=1)
+RANGO_MES = {"desde": MES_ACTUAL.isoformat(), "hasta": f"{MES_ACTUAL + timedelta(days=27)} 23:59:59"}
+SUFIJO_MES = MES_ACTUAL.strftime("p%Y_%m")
+
+CONSULTA_TOP_VENDIDOS = """
+    SELECT p.nombre, SUM(d.cantidad)
+    FROM productos p
+    JOIN detalles_venta d ON p.id = d.producto_id
+    WHERE d.fecha BETWEEN :desde AND :hasta
+    GROUP BY p.nombre
+    ORDER BY SUM(d.cantidad) DESC
+    LIMIT 10
+"""
+CONSULTA_SIN_MOVIMIENTO = """
+    SELECT s.producto_id, s.nombre, s.stock FROM stock_actual s
+    WHERE s.producto_id NOT IN (
+        SELECT DISTINCT d.producto_id FROM detalles_venta d
+        WHERE d.fecha >= :desde
+    )
+    ORDER BY s.nombre
+"""
+
+# (descripción, consulta, parámetros, índices que deben aparecer en el plan)
+CONSULTAS = [
+    (
+        "informes: ventas por rango de fechas",
+        """
+        SELECT v.fecha, v.id, p.nombre, d.cantidad, d.precio_unitario, d.subtotal
+        FROM ventas v
+        JOIN detalles_venta d ON v.id = d.venta_id AND v.fecha = d.fecha
+        JOIN productos p ON d.producto_id = p.id
+        WHERE v.fecha BETWEEN :desde AND :hasta AND d.fecha BETWEEN :desde AND :hasta
+        ORDER BY v.fecha
+        """,
+        RANGO_MES,
+        {"ix_ventas_fecha"},
+    ),
+    (
+        # Stock actual = plegado + movimientos pendientes (migración 0007).
+        # Los pendientes de un producto salen del índice parcial o del de
+        # historial (producto_id, id) filtrando NOT plegado: los dos leen solo
+        # las filas de ese producto. Con el libro recién creado (o el parcial
+        # hinchado por el plegado) el planner elige el de historial; con
+        # historial largo, el parcial. Lo que no puede pasar es un Seq Scan.
+        "inventario: stock actual de productos",
+        "SELECT producto_id, nombre, stock FROM stock_actual WHERE producto_id = ANY(:productos)",
+        {"productos": [1, 2, 3]},
+        {"productos_pkey", ("ix_movimientos_stock_pendientes", "ix_movimientos_stock_producto_id")},
+    ),
+    (
+        "inventario: historial de movimientos de un producto (página siguiente)",
+        """
+        SELECT id, tipo, referencia_id, cantidad, creado_en FROM movimientos_stock
+        WHERE producto_id = :producto_id AND id < :antes_de
+        ORDER BY id DESC
+        LIMIT 50
+        """,
+        {"producto_id": 1, "antes_de": 1000},
+        {"ix_movimientos_stock_producto_id"},
+    ),
+    (
+        "pacientes: alertas (carga de dispensaciones recientes del paciente)",
+        """
+        SELECT id, producto_id, fecha_dispensacion FROM dispensaciones
+        WHERE paciente_id = :paciente_id AND fecha_dispensacion >= :desde
+        """,
+        {"paciente_id": 1, "desde": "2025-01-01"},
+        {"ix_dispensaciones_paciente_fecha_id"},
+    ),
+    (
+        "pacientes: obtener_dispensaciones_paciente (página siguiente)",
+        """
+        SELECT d.id, d.paciente_id, d.producto_id, d.cantidad, d.fecha_dispensacion,
+               COALESCE(p.nombre, NULLIF(d.nombre_producto, 'N/A'))
+        FROM dispensaciones d
+        LEFT JOIN productos p ON p.id = d.producto_id
+        WHERE d.paciente_id = :paciente_id AND (d.fecha_dispensacion, d.id) < (:fecha, :id)
+        ORDER BY d.fecha_dispensacion DESC, d.id DESC
+        LIMIT 51
+        """,
+        {"paciente_id": 1, "fecha": "2025-01-01", "id": 1000},
+        {"ix_dispensaciones_paciente_fecha_id"},
+    ),
+    (
+        "usuarios: list_users filtrado por rol (página siguiente)",
+        """
+        SELECT id, rol FROM usuarios
+        WHERE rol = :rol AND id > :cursor
+        ORDER BY id
+        LIMIT 51
+        """,
+        {"rol": "beneficiario", "cursor": "auth0|0"},
+        {"ix_usuarios_rol_id"},
+    ),
+    (
+        "inventario: cambios del catálogo desde una versión",
+        """
+        SELECT id FROM productos WHERE version >= :desde AND version < :hasta
+        UNION
+        SELECT producto_id FROM movimientos_stock WHERE version >= :desde AND version < :hasta
+        """,
+        {"desde": 1000, "hasta": 2000},
+        {"ix_productos_version", "ix_movimientos_stock_version"},
+    ),
+    (
+        "inventario: poda de eventos_procesados (plegado_stock.py)",
+        """
+        SELECT tipo, referencia_id FROM eventos_procesados
+        WHERE procesado_en < :limite
+        LIMIT 10000
+        """,
+        {"limite": "2025-01-01"},
+        {"ix_eventos_procesados_procesado_en"},
+    ),
+    (
+        "pacientes: cambios desde una versión",
+        """
+        SELECT nombre, rut, fecha_nacimiento, id FROM pacientes
+        WHERE version >= :desde AND version < :hasta
+        """,
+        {"desde": 1000, "hasta": 2000},
+        {"ix_pacientes_version"},
+    ),
+]
+
+
+
+def _mes_de(particion: str):
+    # 'ventas_p2025_01' -> '2025_01'; DEFAULT no tiene mes
+    return None if particion.endswith("_default") else particion[-7:]
+
+
+# (descripción, consulta, parámetros, función que dice si una partición
+# puede aparecer en el plan)
+PODA = [
+    (
+        "poda: ventas de un mes",
+        CONSULTAS[0][1],
+        RANGO_MES,
+        lambda particion: particion in (f"ventas_{SUFIJO_MES}", f"detalles_venta_{SUFIJO_MES}"),
+    ),
+    (
+        "poda: top vendidos de un mes",
+        CONSULTA_TOP_VENDIDOS,
+        RANGO_MES,
+        lambda particion: particion == f"detalles_venta_{SUFIJO_MES}",
+    ),
+    (
+        "poda: productos sin movimiento desde el mes actual",
+        CONSULTA_SIN_MOVIMIENTO,
+        {"desde": MES_ACTUAL.isoformat()},
+        # Los meses siguientes y DEFAULT pueden tener filas; los anteriores no
+        lambda particion: _mes_de(particion) is None or _mes_de(particion) >= SUFIJO_MES[1:],
+    ),
+]
+
+
+def faltantes_del_plan(esperados: set, usados: set) -> list:
+    """Índices esperados (o grupos de alternativas) que el plan no usa."""
+    return [
+        esperado for esperado in esperados
+        if not any(indice in usados for indice in (esperado if isinstance(esperado, tuple) else (esperado,)))
+    ]
+
+
+def _nombres(esperados) -> list:
+    return sorted(" o ".join(e) if isinstance(e, tuple) else e for e in esperados)
+
+
+def nodos_del_plan(nodo: dict, clave: str) -> set:
+    encontrados = set()
+    if clave in nodo:
+        encontrados.add(nodo[clave])
+    for hijo in nodo.get("Plans", []):
+        encontrados |= nodos_del_plan(hijo, clave)
+    return encontrados
+
+
+def con_indices_padre(conn, indices: set) -> set:
+    """Agrega a cada índice de partición los índices padres de los que se creó."""
+    if not indices:
+        return set()
+    return set(conn.execute(text("""
+        WITH RECURSIVE cadena AS (
+            SELECT c.oid, c.relname FROM pg_class c WHERE c.relname = ANY(:indices)
+            UNION
+            SELECT p.oid, p.relname
+            FROM cadena
+            JOIN pg_inherits i ON i.inhrelid = cadena.oid
+            JOIN pg_class p ON p.oid = i.inhparent
+        )
+        SELECT relname FROM cadena
+    """), {"indices": list(indices)}).scalars())
+
+
+def plan_de(conn, consulta: str, parametros: dict) -> dict:
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {consulta}"), parametros).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def main() -> int:
+    engine = create_engine(get_database_url())
+    fallas = 0
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for descripcion, consulta, parametros, esperados in CONSULTAS:
+                usados = con_indices_padre(conn, nodos_del_plan(plan_de(conn, consulta, parametros), "Index Name"))
+                faltantes = faltantes_del_plan(esperados, usados)
+                if faltantes:
+                    fallas += 1
+                    print(f"FALLA  {descripcion}: no usa {_nombres(faltantes)} (usa {sorted(usados) or 'ningún índice'})")
+                else:
+                    print(f"OK     {descripcion}: {_nombres(esperados)}")
+
+            for descripcion, consulta, parametros, permitida in PODA:
+                leidas = {
+                    nombre for nombre in nodos_del_plan(plan_de(conn, consulta, parametros), "Relation Name")
+                    if nombre.startswith(("ventas_", "detalles_venta_"))
+                }
+                sobrantes = {nombre for nombre in leidas if not permitida(nombre)}
+                if sobrantes or not leidas:
+                    fallas += 1
+                    print(f"FALLA  {descripcion}: lee particiones de más {sorted(sobrantes) or '(ninguna partición)'}")
+                else:
+                    print(f"OK     {descripcion}: {sorted(leidas)}")
+        finally:
+            trans.rollback()
+    total = len(CONSULTAS) + len(PODA)
+    print(f"\n{total - fallas}/{total} verificaciones de planes correctas.")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Esquema inicial (equivalente a los create_all de cada servicio)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+Todas las sentencias usan IF NOT EXISTS: en las bases ya desplegadas las
+tablas existen (las crearon los servicios al arrancar) y esta revisión solo
+las deja registradas como punto de partida.
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # --- inventario ---
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS productos (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR NOT NULL,
+            descripcion VARCHAR,
+            precio_venta FLOAT NOT NULL,
+            stock INTEGER
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_productos_nombre ON productos (nombre)")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS ordenes_compra (
+            id SERIAL PRIMARY KEY,
+            proveedor VARCHAR NOT NULL,
+            fecha_creacion TIMESTAMP WITHOUT TIME ZONE,
+            estado VARCHAR
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS detalles_orden_compra (
+            id SERIAL PRIMARY KEY,
+            orden_id INTEGER REFERENCES ordenes_compra (id),
+            producto_id INTEGER REFERENCES productos (id),
+            cantidad INTEGER,
+            precio_compra FLOAT
+        )
+    """)
+
+    # --- transacciones ---
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS ventas (
+            id SERIAL PRIMARY KEY,
+            fecha TIMESTAMP WITHOUT TIME ZONE,
+            total FLOAT NOT NULL,
+            vendedor_id VARCHAR NOT NULL
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS detalles_venta (
+            id SERIAL PRIMARY KEY,
+            venta_id INTEGER REFERENCES ventas (id),
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio_unitario FLOAT NOT NULL,
+            subtotal FLOAT NOT NULL
+        )
+    """)
+
+    # --- pacientes ---
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS pacientes (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR,
+            rut VARCHAR,
+            fecha_nacimiento VARCHAR
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_pacientes_nombre ON pacientes (nombre)")
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_pacientes_rut ON pacientes (rut)")
+    # 'dispensaciones' no tiene modelo en ningún servicio: se creó a mano en
+    # su momento. Aquí queda documentada con las columnas que usa pacientes.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS dispensaciones (
+            id SERIAL PRIMARY KEY,
+            paciente_id INTEGER NOT NULL REFERENCES pacientes (id),
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            nombre_producto VARCHAR NOT NULL,
+            fecha_dispensacion TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        )
+    """)
+
+    # --- usuarios ---
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'rolesusuario') THEN
+                CREATE TYPE rolesusuario AS ENUM
+                    ('beneficiario', 'cajero', 'vendedor', 'admin_inventario', 'admin_general');
+            END IF;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id VARCHAR PRIMARY KEY,
+            rol rolesusuario NOT NULL
+        )
+    """)
+
+
+def downgrade():
+    # El esquema inicial no se deshace: borraría todos los datos.
+    pass
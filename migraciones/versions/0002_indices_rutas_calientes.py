@@ -0,0 +1,45 @@
+"""Índices para los reportes y el historial de dispensaciones
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+- ventas (fecha): filtros por rango de fechas de informes.
+- detalles_venta (venta_id) y (producto_id, venta_id): joins de informes.
+- dispensaciones (paciente_id, producto_id, fecha_dispensacion DESC):
+  verificar_alertas_medicamento.
+- dispensaciones (paciente_id, fecha_dispensacion DESC):
+  obtener_dispensaciones_paciente (ordenado por fecha).
+- productos (stock): reporte de stock bajo. El umbral es un parámetro del
+  endpoint, así que un índice parcial con umbral fijo no serviría.
+
+Se crean con CONCURRENTLY para no bloquear escrituras en bases en producción;
+eso exige ejecutarlos fuera de la transacción de la migración.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDICES = [
+    ("ix_ventas_fecha", "ventas (fecha)"),
+    ("ix_detalles_venta_venta_id", "detalles_venta (venta_id)"),
+    ("ix_detalles_venta_producto_venta", "detalles_venta (producto_id, venta_id)"),
+    ("ix_dispensaciones_paciente_producto_fecha", "dispensaciones (paciente_id, producto_id, fecha_dispensacion DESC)"),
+    ("ix_dispensaciones_paciente_fecha", "dispensaciones (paciente_id, fecha_dispensacion DESC)"),
+    ("ix_productos_stock", "productos (stock)"),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nombre, definicion in INDICES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {definicion}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nombre, _ in reversed(INDICES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
@@ -0,0 +1,244 @@
+"""Particionado mensual de ventas y detalles_venta
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+Ambas tablas pasan a estar particionadas por RANGE sobre la fecha de la venta,
+una partición por mes (ventas_p2025_01, detalles_venta_p2025_01, ...) más una
+partición DEFAULT que recibe lo que no cae en ningún mes creado.
+
+- detalles_venta gana la columna 'fecha' (la misma de su venta): así los
+  reportes filtran ambas tablas por fecha y PostgreSQL descarta las
+  particiones fuera del rango en las dos.
+- La clave primaria pasa a ser (id, fecha) porque una PK sobre una tabla
+  particionada debe incluir la columna de partición; la FK del detalle
+  apunta a (id, fecha) de la venta. Los ids siguen saliendo de las mismas
+  secuencias, así que no cambian.
+- crear_particion_ventas(mes) crea el mes en ambas tablas (moviendo las filas
+  que hubieran caído en DEFAULT) y crear_particiones_ventas(meses_adelante)
+  asegura el mes actual y los siguientes. La llama periódicamente el
+  mantenimiento de informes (mantenimiento_ventas.py), que además archiva a
+  Parquet los meses más antiguos que la retención.
+
+- Los detalles sin venta (venta_id NULL o de una venta inexistente) no
+  tienen fecha: se copian a detalles_venta_huerfanos y la migración avisa
+  cuántos son. Si no hay ninguno la tabla no se crea.
+
+La copia de los datos ocurre dentro de la transacción de la migración y
+bloquea las tablas mientras dura; los servicios esperan a que las
+migraciones terminen antes de arrancar.
+"""
+import logging
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# Meses hacia adelante que se dejan creados (además del actual)
+MESES_ADELANTE = 3
+
+FUNCIONES = """
+CREATE OR REPLACE FUNCTION crear_particion_ventas(mes date) RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    desde date := date_trunc('month', mes)::date;
+    hasta date := (date_trunc('month', mes) + interval '1 month')::date;
+    sufijo text := to_char(date_trunc('month', mes), '"p"YYYY_MM');
+BEGIN
+    IF to_regclass('ventas_' || sufijo) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    -- PostgreSQL no deja crear una partición si la DEFAULT ya tiene filas de
+    -- ese rango: se sacan, se crea el mes y se vuelven a insertar. Primero
+    -- los detalles, por la FK hacia ventas.
+    CREATE TEMP TABLE _mover_detalles (LIKE detalles_venta) ON COMMIT DROP;
+    CREATE TEMP TABLE _mover_ventas (LIKE ventas) ON COMMIT DROP;
+    WITH movidas AS (
+        DELETE FROM detalles_venta_default WHERE fecha >= desde AND fecha < hasta RETURNING *
+    ) INSERT INTO _mover_detalles SELECT * FROM movidas;
+    WITH movidas AS (
+        DELETE FROM ventas_default WHERE fecha >= desde AND fecha < hasta RETURNING *
+    ) INSERT INTO _mover_ventas SELECT * FROM movidas;
+
+    EXECUTE format('CREATE TABLE %I PARTITION OF ventas FOR VALUES FROM (%L) TO (%L)',
+                   'ventas_' || sufijo, desde, hasta);
+    EXECUTE format('CREATE TABLE %I PARTITION OF detalles_venta FOR VALUES FROM (%L) TO (%L)',
+                   'detalles_venta_' || sufijo, desde, hasta);
+
+    INSERT INTO ventas SELECT * FROM _mover_ventas;
+    INSERT INTO detalles_venta SELECT * FROM _mover_detalles;
+    DROP TABLE _mover_detalles;
+    DROP TABLE _mover_ventas;
+    RETURN true;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION crear_particiones_ventas(meses_adelante integer DEFAULT 3) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    creadas integer := 0;
+    i integer;
+BEGIN
+    FOR i IN 0..meses_adelante LOOP
+        IF crear_particion_ventas((date_trunc('month', now() AT TIME ZONE 'utc') + make_interval(months => i))::date) THEN
+            creadas := creadas + 1;
+        END IF;
+    END LOOP;
+    RETURN creadas;
+END
+$$;
+"""
+
+
+def upgrade():
+    # Las tablas actuales quedan con otro nombre hasta copiar los datos. Sus
+    # índices se renombran o eliminan para liberar los nombres.
+    op.execute("ALTER TABLE detalles_venta RENAME TO detalles_venta_sin_particionar")
+    op.execute("ALTER TABLE ventas RENAME TO ventas_sin_particionar")
+    op.execute("ALTER INDEX IF EXISTS detalles_venta_pkey RENAME TO detalles_venta_sin_particionar_pkey")
+    op.execute("ALTER INDEX IF EXISTS ventas_pkey RENAME TO ventas_sin_particionar_pkey")
+    for indice in ("ix_ventas_id", "ix_ventas_fecha", "ix_detalles_venta_id",
+                   "ix_detalles_venta_venta_id", "ix_detalles_venta_producto_venta"):
+        op.execute(f"DROP INDEX IF EXISTS {indice}")
+
+    op.execute("""
+        CREATE TABLE ventas (
+            id INTEGER NOT NULL DEFAULT nextval('ventas_id_seq'),
+            fecha TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            total FLOAT NOT NULL,
+            vendedor_id VARCHAR NOT NULL,
+            PRIMARY KEY (id, fecha)
+        ) PARTITION BY RANGE (fecha)
+    """)
+    op.execute("""
+        CREATE TABLE detalles_venta (
+            id INTEGER NOT NULL DEFAULT nextval('detalles_venta_id_seq'),
+            venta_id INTEGER NOT NULL,
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio_unitario FLOAT NOT NULL,
+            subtotal FLOAT NOT NULL,
+            fecha TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, fecha),
+            FOREIGN KEY (venta_id, fecha) REFERENCES ventas (id, fecha)
+        ) PARTITION BY RANGE (fecha)
+    """)
+    op.execute("ALTER SEQUENCE ventas_id_seq OWNED BY ventas.id")
+    op.execute("ALTER SEQUENCE detalles_venta_id_seq OWNED BY detalles_venta.id")
+    op.execute("CREATE TABLE ventas_default PARTITION OF ventas DEFAULT")
+    op.execute("CREATE TABLE detalles_venta_default PARTITION OF detalles_venta DEFAULT")
+
+    # Los índices sobre la tabla padre se crean en cada partición (y en las
+    # que se creen después). CONCURRENTLY no aplica a tablas particionadas.
+    op.execute("CREATE INDEX ix_ventas_fecha ON ventas (fecha)")
+    op.execute("CREATE INDEX ix_detalles_venta_fecha ON detalles_venta (fecha)")
+    op.execute("CREATE INDEX ix_detalles_venta_venta_id ON detalles_venta (venta_id)")
+    op.execute("CREATE INDEX ix_detalles_venta_producto_venta ON detalles_venta (producto_id, venta_id)")
+
+    op.execute(FUNCIONES)
+
+    # Un mes por cada mes con ventas, hasta MESES_ADELANTE después del actual
+    op.execute(f"""
+        SELECT crear_particion_ventas(mes::date)
+        FROM generate_series(
+            date_trunc('month', COALESCE((SELECT MIN(fecha) FROM ventas_sin_particionar), now() AT TIME ZONE 'utc')),
+            date_trunc('month', now() AT TIME ZONE 'utc') + interval '{MESES_ADELANTE} months',
+            interval '1 month'
+        ) AS mes
+    """)
+
+    # Las ventas sin fecha (no debería haber: el modelo la pone siempre)
+    # quedan con la fecha de la migración para no perderlas.
+    op.execute("""
+        INSERT INTO ventas (id, fecha, total, vendedor_id)
+        SELECT id, COALESCE(fecha, now() AT TIME ZONE 'utc'), total, vendedor_id
+        FROM ventas_sin_particionar
+    """)
+    # Un detalle sin venta (venta_id NULL o de una venta que no existe) no
+    # tiene fecha con la que particionarlo: en vez de perderlo al borrar la
+    # tabla vieja se aparta en detalles_venta_huerfanos para revisarlo a mano.
+    # La tabla puede existir de una migración anterior deshecha: se agrega.
+    op.execute("CREATE TABLE IF NOT EXISTS detalles_venta_huerfanos (LIKE detalles_venta_sin_particionar)")
+    huerfanos = op.get_bind().execute(sa.text("""
+        WITH apartados AS (
+            INSERT INTO detalles_venta_huerfanos
+            SELECT d.* FROM detalles_venta_sin_particionar d
+            WHERE NOT EXISTS (SELECT 1 FROM ventas v WHERE v.id = d.venta_id)
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM apartados
+    """)).scalar()
+    if huerfanos:
+        logger.warning(f"{huerfanos} detalle(s) de venta sin venta apartados en detalles_venta_huerfanos.")
+    op.execute("""
+        DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM detalles_venta_huerfanos) THEN
+                DROP TABLE detalles_venta_huerfanos;
+            END IF;
+        END $$
+    """)
+    op.execute("""
+        INSERT INTO detalles_venta (id, venta_id, producto_id, cantidad, precio_unitario, subtotal, fecha)
+        SELECT d.id, d.venta_id, d.producto_id, d.cantidad, d.precio_unitario, d.subtotal, v.fecha
+        FROM detalles_venta_sin_particionar d
+        JOIN ventas v ON v.id = d.venta_id
+    """)
+    op.execute("DROP TABLE detalles_venta_sin_particionar")
+    op.execute("DROP TABLE ventas_sin_particionar")
+    op.execute("ANALYZE ventas")
+    op.execute("ANALYZE detalles_venta")
+
+
+def downgrade():
+    # Vuelve a las tablas sin particionar con los datos que sigan en la base.
+    # Los meses ya archivados a Parquet no se reincorporan, y los detalles
+    # apartados en detalles_venta_huerfanos (si los hubo) quedan ahí.
+    op.execute("ALTER TABLE detalles_venta RENAME TO detalles_venta_particionada")
+    op.execute("ALTER TABLE ventas RENAME TO ventas_particionada")
+    op.execute("ALTER INDEX IF EXISTS detalles_venta_pkey RENAME TO detalles_venta_particionada_pkey")
+    op.execute("ALTER INDEX IF EXISTS ventas_pkey RENAME TO ventas_particionada_pkey")
+    for indice in ("ix_ventas_fecha", "ix_detalles_venta_fecha", "ix_detalles_venta_venta_id",
+                   "ix_detalles_venta_producto_venta"):
+        op.execute(f"DROP INDEX IF EXISTS {indice}")
+
+    op.execute("""
+        CREATE TABLE ventas (
+            id INTEGER PRIMARY KEY DEFAULT nextval('ventas_id_seq'),
+            fecha TIMESTAMP WITHOUT TIME ZONE,
+            total FLOAT NOT NULL,
+            vendedor_id VARCHAR NOT NULL
+        )
+    """)
+    op.execute("""
+        CREATE TABLE detalles_venta (
+            id INTEGER PRIMARY KEY DEFAULT nextval('detalles_venta_id_seq'),
+            venta_id INTEGER REFERENCES ventas (id),
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio_unitario FLOAT NOT NULL,
+            subtotal FLOAT NOT NULL
+        )
+    """)
+    op.execute("INSERT INTO ventas (id, fecha, total, vendedor_id) SELECT id, fecha, total, vendedor_id FROM ventas_particionada")
+    op.execute("""
+        INSERT INTO detalles_venta (id, venta_id, producto_id, cantidad, precio_unitario, subtotal)
+        SELECT id, venta_id, producto_id, cantidad, precio_unitario, subtotal FROM detalles_venta_particionada
+    """)
+    op.execute("ALTER SEQUENCE ventas_id_seq OWNED BY ventas.id")
+    op.execute("ALTER SEQUENCE detalles_venta_id_seq OWNED BY detalles_venta.id")
+    op.execute("DROP TABLE detalles_venta_particionada")
+    op.execute("DROP TABLE ventas_particionada")
+    op.execute("DROP FUNCTION IF EXISTS crear_particiones_ventas(integer)")
+    op.execute("DROP FUNCTION IF EXISTS crear_particion_ventas(date)")
+
+    op.execute("CREATE INDEX ix_ventas_fecha ON ventas (fecha)")
+    op.execute("CREATE INDEX ix_detalles_venta_venta_id ON detalles_venta (venta_id)")
+    op.execute("CREATE INDEX ix_detalles_venta_producto_venta ON detalles_venta (producto_id, venta_id)")
@@ -0,0 +1,36 @@
+"""Índice para el historial paginado de dispensaciones
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+El historial se pagina por cursor sobre (fecha_dispensacion, id) en orden
+descendente. El índice (paciente_id, fecha_dispensacion, id) se recorre hacia
+atrás y resuelve tanto el orden como la condición del cursor
+'(fecha_dispensacion, id) < (...)'. Reemplaza a
+ix_dispensaciones_paciente_fecha, que no incluía el id de desempate.
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_dispensaciones_paciente_fecha_id "
+            "ON dispensaciones (paciente_id, fecha_dispensacion, id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_dispensaciones_paciente_fecha")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_dispensaciones_paciente_fecha "
+            "ON dispensaciones (paciente_id, fecha_dispensacion DESC)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_dispensaciones_paciente_fecha_id")
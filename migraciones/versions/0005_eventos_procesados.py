@@ -0,0 +1,36 @@
+"""Registro de eventos ya aplicados al stock
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+El consumidor de inventario descuenta stock a partir de las ventas
+('topic_ventas') y de las dispensaciones ('topic_dispensaciones'). Kafka
+entrega cada mensaje AL MENOS una vez, así que cada evento aplicado se
+registra aquí en la misma transacción que el UPDATE del stock: un evento
+repetido choca con la clave primaria y no se vuelve a descontar.
+
+- tipo: 'venta' o 'dispensacion'
+- referencia_id: id de la venta o de la fila de dispensaciones
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS eventos_procesados (
+            tipo VARCHAR NOT NULL,
+            referencia_id INTEGER NOT NULL,
+            procesado_en TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            PRIMARY KEY (tipo, referencia_id)
+        )
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS eventos_procesados")
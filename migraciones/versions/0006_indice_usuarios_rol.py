@@ -0,0 +1,27 @@
+"""Índice para el listado paginado de usuarios por rol
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+El listado de usuarios se pagina por cursor sobre el id, opcionalmente
+filtrado por rol: 'WHERE rol = :rol AND id > :cursor ORDER BY id'. El índice
+(rol, id) resuelve el filtro, el orden y el cursor, y el conteo por rol
+(GROUP BY rol) se responde con un recorrido solo del índice.
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usuarios_rol_id ON usuarios (rol, id)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_usuarios_rol_id")
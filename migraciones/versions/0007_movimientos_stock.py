@@ -0,0 +1,84 @@
+"""Libro de movimientos de stock con stock plegado por producto
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+
+Las ventas, dispensaciones, compras recibidas y ajustes dejan de actualizar
+productos.stock: cada uno inserta una fila en movimientos_stock (cantidad con
+signo), así que escrituras concurrentes sobre el mismo producto no compiten
+por el bloqueo de su fila y queda el historial completo.
+
+- productos.stock pasa a ser el stock PLEGADO: la suma de los movimientos ya
+  marcados con plegado = true. El plegado (inventario/app/plegado_stock.py)
+  marca periódicamente los movimientos pendientes y los suma a
+  productos.stock en la misma transacción.
+- El stock actual es productos.stock más los movimientos pendientes del
+  producto; la vista stock_actual lo calcula. El índice parcial de
+  pendientes (con la cantidad incluida) lo resuelve con pocas filas por
+  producto.
+- Cada producto existente recibe un movimiento 'inicial' ya plegado con su
+  stock actual, para que la suma del libro coincida con el stock.
+- ix_productos_stock se elimina: el reporte de stock bajo filtra por el stock
+  actual (vista), no por el plegado, y el índice solo encarecía el plegado.
+
+- tipo: 'inicial', 'venta', 'dispensacion', 'compra' o 'ajuste'
+- referencia_id: id de la venta, de la fila de dispensaciones, de la orden
+  de compra o del producto ('inicial'); NULL en los ajustes manuales
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS movimientos_stock (
+            id BIGSERIAL PRIMARY KEY,
+            producto_id INTEGER NOT NULL,
+            tipo VARCHAR NOT NULL,
+            referencia_id INTEGER,
+            cantidad INTEGER NOT NULL,
+            creado_en TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            plegado BOOLEAN NOT NULL DEFAULT false
+        )
+    """)
+    # Historial de un producto (más recientes primero)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_movimientos_stock_producto_id ON movimientos_stock (producto_id, id)")
+    # Movimientos aún no sumados a productos.stock
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_movimientos_stock_pendientes
+        ON movimientos_stock (producto_id) INCLUDE (cantidad) WHERE NOT plegado
+    """)
+    op.execute("""
+        INSERT INTO movimientos_stock (producto_id, tipo, referencia_id, cantidad, plegado)
+        SELECT id, 'inicial', id, stock, true FROM productos WHERE COALESCE(stock, 0) <> 0
+    """)
+    op.execute("UPDATE productos SET stock = 0 WHERE stock IS NULL")
+    op.execute("""
+        CREATE OR REPLACE VIEW stock_actual AS
+        SELECT p.id AS producto_id, p.nombre, p.stock + COALESCE((
+            SELECT SUM(m.cantidad) FROM movimientos_stock m
+            WHERE m.producto_id = p.id AND NOT m.plegado
+        ), 0)::integer AS stock
+        FROM productos p
+    """)
+    op.execute("DROP INDEX IF EXISTS ix_productos_stock")
+
+
+def downgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS ix_productos_stock ON productos (stock)")
+    op.execute("DROP VIEW IF EXISTS stock_actual")
+    # Lo pendiente vuelve a productos.stock antes de borrar el libro
+    op.execute("""
+        UPDATE productos p SET stock = p.stock + t.cantidad
+        FROM (
+            SELECT producto_id, SUM(cantidad) AS cantidad FROM movimientos_stock
+            WHERE NOT plegado GROUP BY producto_id
+        ) AS t
+        WHERE p.id = t.producto_id
+    """)
+    op.execute("DROP TABLE IF EXISTS movimientos_stock")
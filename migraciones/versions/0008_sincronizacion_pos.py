@@ -0,0 +1,110 @@
+"""Versión de cambios del catálogo y ventas idempotentes para el POS sin conexión
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+
+El punto de venta guarda el catálogo en el navegador y lo actualiza con
+GET /api/inventario/cambios?desde=N, que devuelve solo lo que cambió desde la
+versión N. Las ventas hechas sin conexión quedan en una cola local y se
+envían en lotes a POST /api/transacciones/ventas/lote.
+
+- La versión de un cambio es el id de la transacción que lo escribió
+  (pg_current_xact_id(), 64 bits, no se repite). Se usa el id de
+  transacción y no una secuencia porque permite saber hasta dónde es seguro
+  leer: todo lo escrito por transacciones anteriores a
+  pg_snapshot_xmin(pg_current_snapshot()) ya terminó. Con una secuencia, una
+  transacción lenta podría confirmar un número menor al que un cliente ya
+  leyó, y ese cambio se perdería.
+- productos.version: al insertar (DEFAULT) y al cambiar nombre, descripción
+  o precio (trigger). El plegado del stock no la cambia.
+- movimientos_stock.version: al insertar. El stock cambia con los
+  movimientos, no con la fila del producto.
+- productos_eliminados: lápidas de los productos borrados (trigger), para
+  que los clientes los quiten de su caché.
+- ventas.id_cliente: UUID que genera la caja para cada venta. Junto con la
+  fecha (también de la caja) es único: reenviar un lote no duplica ventas.
+  La fecha tiene que estar en el índice porque ventas está particionada por
+  ella.
+
+Las filas existentes quedan con la versión de la transacción de esta
+migración; un cliente nuevo parte de desde=0 (catálogo completo).
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+VERSION_ACTUAL = "(pg_current_xact_id()::text::bigint)"
+
+
+def upgrade():
+    op.execute(f"ALTER TABLE productos ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT {VERSION_ACTUAL}")
+    op.execute(f"ALTER TABLE movimientos_stock ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT {VERSION_ACTUAL}")
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS productos_eliminados (
+            producto_id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT {VERSION_ACTUAL}
+        )
+    """)
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION marcar_version_producto() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.version := {VERSION_ACTUAL};
+            RETURN NEW;
+        END $$
+    """)
+    op.execute("""
+        CREATE TRIGGER productos_version
+        BEFORE UPDATE ON productos
+        FOR EACH ROW
+        WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre
+              OR OLD.descripcion IS DISTINCT FROM NEW.descripcion
+              OR OLD.precio_venta IS DISTINCT FROM NEW.precio_venta)
+        EXECUTE FUNCTION marcar_version_producto()
+    """)
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION registrar_producto_eliminado() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO productos_eliminados (producto_id) VALUES (OLD.id)
+            ON CONFLICT (producto_id) DO UPDATE SET version = {VERSION_ACTUAL};
+            RETURN OLD;
+        END $$
+    """)
+    op.execute("""
+        CREATE TRIGGER productos_eliminados
+        AFTER DELETE ON productos
+        FOR EACH ROW EXECUTE FUNCTION registrar_producto_eliminado()
+    """)
+
+    op.execute("ALTER TABLE ventas ADD COLUMN IF NOT EXISTS id_cliente UUID")
+    # En la tabla particionada (se propaga a cada partición); CONCURRENTLY no aplica
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_ventas_id_cliente ON ventas (id_cliente, fecha)")
+
+    # movimientos_stock puede ser grande: sin bloquear las escrituras
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_productos_version ON productos (version)")
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_movimientos_stock_version
+            ON movimientos_stock (version) INCLUDE (producto_id)
+        """)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_movimientos_stock_version")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_productos_version")
+    op.execute("DROP INDEX IF EXISTS ux_ventas_id_cliente")
+    op.execute("ALTER TABLE ventas DROP COLUMN IF EXISTS id_cliente")
+    op.execute("DROP TRIGGER IF EXISTS productos_eliminados ON productos")
+    op.execute("DROP FUNCTION IF EXISTS registrar_producto_eliminado()")
+    op.execute("DROP TRIGGER IF EXISTS productos_version ON productos")
+    op.execute("DROP FUNCTION IF EXISTS marcar_version_producto()")
+    op.execute("DROP TABLE IF EXISTS productos_eliminados")
+    op.execute("ALTER TABLE movimientos_stock DROP COLUMN IF EXISTS version")
+    op.execute("ALTER TABLE productos DROP COLUMN IF EXISTS version")
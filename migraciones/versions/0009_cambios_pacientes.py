@@ -0,0 +1,72 @@
+"""Versión de cambios de pacientes (GET /api/pacientes/cambios)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+
+Mismo esquema que productos en 0008: la versión de una fila es el id de la
+transacción que la escribió y los borrados dejan una lápida, así un cliente
+pide solo lo que cambió desde la última versión que vio.
+
+- pacientes.version: al insertar (DEFAULT) y en cada UPDATE que cambie algún
+  dato (trigger).
+- pacientes_eliminados: lápidas de los pacientes borrados (trigger).
+- La función del trigger de versión deja de ser solo de productos: se
+  renombra a marcar_version() y la usan las dos tablas (el trigger de
+  productos la referencia por OID, no cambia).
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+VERSION_ACTUAL = "(pg_current_xact_id()::text::bigint)"
+
+
+def upgrade():
+    op.execute("ALTER FUNCTION marcar_version_producto() RENAME TO marcar_version")
+
+    op.execute(f"ALTER TABLE pacientes ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT {VERSION_ACTUAL}")
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS pacientes_eliminados (
+            paciente_id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT {VERSION_ACTUAL}
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER pacientes_version
+        BEFORE UPDATE ON pacientes
+        FOR EACH ROW
+        WHEN ((OLD.nombre, OLD.rut, OLD.fecha_nacimiento) IS DISTINCT FROM (NEW.nombre, NEW.rut, NEW.fecha_nacimiento))
+        EXECUTE FUNCTION marcar_version()
+    """)
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION registrar_paciente_eliminado() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO pacientes_eliminados (paciente_id) VALUES (OLD.id)
+            ON CONFLICT (paciente_id) DO UPDATE SET version = {VERSION_ACTUAL};
+            RETURN OLD;
+        END $$
+    """)
+    op.execute("""
+        CREATE TRIGGER pacientes_eliminados
+        AFTER DELETE ON pacientes
+        FOR EACH ROW EXECUTE FUNCTION registrar_paciente_eliminado()
+    """)
+
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pacientes_version ON pacientes (version)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_pacientes_version")
+    op.execute("DROP TRIGGER IF EXISTS pacientes_eliminados ON pacientes")
+    op.execute("DROP FUNCTION IF EXISTS registrar_paciente_eliminado()")
+    op.execute("DROP TRIGGER IF EXISTS pacientes_version ON pacientes")
+    op.execute("DROP TABLE IF EXISTS pacientes_eliminados")
+    op.execute("ALTER TABLE pacientes DROP COLUMN IF EXISTS version")
+    op.execute("ALTER FUNCTION marcar_version() RENAME TO marcar_version_producto")
@@ -0,0 +1,30 @@
+"""Índice para podar eventos_procesados
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+
+eventos_procesados (0005) suma una fila por venta y por dispensación y nunca
+se vaciaba. plegado_stock.py borra ahora las filas con procesado_en más
+antiguo que EVENTOS_PROCESADOS_RETENCION_DIAS; este índice evita que cada
+pasada recorra toda la tabla para encontrarlas.
+"""
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_procesados_procesado_en
+            ON eventos_procesados (procesado_en)
+        """)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_eventos_procesados_procesado_en")
@@ -0,0 +1,181 @@
+# pacientes/app/cache_dispensaciones.py
+#
+# Caché por paciente de sus dispensaciones recientes (últimos
+# DISPENSACIONES_CACHE_DIAS días), para responder las alertas de
+# medicamentos sin consultar la base en cada clic. Un paciente se carga con
+# una sola consulta la primera vez que se revisa y queda en un LRU acotado a
+# DISPENSACIONES_CACHE_PACIENTES pacientes.
+#
+# El caché vive en la memoria de cada worker, pero las dispensaciones se
+# registran en cualquiera. Cada worker escucha 'topic_dispensaciones' y
+# 'pacientes-events' (sin group_id, desde el final, como la caché de roles):
+# DISPENSACION_REGISTRADA agrega las filas a la entrada del paciente y
+# PACIENTE_ELIMINADO la descarta. Una alerta servida desde el caché no toca
+# la base.
+#
+# Mientras el hilo no está conectado a Kafka (al arrancar o si se cae) no se
+# sabría de las dispensaciones de otros workers: las alertas se consultan
+# directo en la base y al reconectar el caché se vacía. Queda el desfase
+# entre el COMMIT en un worker y la llegada del evento a los demás
+# (KAFKA_LINGER_MS más la entrega), y los eventos que el publicador descarte
+# (comun/kafka.py es de mejor esfuerzo): DISPENSACIONES_CACHE_TTL_SEGUNDOS
+# acota cuánto dura una entrada desactualizada en ese caso.
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from comun.kafka import KAFKA_BOOTSTRAP_SERVERS
+
+logger = logging.getLogger(__name__)
+
+DISPENSACIONES_CACHE_DIAS = int(os.getenv("DISPENSACIONES_CACHE_DIAS", "90"))
+DISPENSACIONES_CACHE_PACIENTES = int(os.getenv("DISPENSACIONES_CACHE_PACIENTES", "2000"))
+DISPENSACIONES_CACHE_TTL_SEGUNDOS = float(os.getenv("DISPENSACIONES_CACHE_TTL_SEGUNDOS", "300"))
+TOPICS_CAMBIOS = ("topic_dispensaciones", "pacientes-events")
+
+
+class CacheDispensaciones:
+    def __init__(self, dias: int, max_pacientes: int, ttl_segundos: float):
+        self.dias = dias
+        self.max_pacientes = max_pacientes
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        # paciente_id -> {"cargado": instante, "retiros": [(id, producto_id, fecha), ...]}
+        self._entradas = OrderedDict()
+        # Aumenta con cada escritura; una carga que se cruzó con una escritura
+        # no se guarda (podría no incluirla).
+        self._cambios = 0
+        # True mientras el hilo de escucha recibe los eventos de Kafka
+        self._conectado = False
+        self._escuchando = False
+
+    def cubre(self, dias: int) -> bool:
+        return dias <= self.dias
+
+    def obtener(self, paciente_id: int, cargar) -> list:
+        """
+        Devuelve las dispensaciones recientes del paciente. Si no está en el
+        caché, expiró o no se están escuchando los cambios de otros workers,
+        se llama a cargar(desde), que debe devolver las filas (id,
+        producto_id, fecha_dispensacion) con fecha >= desde.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(paciente_id)
+            if (self._conectado and entrada is not None
+                    and ahora - entrada["cargado"] < self.ttl_segundos):
+                self._entradas.move_to_end(paciente_id)
+                return list(entrada["retiros"])
+            cambios = self._cambios
+
+        # La consulta se hace fuera del lock para no frenar a otros pacientes
+        retiros = [tuple(r) for r in cargar(datetime.utcnow() - timedelta(days=self.dias))]
+
+        with self._lock:
+            # Sin conexión a Kafka no se guarda: la entrada no se enteraría
+            # de lo que registren otros workers
+            if self._conectado and cambios == self._cambios:
+                self._entradas[paciente_id] = {"cargado": ahora, "retiros": retiros}
+                self._entradas.move_to_end(paciente_id)
+                while len(self._entradas) > self.max_pacientes:
+                    self._entradas.popitem(last=False)
+        return list(retiros)
+
+    def registrar(self, paciente_id: int, id_dispensacion: int, producto_id: int, fecha: datetime):
+        """
+        Agrega una dispensación a la entrada del paciente (si está cargado).
+        La llaman el worker que la registró y el evento de Kafka: la segunda
+        vez no se repite.
+        """
+        with self._lock:
+            self._cambios += 1
+            entrada = self._entradas.get(paciente_id)
+            if entrada is not None and all(r[0] != id_dispensacion for r in entrada["retiros"]):
+                entrada["retiros"].append((id_dispensacion, producto_id, fecha))
+
+    def invalidar(self, paciente_id: int):
+        with self._lock:
+            self._cambios += 1
+            self._entradas.pop(paciente_id, None)
+
+    # --- CAMBIOS DE OTROS WORKERS ---
+
+    def procesar_evento(self, evento: dict):
+        accion = evento.get("accion")
+        if accion == "DISPENSACION_REGISTRADA":
+            for d in evento["dispensaciones"]:
+                self.registrar(evento["paciente_id"], d["dispensacion_id"], d["producto_id"],
+                               datetime.fromisoformat(d["fecha"]))
+        elif accion == "PACIENTE_ELIMINADO":
+            self.invalidar(evento["paciente"]["id"])
+
+    def _conexion(self, conectado: bool):
+        # Al conectarse o desconectarse se descarta todo: pudo perderse algún evento
+        with self._lock:
+            self._cambios += 1
+            self._conectado = conectado
+            self._entradas.clear()
+
+    def escuchar_cambios(self, bootstrap_servers: str = KAFKA_BOOTSTRAP_SERVERS):
+        """Inicia (una sola vez por proceso) el hilo que aplica los eventos de TOPICS_CAMBIOS."""
+        with self._lock:
+            if self._escuchando:
+                return
+            self._escuchando = True
+        hilo = threading.Thread(target=self._consumir, args=(bootstrap_servers,), daemon=True)
+        hilo.start()
+
+    def _consumir(self, bootstrap_servers: str):
+        from kafka import KafkaConsumer, TopicPartition
+
+        while True:
+            consumer = None
+            try:
+                consumer = KafkaConsumer(
+                    bootstrap_servers=bootstrap_servers,
+                    value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+                    group_id=None,
+                )
+                particiones = [
+                    TopicPartition(topic, particion)
+                    for topic in TOPICS_CAMBIOS
+                    for particion in consumer.partitions_for_topic(topic) or []
+                ]
+                if not particiones:
+                    raise RuntimeError(f"los topics {TOPICS_CAMBIOS} todavía no existen")
+                # Las posiciones se fijan antes de usar el caché: un evento
+                # posterior a este punto no se pierde
+                consumer.assign(particiones)
+                consumer.seek_to_end()
+                for tp in particiones:
+                    consumer.position(tp)
+                self._conexion(True)
+                logger.info(f"Caché de dispensaciones escuchando {TOPICS_CAMBIOS}.")
+                for message in consumer:
+                    try:
+                        self.procesar_evento(message.value)
+                    except (KeyError, TypeError, ValueError) as e:
+                        logger.warning(f"Evento de {message.topic} con formato inválido, se vacía el caché: {e}")
+                        self._conexion(True)
+            except Exception as e:
+                logger.error(f"Escucha de dispensaciones detenida, las alertas van a la base: {e}")
+            self._conexion(False)
+            if consumer is not None:
+                consumer.close()
+            time.sleep(5)
+
+
+def retiros_del_producto(retiros: list, producto_id: int, dias: int) -> list:
+    fecha_limite = datetime.utcnow() - timedelta(days=dias)
+    return [(id_disp, fecha) for id_disp, id_producto, fecha in retiros
+            if id_producto == producto_id and fecha >= fecha_limite]
+
+
+cache_dispensaciones = CacheDispensaciones(
+    DISPENSACIONES_CACHE_DIAS, DISPENSACIONES_CACHE_PACIENTES, DISPENSACIONES_CACHE_TTL_SEGUNDOS
+)
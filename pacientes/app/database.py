@@ -1,20 +1,11 @@
-import psycopg2
-import os
-from sqlalchemy import create_engine
+# pacientes/app/database.py
+from comun.db import crear_engine
 
-SQLALCHEMY_DATABASE_URL = (
-    f"postgresql://{os.getenv('POSTGRES_USER', 'admin')}:"
-    f"{os.getenv('POSTGRES_PASSWORD', 'admin')}@"
-    f"{os.getenv('POSTGRES_HOST', 'postgres')}/"
-    f"{os.getenv('POSTGRES_DB', 'farmacia')}"
-)
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Engine con pool compartido (comun/db.py). Lee DATABASE_URL o POSTGRES_*.
+engine = crear_engine(nombre_aplicacion="pacientes")
 
 def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST", "postgres"),
-        database=os.getenv("POSTGRES_DB", "farmacia"),
-        user=os.getenv("POSTGRES_USER", "admin"),
-        password=os.getenv("POSTGRES_PASSWORD", "admin")
-    )
-
+    # Conexión psycopg2 tomada del pool del engine: las rutas la usan igual
+    # que antes (cursor, commit) y close() la devuelve al pool en vez de
+    # cerrar la conexión con PostgreSQL.
+    return engine.raw_connection()
@@ -1,15 +1,31 @@
 # pacientes/app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routes.pacientes import router as pacientes_router
 from fastapi.middleware.cors import CORSMiddleware
 import os # Asegúrate de que esto esté importado si usas os.getenv
 from app.database import engine # <-- ¡IMPORTA EL MOTOR DE LA BASE DE DATOS!
-from app.models import Base # <-- ¡IMPORTA LA BASE DE DECLARACIÓN DE MODELOS!
+from app.kafka_producer import publicador
+from app.cache_dispensaciones import cache_dispensaciones
+from comun.db import calentar_pool
+from comun.metricas import instalar_metricas
+from comun.respuestas import instalar_compresion
+from comun.salud import instalar_salud
 
-app = FastAPI(title="Microservicio de Pacientes")
+# El esquema lo crean las migraciones (servicio migraciones), no el arranque.
+# Postgres y Kafka se conectan en segundo plano: el worker atiende en cuanto
+# arranca y /listo indica cuándo la base responde.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    calentar_pool(engine)
+    publicador.iniciar()
+    # Las dispensaciones que registren otros workers llegan por Kafka
+    cache_dispensaciones.escuchar_cambios()
+    yield
+    # Envía los eventos que sigan en la cola antes de terminar
+    publicador.cerrar()
 
-# --- ¡NUEVA LÍNEA CLAVE! Crea las tablas en la base de datos ---
-Base.metadata.create_all(bind=engine)
+app = FastAPI(title="Microservicio de Pacientes", lifespan=lifespan)
 
 # Configuración CORS
 allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000")
@@ -23,4 +39,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(pacientes_router, prefix="/api/pacientes")
\ No newline at end of file
+# Métricas de Prometheus (/metrics), chequeos de salud (/salud, /listo) y
+# compresión brotli/gzip de las respuestas grandes
+instalar_metricas(app)
+instalar_compresion(app)
+instalar_salud(app, engine=engine, publicador=publicador)
+
+app.include_router(pacientes_router, prefix="/api/pacientes")
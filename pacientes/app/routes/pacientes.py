@@ -1,13 +1,19 @@
 # pacientes/app/routes/pacientes.py (Versión Final y Correcta)
 
-from fastapi import APIRouter, HTTPException, Response, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Response, Depends, Query
+from typing import List, Optional
 from app.models import Paciente, PacienteCreate
-from app.database import get_connection
+from app.database import engine, get_connection
 from app.kafka_producer import enviar_evento
 from app.security import validate_token
-from datetime import datetime, timedelta
+from app.cache_dispensaciones import cache_dispensaciones, retiros_del_producto
+from comun.cambios import leer_cambios
+from comun.respuestas import RespuestaJSON, filas_como_dicts
+from datetime import date, datetime, timedelta
 from pydantic import BaseModel
+from sqlalchemy import text
+import base64
+import json
 
 router = APIRouter()
 
@@ -18,11 +24,30 @@ class Dispensacion(BaseModel):
     producto_id: int
     cantidad: int
     fecha_dispensacion: datetime
+    nombre_producto: Optional[str] = None
+
+class PaginaDispensaciones(BaseModel):
+    items: List[Dispensacion]
+    siguiente_cursor: Optional[str] = None
+
+class HistorialPaciente(BaseModel):
+    paciente: Paciente
+    dispensaciones: PaginaDispensaciones
 
 class DispensacionCreate(BaseModel):
     producto_id: int
     cantidad: int
 
+class SolicitudAlertas(BaseModel):
+    producto_ids: List[int]
+    dias: int = 30
+
+class CambiosPacientes(BaseModel):
+    version: int
+    completo: bool
+    pacientes: List[Paciente]
+    eliminados: List[int]
+
 # --- TUS RUTAS CRUD DE PACIENTES (RESTAURADAS) ---
 
 @router.post("/", response_model=Paciente, status_code=201)
@@ -45,6 +70,29 @@ def crear_paciente(paciente: PacienteCreate, current_user_payload: dict = Depend
         if cur: cur.close()
         if conn: conn.close()
 
+# --- CAMBIOS DESDE UNA VERSIÓN ---
+# Para los clientes que guardan una copia de los pacientes y solo piden lo
+# que cambió desde la última vez (versión por transacción, migración 0009;
+# ver comun/cambios.py). Va antes de /{id_paciente}.
+COLUMNAS_PACIENTE = ("nombre", "rut", "fecha_nacimiento", "id")
+SQL_TODOS_LOS_PACIENTES = text("SELECT nombre, rut, fecha_nacimiento, id FROM pacientes")
+SQL_PACIENTES_CAMBIADOS = text(
+    "SELECT nombre, rut, fecha_nacimiento, id FROM pacientes WHERE version >= :desde AND version < :hasta"
+)
+SQL_PACIENTES_ELIMINADOS = text(
+    "SELECT paciente_id FROM pacientes_eliminados WHERE version >= :desde AND version < :hasta"
+)
+
+@router.get("/cambios", response_model=CambiosPacientes)
+def obtener_cambios_pacientes(
+    desde: int = Query(0, ge=0, description="Valor 'version' de la respuesta anterior (0: todos los pacientes)"),
+    current_user_payload: dict = Depends(validate_token)
+):
+    with engine.connect() as conn:
+        cambios = leer_cambios(conn, desde, SQL_TODOS_LOS_PACIENTES, SQL_PACIENTES_CAMBIADOS, SQL_PACIENTES_ELIMINADOS)
+    cambios["pacientes"] = filas_como_dicts(COLUMNAS_PACIENTE, cambios.pop("filas"))
+    return RespuestaJSON(cambios)
+
 @router.get("/{id_paciente}", response_model=Paciente)
 def obtener_paciente_por_id(id_paciente: int, current_user_payload: dict = Depends(validate_token)):
     conn = get_connection()
@@ -78,12 +126,10 @@ def listar_pacientes(current_user_payload: dict = Depends(validate_token)):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id, nombre, rut, fecha_nacimiento FROM pacientes ORDER BY nombre ASC")
-        pacientes_db = cur.fetchall()
-        pacientes_lista = []
-        for paciente_tupla in pacientes_db:
-            pacientes_lista.append(Paciente(id=paciente_tupla[0], nombre=paciente_tupla[1], rut=paciente_tupla[2], fecha_nacimiento=str(paciente_tupla[3])))
-        return pacientes_lista
+        # Las filas van directo a JSON (orjson), sin un modelo de Pydantic por
+        # paciente; las columnas en el orden de Paciente
+        cur.execute("SELECT nombre, rut, fecha_nacimiento, id FROM pacientes ORDER BY nombre ASC")
+        return RespuestaJSON(filas_como_dicts([c[0] for c in cur.description], cur.fetchall()))
     finally:
         if cur: cur.close()
         if conn: conn.close()
@@ -129,6 +175,7 @@ def eliminar_paciente(id_paciente: int, current_user_payload: dict = Depends(val
         
         # 4. Confirmar todos los cambios en la base de datos
         conn.commit()
+        cache_dispensaciones.invalidar(id_paciente)
 
         # Enviar evento a Kafka (opcional, pero buena práctica)
         evento_kafka = {
@@ -146,67 +193,229 @@ def eliminar_paciente(id_paciente: int, current_user_payload: dict = Depends(val
             
 # --- RUTAS DE DISPENSACIÓN ---
 
-@router.get("/{paciente_id}/dispensaciones", response_model=List[Dispensacion], summary="Obtener el historial de dispensaciones de un paciente")
-def obtener_dispensaciones_paciente(paciente_id: int, current_user_payload: dict = Depends(validate_token)):
+# Paginación por cursor (keyset): cada página continúa desde la última fila
+# de la anterior según (fecha_dispensacion, id), que usa el índice
+# ix_dispensaciones_paciente_fecha_id. El costo de una página no depende de
+# cuántas dispensaciones tenga el paciente.
+HISTORIAL_LIMITE_MAXIMO = 200
+
+def _codificar_cursor(fecha: datetime, id_dispensacion: int) -> str:
+    contenido = json.dumps([fecha.isoformat(), id_dispensacion]).encode("utf-8")
+    return base64.urlsafe_b64encode(contenido).decode("ascii")
+
+def _decodificar_cursor(cursor: str):
+    try:
+        fecha, id_dispensacion = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(fecha), int(id_dispensacion)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido.")
+
+def _pagina_dispensaciones(cur, paciente_id: int, limite: int, cursor: Optional[str] = None,
+                           desde: Optional[date] = None, hasta: Optional[date] = None) -> dict:
+    # Devuelve la página como dict (forma de PaginaDispensaciones) para
+    # serializarla con RespuestaJSON sin un modelo por dispensación.
+    condiciones = ["d.paciente_id = %s"]
+    parametros = [paciente_id]
+    if cursor:
+        condiciones.append("(d.fecha_dispensacion, d.id) < (%s, %s)")
+        parametros.extend(_decodificar_cursor(cursor))
+    if desde:
+        condiciones.append("d.fecha_dispensacion >= %s")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("d.fecha_dispensacion < %s")
+        parametros.append(hasta + timedelta(days=1))
+    # Se pide una fila de más para saber si hay otra página. El nombre del
+    # producto sale del inventario; el guardado en la dispensación queda
+    # solo como respaldo (las antiguas tienen 'N/A').
+    cur.execute(
+        f"""
+        SELECT d.id, d.paciente_id, d.producto_id, d.cantidad, d.fecha_dispensacion,
+               COALESCE(p.nombre, NULLIF(d.nombre_producto, 'N/A')) AS nombre_producto
+        FROM dispensaciones d
+        LEFT JOIN productos p ON p.id = d.producto_id
+        WHERE {" AND ".join(condiciones)}
+        ORDER BY d.fecha_dispensacion DESC, d.id DESC
+        LIMIT %s
+        """,
+        (*parametros, limite + 1)
+    )
+    filas = cur.fetchall()
+    items = filas_como_dicts([c[0] for c in cur.description], filas[:limite])
+    siguiente = _codificar_cursor(filas[limite - 1][4], filas[limite - 1][0]) if len(filas) > limite else None
+    return {"items": items, "siguiente_cursor": siguiente}
+
+@router.get("/{paciente_id}/dispensaciones", response_model=PaginaDispensaciones, summary="Obtener el historial de dispensaciones de un paciente")
+def obtener_dispensaciones_paciente(
+    paciente_id: int,
+    limite: int = Query(50, ge=1, le=HISTORIAL_LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="Valor 'siguiente_cursor' de la página anterior"),
+    desde: Optional[date] = Query(None, description="Solo dispensaciones desde esta fecha (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Solo dispensaciones hasta esta fecha (inclusive)"),
+    current_user_payload: dict = Depends(validate_token)
+):
+    """Historial paginado, de la dispensación más reciente a la más antigua."""
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id, paciente_id, producto_id, cantidad, fecha_dispensacion FROM dispensaciones WHERE paciente_id = %s ORDER BY fecha_dispensacion DESC", (paciente_id,))
-        dispensaciones_db = cur.fetchall()
-        return [Dispensacion(id=d[0], paciente_id=d[1], producto_id=d[2], cantidad=d[3], fecha_dispensacion=d[4]) for d in dispensaciones_db]
+        return RespuestaJSON(_pagina_dispensaciones(cur, paciente_id, limite, cursor, desde, hasta))
     finally:
         if cur: cur.close()
         if conn: conn.close()
 
-@router.post("/{paciente_id}/dispensaciones", response_model=Dispensacion, status_code=201, summary="Registrar entrega de medicamento a un paciente")
-def registrar_dispensacion_a_paciente(
+@router.get("/{paciente_id}/historial", response_model=HistorialPaciente, summary="Paciente y primera página de su historial en una sola llamada")
+def obtener_historial_paciente(
     paciente_id: int,
-    dispensacion: DispensacionCreate, # Usamos el modelo que solo pide producto_id y cantidad
+    limite: int = Query(20, ge=1, le=HISTORIAL_LIMITE_MAXIMO),
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
     current_user_payload: dict = Depends(validate_token)
 ):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM pacientes WHERE id = %s", (paciente_id,))
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Paciente no encontrado.")
+        cur.execute("SELECT id, nombre, rut, fecha_nacimiento FROM pacientes WHERE id = %s", (paciente_id,))
+        paciente_db = cur.fetchone()
+        if paciente_db is None:
+            raise HTTPException(status_code=404, detail=f"Paciente con ID {paciente_id} no encontrado")
+        paciente = {"nombre": paciente_db[1], "rut": paciente_db[2], "fecha_nacimiento": paciente_db[3], "id": paciente_db[0]}
+        return RespuestaJSON({"paciente": paciente, "dispensaciones": _pagina_dispensaciones(cur, paciente_id, limite, None, desde, hasta)})
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+# --- REGISTRO DE DISPENSACIONES ---
+# La existencia del paciente y el INSERT van en una sola sentencia: si el
+# paciente no existe no se inserta ninguna fila y se responde 404. Una visita
+# con varios medicamentos se registra en un solo INSERT (unnest de los
+# productos). Después del COMMIT se publica DISPENSACION_REGISTRADA y el
+# consumidor de inventario descuenta el stock.
+
+TOPIC_DISPENSACIONES = "topic_dispensaciones"
+DISPENSACIONES_MAXIMO_POR_LOTE = 100
+
+class DispensacionesLote(BaseModel):
+    productos: List[DispensacionCreate]
+
+def _registrar_dispensaciones(paciente_id: int, items: List[DispensacionCreate]) -> List[Dispensacion]:
+    if not items:
+        raise HTTPException(status_code=400, detail="Debe indicar al menos un producto.")
+    if len(items) > DISPENSACIONES_MAXIMO_POR_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {DISPENSACIONES_MAXIMO_POR_LOTE} productos por dispensación.")
+    if any(item.cantidad <= 0 for item in items):
+        raise HTTPException(status_code=400, detail="La cantidad de cada producto debe ser mayor a cero.")
 
-        # Corregimos el SQL para insertar un valor por defecto en 'nombre_producto'
-        # y así satisfacer la restricción NOT NULL de la base de datos.
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        # 'orden' conserva el orden de la solicitud en la respuesta. El nombre
+        # del producto queda guardado (si aún existe) para el historial.
         cur.execute(
             """
-            INSERT INTO dispensaciones (paciente_id, producto_id, cantidad, nombre_producto)
-            VALUES (%s, %s, %s, %s) RETURNING id, paciente_id, producto_id, cantidad, fecha_dispensacion;
+            WITH nuevas AS (
+                INSERT INTO dispensaciones (paciente_id, producto_id, cantidad, nombre_producto)
+                SELECT p.id, i.producto_id, i.cantidad, COALESCE(pr.nombre, 'N/A')
+                FROM pacientes p
+                CROSS JOIN unnest(%s::int[], %s::int[]) WITH ORDINALITY AS i(producto_id, cantidad, orden)
+                LEFT JOIN productos pr ON pr.id = i.producto_id
+                WHERE p.id = %s
+                ORDER BY i.orden
+                RETURNING id, paciente_id, producto_id, cantidad, fecha_dispensacion, nombre_producto
+            )
+            SELECT id, paciente_id, producto_id, cantidad, fecha_dispensacion, NULLIF(nombre_producto, 'N/A')
+            FROM nuevas ORDER BY id;
             """,
-            (paciente_id, dispensacion.producto_id, dispensacion.cantidad, 'N/A') # <-- Proporcionamos un valor por defecto
+            ([item.producto_id for item in items], [item.cantidad for item in items], paciente_id)
         )
-        nueva_dispensacion_db = cur.fetchone()
+        filas = cur.fetchall()
+        if not filas:
+            raise HTTPException(status_code=404, detail="Paciente no encontrado.")
         conn.commit()
-        
-        return Dispensacion(
-            id=nueva_dispensacion_db[0],
-            paciente_id=nueva_dispensacion_db[1],
-            producto_id=nueva_dispensacion_db[2],
-            cantidad=nueva_dispensacion_db[3],
-            fecha_dispensacion=nueva_dispensacion_db[4]
-        )
     finally:
         cur.close()
         conn.close()
 
+    dispensaciones = [
+        Dispensacion(id=d[0], paciente_id=d[1], producto_id=d[2], cantidad=d[3], fecha_dispensacion=d[4], nombre_producto=d[5])
+        for d in filas
+    ]
+    for d in dispensaciones:
+        # Las alertas de este paciente ya ven la nueva dispensación
+        cache_dispensaciones.registrar(paciente_id, d.id, d.producto_id, d.fecha_dispensacion)
+
+    evento_kafka = {
+        "accion": "DISPENSACION_REGISTRADA",
+        "paciente_id": paciente_id,
+        "dispensaciones": [
+            {"dispensacion_id": d.id, "producto_id": d.producto_id, "cantidad": d.cantidad, "fecha": d.fecha_dispensacion.isoformat()}
+            for d in dispensaciones
+        ],
+    }
+    enviar_evento(TOPIC_DISPENSACIONES, evento_kafka)
+    return dispensaciones
+
+@router.post("/{paciente_id}/dispensaciones", response_model=Dispensacion, status_code=201, summary="Registrar entrega de medicamento a un paciente")
+def registrar_dispensacion_a_paciente(
+    paciente_id: int,
+    dispensacion: DispensacionCreate, # Usamos el modelo que solo pide producto_id y cantidad
+    current_user_payload: dict = Depends(validate_token)
+):
+    return _registrar_dispensaciones(paciente_id, [dispensacion])[0]
+
+@router.post("/{paciente_id}/dispensaciones/lote", response_model=List[Dispensacion], status_code=201, summary="Registrar en una sola llamada todos los medicamentos entregados en una visita")
+def registrar_dispensaciones_a_paciente(
+    paciente_id: int,
+    lote: DispensacionesLote,
+    current_user_payload: dict = Depends(validate_token)
+):
+    return _registrar_dispensaciones(paciente_id, lote.productos)
+
+# --- ALERTAS DE MEDICAMENTOS ---
+
+def _dispensaciones_recientes(paciente_id: int, dias: int) -> list:
+    """
+    Dispensaciones (id, producto_id, fecha) del paciente en los últimos 'dias'.
+    Si la ventana cabe en el caché se responde desde él (ver
+    cache_dispensaciones.py); si no, se consulta directo a la base.
+    """
+    def cargar(desde):
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id, producto_id, fecha_dispensacion FROM dispensaciones WHERE paciente_id = %s AND fecha_dispensacion >= %s;",
+                        (paciente_id, desde))
+            return cur.fetchall()
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
+
+    if cache_dispensaciones.cubre(dias):
+        return cache_dispensaciones.obtener(paciente_id, cargar)
+    return cargar(datetime.utcnow() - timedelta(days=dias))
+
+def _alerta(retiros_recientes: list, dias: int) -> dict:
+    if retiros_recientes:
+        return {"alerta": True, "mensaje": f"Alerta: El paciente ya ha retirado este medicamento {len(retiros_recientes)} vez/veces en los últimos {dias} días.", "retiros": [{"id_dispensacion": r[0], "fecha": r[1]} for r in retiros_recientes]}
+    return {"alerta": False, "mensaje": "No se encontraron retiros recientes para este medicamento."}
+
 @router.get("/{paciente_id}/alertas", summary="Verificar si un paciente ha retirado un medicamento recientemente")
 def verificar_alertas_medicamento(paciente_id: int, producto_id: int, dias: int = 30, current_user_payload: dict = Depends(validate_token)):
-    # ... (Tu código de alertas sin cambios)
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        fecha_limite = datetime.utcnow() - timedelta(days=dias)
-        cur.execute("SELECT id, fecha_dispensacion FROM dispensaciones WHERE paciente_id = %s AND producto_id = %s AND fecha_dispensacion >= %s;",
-                    (paciente_id, producto_id, fecha_limite))
-        retiros_recientes = cur.fetchall()
-        if retiros_recientes:
-            return {"alerta": True, "mensaje": f"Alerta: El paciente ya ha retirado este medicamento {len(retiros_recientes)} vez/veces en los últimos {dias} días.", "retiros": [{"id_dispensacion": r[0], "fecha": r[1]} for r in retiros_recientes]}
-        return {"alerta": False, "mensaje": "No se encontraron retiros recientes para este medicamento."}
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
\ No newline at end of file
+    retiros = _dispensaciones_recientes(paciente_id, dias)
+    return _alerta(retiros_del_producto(retiros, producto_id, dias), dias)
+
+@router.post("/{paciente_id}/alertas", summary="Verificar las alertas de todos los medicamentos de una receta")
+def verificar_alertas_receta(paciente_id: int, solicitud: SolicitudAlertas, current_user_payload: dict = Depends(validate_token)):
+    """
+    Revisa en una sola llamada todos los productos de una receta. Devuelve la
+    alerta de cada producto (mismo formato que la ruta GET) y si hay alguna.
+    """
+    retiros = _dispensaciones_recientes(paciente_id, solicitud.dias)
+    alertas = []
+    for producto_id in dict.fromkeys(solicitud.producto_ids):
+        alerta = _alerta(retiros_del_producto(retiros, producto_id, solicitud.dias), solicitud.dias)
+        alertas.append({"producto_id": producto_id, **alerta})
+    return {
+        "paciente_id": paciente_id,
+        "alerta": any(a["alerta"] for a in alertas),
+        "alertas": alertas,
+    }
\ No newline at end of file
@@ -1,63 +1,73 @@
 # transacciones/app.py
 
-import os
-import json
-from urllib.request import urlopen
-from datetime import datetime
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from uuid import UUID
 import logging
+import os
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Depends, HTTPException, Body
-from jose import jwt
+from fastapi import FastAPI, Depends, HTTPException, Body
+from fastapi.middleware.cors import CORSMiddleware
 
 # --- LIBRERÍAS PARA LA BASE DE DATOS Y KAFKA ---
 from sqlalchemy import (
-    create_engine, Column, String, Integer, Float, DateTime, ForeignKey
+    Column, String, Integer, Float, DateTime, ForeignKeyConstraint, text
 )
-from sqlalchemy.orm import sessionmaker, declarative_base, Session, relationship
-from pydantic import BaseModel
-from kafka import KafkaProducer
-from kafka.errors import KafkaError
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import declarative_base, Session, relationship
+from pydantic import BaseModel, Field
 
 # --- CONFIGURACIÓN INICIAL ---
 load_dotenv()
-app = FastAPI()
+
+# Pool de conexiones, validación de tokens, productor de Kafka, métricas y
+# salud compartidos por todos los servicios (paquete comun/)
+from comun.auth import verificador_auth0
+from comun.db import calentar_pool, crear_engine, crear_sesiones, dependencia_db
+from comun.kafka import PublicadorKafka
+from comun.metricas import instalar_metricas
+from comun.respuestas import instalar_compresion
+from comun.salud import instalar_salud
 
 # Configuración de logging para ver los mensajes de Kafka
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- CONFIGURACIÓN DE AUTH0, DB, Y MODELOS (Sin cambios) ---
-AUTH0_DOMAIN = os.environ.get("AUTH0_DOMAIN")
-AUTH0_API_AUDIENCE = os.environ.get("AUTH0_API_AUDIENCE")
-ALGORITHMS = ["RS256"]
-
-DATABASE_URL = os.environ.get("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# --- CONFIGURACIÓN DE DB Y MODELOS ---
+engine = crear_engine(nombre_aplicacion="transacciones")
+SessionLocal = crear_sesiones(engine)
 Base = declarative_base()
 
+# 'ventas' y 'detalles_venta' están particionadas por mes sobre 'fecha'
+# (migración 0003), por eso la clave primaria es (id, fecha) y cada detalle
+# lleva la fecha de su venta.
 class Venta(Base):
     __tablename__ = "ventas"
-    id = Column(Integer, primary_key=True, index=True)
-    fecha = Column(DateTime, default=datetime.utcnow)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha = Column(DateTime, primary_key=True, default=datetime.utcnow, index=True)
     total = Column(Float, nullable=False)
     vendedor_id = Column(String, nullable=False)
+    # Id que genera la caja para las ventas hechas sin conexión (migración
+    # 0008): único junto con la fecha, reenviar un lote no duplica la venta
+    id_cliente = Column(PG_UUID(as_uuid=True), nullable=True)
     detalles = relationship("DetalleVenta", back_populates="venta")
 
 class DetalleVenta(Base):
     __tablename__ = "detalles_venta"
-    id = Column(Integer, primary_key=True, index=True)
-    venta_id = Column(Integer, ForeignKey("ventas.id"))
+    __table_args__ = (
+        ForeignKeyConstraint(["venta_id", "fecha"], ["ventas.id", "ventas.fecha"]),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    venta_id = Column(Integer, nullable=False, index=True)
     producto_id = Column(Integer, nullable=False)
     cantidad = Column(Integer, nullable=False)
     precio_unitario = Column(Float, nullable=False)
     subtotal = Column(Float, nullable=False)
+    fecha = Column(DateTime, primary_key=True, index=True)
     venta = relationship("Venta", back_populates="detalles")
 
-Base.metadata.create_all(bind=engine)
-
 class ProductoVenta(BaseModel):
     producto_id: int
     cantidad: int
@@ -65,49 +75,76 @@ class ProductoVenta(BaseModel):
 class CrearVentaRequest(BaseModel):
     productos: List[ProductoVenta]
 
-# --- NUEVA CONFIGURACIÓN DE KAFKA ---
-KAFKA_BOOTSTRAP_SERVERS = os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+# --- VENTAS EN LOTE (cola del punto de venta) ---
+# El POS registra la venta en el navegador al momento y la envía después,
+# junto con las demás pendientes, a POST /api/transacciones/ventas/lote.
+VENTAS_LOTE_MAXIMO = int(os.getenv("VENTAS_LOTE_MAXIMO", "200"))
+# Una caja puede pasar días sin conexión; las ventas más viejas se rechazan.
+# informes no da por cerrado (inmutable) un rango hasta que pasa este plazo.
+VENTAS_ATRASO_MAXIMO_DIAS = int(os.getenv("VENTAS_ATRASO_MAXIMO_DIAS", "7"))
+# Tolerancia para relojes de caja adelantados
+VENTAS_ADELANTO_MAXIMO = timedelta(hours=1)
+
+class VentaCaja(BaseModel):
+    id_cliente: UUID
+    fecha: datetime
+    productos: List[ProductoVenta]
+
+class LoteVentasRequest(BaseModel):
+    ventas: List[VentaCaja] = Field(..., max_length=VENTAS_LOTE_MAXIMO)
+
+class ResultadoVentaCaja(BaseModel):
+    id_cliente: UUID
+    estado: str  # "registrada", "duplicada", "rechazada" o "conflicto"
+    id_venta: Optional[int] = None
+    total: Optional[float] = None
+    detalle: Optional[str] = None
+
+class LoteVentasResponse(BaseModel):
+    resultados: List[ResultadoVentaCaja]
+
+# --- CONFIGURACIÓN DE KAFKA ---
 TOPIC_VENTAS = "topic_ventas"
 
-# Creamos una única instancia del productor de Kafka para toda la aplicación
-# Esto es más eficiente que crear uno nuevo en cada petición.
-try:
-    producer = KafkaProducer(
-        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-        value_serializer=lambda v: json.dumps(v).encode('utf-8'), # Serializador para convertir dict a JSON bytes
-        api_version=(2, 8, 1) # Especificamos la versión de la API de Kafka
-    )
-    logger.info("Productor de Kafka conectado exitosamente.")
-except KafkaError as e:
-    logger.error(f"Error al conectar el productor de Kafka: {e}")
-    producer = None
-
-
-# --- LÓGICA DE VALIDACIÓN DE TOKEN y get_db (Sin cambios) ---
-async def get_token_payload(request: Request):
-    # (El código de validación de token es el mismo)
-    token = request.headers.get("Authorization")
-    if not token: raise HTTPException(status_code=401, detail="Authorization header is expected")
-    parts = token.split()
-    if parts[0].lower() != "bearer" or len(parts) != 2: raise HTTPException(status_code=401, detail="Authorization header must be a Bearer token")
-    token = parts[1]
-    try:
-        jwks_url = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
-        jwks = json.loads(urlopen(jwks_url).read())
-        header = jwt.get_unverified_header(token)
-        rsa_key = next((key for key in jwks["keys"] if key["kid"] == header["kid"]), None)
-        if rsa_key is None: raise HTTPException(status_code=401, detail="Unable to find appropriate key")
-        payload = jwt.decode(token, {k: rsa_key[k] for k in ("kty", "kid", "use", "n", "e")}, algorithms=ALGORITHMS, audience=AUTH0_API_AUDIENCE, issuer=f"https://{AUTH0_DOMAIN}/")
-        return payload
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Unable to parse authentication token: {e}")
+# Una única instancia del publicador para toda la aplicación. No se conecta
+# al importar el módulo: el hilo de envío se conecta (y reintenta) en segundo
+# plano, y registrar una venta no espera a Kafka.
+publicador = PublicadorKafka(client_id='transacciones-service-producer')
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# El esquema lo crean las migraciones (servicio migraciones), no el arranque.
+# Postgres y Kafka se conectan en segundo plano: el worker atiende en cuanto
+# arranca y /listo indica cuándo la base responde.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    calentar_pool(engine)
+    publicador.iniciar()
+    yield
+    # Envía los eventos que sigan en la cola antes de terminar
+    publicador.cerrar()
+
+app = FastAPI(lifespan=lifespan)
+
+# El punto de venta envía su cola de ventas desde el navegador
+allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000")
+origins = [origin.strip() for origin in allowed_origins_str.split(',')]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# --- VALIDACIÓN DE TOKEN y get_db ---
+get_token_payload = verificador_auth0
+get_db = dependencia_db(SessionLocal)
+
+# Métricas de Prometheus (/metrics), chequeos de salud (/salud, /listo) y
+# compresión brotli/gzip de las respuestas grandes
+instalar_metricas(app)
+instalar_compresion(app)
+instalar_salud(app, engine=engine, publicador=publicador)
 
 # --- ENDPOINTS DEL SERVICIO ---
 
@@ -138,6 +175,7 @@ async def registrar_venta(
             subtotal = producto.cantidad * precio_unitario_real
             detalle = DetalleVenta(
                 venta_id=nueva_venta.id,
+                fecha=nueva_venta.fecha,
                 producto_id=producto.producto_id,
                 cantidad=producto.cantidad,
                 precio_unitario=precio_unitario_real,
@@ -149,20 +187,165 @@ async def registrar_venta(
         db.commit()
         db.refresh(nueva_venta)
         
-        # 2. Publicar el evento en Kafka
-        if producer:
-            mensaje_kafka = {
-                "venta_id": nueva_venta.id,
-                "productos": detalles_para_kafka
-            }
-            producer.send(TOPIC_VENTAS, value=mensaje_kafka)
-            producer.flush() # Asegura que el mensaje se envíe
-            logger.info(f"Evento de venta {nueva_venta.id} enviado a Kafka.")
-        else:
-            logger.error("No se pudo enviar el evento de venta a Kafka: productor no disponible.")
+        # 2. Publicar el evento en Kafka (en segundo plano, sin flush por venta)
+        mensaje_kafka = {
+            "venta_id": nueva_venta.id,
+            "fecha": nueva_venta.fecha.isoformat(),
+            "total": nueva_venta.total,
+            "productos": detalles_para_kafka
+        }
+        publicador.publicar(TOPIC_VENTAS, mensaje_kafka)
+        logger.info(f"Evento de venta {nueva_venta.id} encolado para Kafka.")
 
         return {"id_venta": nueva_venta.id, "total": nueva_venta.total, "fecha": nueva_venta.fecha}
         
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error en la base de datos o Kafka: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error en la base de datos o Kafka: {e}")
+
+# Una sentencia por tabla para todo el lote (unnest de arreglos). ON CONFLICT
+# sobre (id_cliente, fecha): una venta ya registrada (lote reenviado tras un
+# corte) no se inserta de nuevo y no sale en RETURNING.
+SQL_PRECIOS = text("SELECT id, precio_venta FROM productos WHERE id = ANY(:ids)")
+
+SQL_INSERTAR_VENTAS = text("""
+    INSERT INTO ventas (fecha, total, vendedor_id, id_cliente)
+    SELECT * FROM unnest(CAST(:fechas AS timestamp[]), CAST(:totales AS float8[]),
+                         CAST(:vendedores AS varchar[]), CAST(:ids_cliente AS uuid[]))
+    ON CONFLICT (id_cliente, fecha) DO NOTHING
+    RETURNING id, id_cliente
+""")
+
+SQL_VENTAS_EXISTENTES = text("""
+    SELECT v.id, v.id_cliente, v.total
+    FROM ventas v
+    JOIN unnest(CAST(:ids_cliente AS uuid[]), CAST(:fechas AS timestamp[])) AS l(id_cliente, fecha)
+      ON v.id_cliente = l.id_cliente AND v.fecha = l.fecha
+""")
+
+SQL_INSERTAR_DETALLES = text("""
+    INSERT INTO detalles_venta (venta_id, fecha, producto_id, cantidad, precio_unitario, subtotal)
+    SELECT * FROM unnest(CAST(:ventas AS integer[]), CAST(:fechas AS timestamp[]), CAST(:productos AS integer[]),
+                         CAST(:cantidades AS integer[]), CAST(:precios AS float8[]), CAST(:subtotales AS float8[]))
+""")
+
+def _fecha_utc(fecha: datetime) -> datetime:
+    # Las columnas son TIMESTAMP sin zona, en UTC (como datetime.utcnow)
+    if fecha.tzinfo is not None:
+        return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+def _motivo_rechazo(venta: VentaCaja, fecha: datetime, ahora: datetime, precios: dict) -> Optional[str]:
+    if not venta.productos:
+        return "La venta no tiene productos."
+    if fecha < ahora - timedelta(days=VENTAS_ATRASO_MAXIMO_DIAS):
+        return f"La venta tiene más de {VENTAS_ATRASO_MAXIMO_DIAS} días."
+    if fecha > ahora + VENTAS_ADELANTO_MAXIMO:
+        return "La fecha de la venta está en el futuro."
+    for p in venta.productos:
+        if p.cantidad <= 0:
+            return f"Cantidad inválida para el producto {p.producto_id}."
+        if p.producto_id not in precios:
+            return f"El producto {p.producto_id} no existe."
+    return None
+
+@app.post("/api/transacciones/ventas/lote", response_model=LoteVentasResponse)
+def registrar_ventas_lote(
+    lote: LoteVentasRequest,
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+):
+    """
+    Registra las ventas que el punto de venta acumuló (sin conexión o en
+    espera de envío). Cada venta trae su id_cliente y la fecha de la caja, y
+    se responde una por una, siempre con un resultado por id_cliente:
+    "registrada", "duplicada" (ya estaba, se devuelve su id), "rechazada"
+    (con el motivo; la caja no debe reintentarla) o "conflicto" (chocó con
+    otra venta del mismo id_cliente que no se pudo leer, p. ej. un envío
+    simultáneo; la caja la reintenta en el próximo envío). Todo el lote va
+    en una transacción y el precio sale del catálogo al momento de
+    registrar.
+    """
+    vendedor_id = payload.get("sub")
+    if not vendedor_id:
+        raise HTTPException(status_code=400, detail="ID de vendedor no encontrado en el token.")
+
+    ahora = datetime.utcnow()
+    ids_producto = {p.producto_id for v in lote.ventas for p in v.productos}
+    precios = dict(db.execute(SQL_PRECIOS, {"ids": list(ids_producto)}).all()) if ids_producto else {}
+
+    resultados = {}
+    aceptadas = {}
+    for venta in lote.ventas:
+        if venta.id_cliente in resultados:
+            continue  # Repetida dentro del mismo lote: vale la primera
+        fecha = _fecha_utc(venta.fecha)
+        motivo = _motivo_rechazo(venta, fecha, ahora, precios)
+        if motivo:
+            resultados[venta.id_cliente] = ResultadoVentaCaja(id_cliente=venta.id_cliente, estado="rechazada", detalle=motivo)
+            continue
+        total = sum(p.cantidad * precios[p.producto_id] for p in venta.productos)
+        resultados[venta.id_cliente] = None
+        aceptadas[venta.id_cliente] = (venta, fecha, total)
+
+    try:
+        insertadas = {}
+        if aceptadas:
+            columnas = {
+                "fechas": [fecha for _, fecha, _ in aceptadas.values()],
+                "totales": [total for _, _, total in aceptadas.values()],
+                "vendedores": [vendedor_id] * len(aceptadas),
+                "ids_cliente": [str(id_cliente) for id_cliente in aceptadas],
+            }
+            insertadas = {id_cliente: id_venta for id_venta, id_cliente in db.execute(SQL_INSERTAR_VENTAS, columnas)}
+
+            detalles = {"ventas": [], "fechas": [], "productos": [], "cantidades": [], "precios": [], "subtotales": []}
+            for id_cliente, id_venta in insertadas.items():
+                venta, fecha, _ = aceptadas[id_cliente]
+                for p in venta.productos:
+                    precio = precios[p.producto_id]
+                    detalles["ventas"].append(id_venta)
+                    detalles["fechas"].append(fecha)
+                    detalles["productos"].append(p.producto_id)
+                    detalles["cantidades"].append(p.cantidad)
+                    detalles["precios"].append(precio)
+                    detalles["subtotales"].append(p.cantidad * precio)
+            if detalles["ventas"]:
+                db.execute(SQL_INSERTAR_DETALLES, detalles)
+
+            repetidas = [id_cliente for id_cliente in aceptadas if id_cliente not in insertadas]
+            if repetidas:
+                existentes = db.execute(SQL_VENTAS_EXISTENTES, {
+                    "ids_cliente": [str(id_cliente) for id_cliente in repetidas],
+                    "fechas": [aceptadas[id_cliente][1] for id_cliente in repetidas],
+                })
+                for id_venta, id_cliente, total in existentes:
+                    resultados[id_cliente] = ResultadoVentaCaja(
+                        id_cliente=id_cliente, estado="duplicada", id_venta=id_venta, total=total)
+                # No se insertó pero tampoco se encontró: nunca se omite del resultado
+                for id_cliente in repetidas:
+                    if resultados[id_cliente] is None:
+                        resultados[id_cliente] = ResultadoVentaCaja(
+                            id_cliente=id_cliente, estado="conflicto",
+                            detalle="Otra venta con el mismo id_cliente impidió registrarla; se debe reenviar.")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error en la base de datos: {e}")
+
+    # Un evento por venta nueva, igual que POST /ventas: inventario descuenta
+    # el stock e informes la suma. Las duplicadas ya se publicaron.
+    for id_cliente, id_venta in insertadas.items():
+        venta, fecha, total = aceptadas[id_cliente]
+        resultados[id_cliente] = ResultadoVentaCaja(
+            id_cliente=id_cliente, estado="registrada", id_venta=id_venta, total=total)
+        publicador.publicar(TOPIC_VENTAS, {
+            "venta_id": id_venta,
+            "fecha": fecha.isoformat(),
+            "total": total,
+            "productos": [{"producto_id": p.producto_id, "cantidad": p.cantidad} for p in venta.productos],
+        })
+    if insertadas:
+        logger.info(f"Lote de ventas: {len(insertadas)} registradas y encoladas para Kafka.")
+
+    return LoteVentasResponse(resultados=list(resultados.values()))
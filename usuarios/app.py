@@ -1,42 +1,39 @@
 # usuarios/app.py
 
-import os
-import json
+from contextlib import asynccontextmanager
 from functools import wraps
-from urllib.request import urlopen
 import enum
+import hmac
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Depends, HTTPException, Body
-from jose import jwt
+from fastapi import FastAPI, Depends, HTTPException, Body, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 
 # --- LIBRERÍAS PARA LA BASE DE DATOS (MODERNAS) ---
-from sqlalchemy import create_engine, Column, String, Enum as SQLAlchemyEnum
-from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy import Column, String, Index, func, text, Enum as SQLAlchemyEnum
+from sqlalchemy.orm import declarative_base, Session
 from pydantic import BaseModel # Para definir el cuerpo de la petición PUT
+from typing import List, Optional
+
+from comun.roles import ClienteRoles, publicar_cambio_rol, CABECERA_TOKEN, ROLES_API_TOKEN
+from token_rol import emitir_token_rol, jwks
 
 # Cargar variables de entorno
 load_dotenv()
 
-# --- CONFIGURACIÓN DE AUTH0 (Sin cambios) ---
-AUTH0_DOMAIN = os.environ.get("AUTH0_DOMAIN")
-AUTH0_API_AUDIENCE = os.environ.get("AUTH0_API_AUDIENCE")
-ALGORITHMS = ["RS256"]
+from comun.auth import verificador_auth0
+from comun.db import calentar_pool, crear_engine, crear_sesiones, dependencia_db
+from comun.metricas import instalar_metricas
+from comun.respuestas import instalar_compresion
+from comun.salud import instalar_salud
 
-# --- CONFIGURACIÓN DE LA BASE DE DATOS (MÁS ROBUSTA) ---
-DATABASE_URL = os.environ.get("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# --- CONFIGURACIÓN DE LA BASE DE DATOS (pool compartido, comun/db.py) ---
+engine = crear_engine(nombre_aplicacion="usuarios")
+SessionLocal = crear_sesiones(engine)
 Base = declarative_base()
 
 # --- FUNCIÓN PARA GESTIONAR LA SESIÓN DE LA BASE DE DATOS (BUENA PRÁCTICA) ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = dependencia_db(SessionLocal)
 
 # --- MODELO DE LA BASE DE DATOS ---
 class RolesUsuario(str, enum.Enum):
@@ -48,6 +45,8 @@ class RolesUsuario(str, enum.Enum):
 
 class Usuario(Base):
     __tablename__ = "usuarios"
+    # (rol, id): listado paginado filtrado por rol y conteo por rol (migración 0006)
+    __table_args__ = (Index("ix_usuarios_rol_id", "rol", "id"),)
     id = Column(String, primary_key=True, index=True)
     rol = Column(SQLAlchemyEnum(RolesUsuario), nullable=False, default=RolesUsuario.beneficiario)
 
@@ -55,11 +54,52 @@ class Usuario(Base):
 class UpdateRolRequest(BaseModel):
     rol: RolesUsuario
 
-# Crear la tabla en la base de datos si no existe
-Base.metadata.create_all(bind=engine)
+# --- MODELOS DEL LISTADO PAGINADO ---
+class UsuarioListado(BaseModel):
+    user_id: str
+    rol: str
+
+class PaginaUsuarios(BaseModel):
+    items: List[UsuarioListado]
+    siguiente_cursor: Optional[str] = None
+
+class ConteoUsuarios(BaseModel):
+    total: int
+    por_rol: dict
+
+# --- CACHÉ DE ROLES ---
+# Los roles se leen de la base solo la primera vez (o al expirar el TTL).
+# Cada cambio se aplica al caché de este proceso y se publica en Kafka para
+# los demás procesos y servicios (ver comun/roles.py).
+def _rol_desde_db(user_id: str):
+    db = SessionLocal()
+    try:
+        db_user = db.query(Usuario).filter(Usuario.id == user_id).first()
+        return db_user.rol.value if db_user else None
+    finally:
+        db.close()
 
-# Iniciar la aplicación FastAPI
-app = FastAPI()
+cache_roles = ClienteRoles(cargar=_rol_desde_db)
+
+def _rol_cambiado(user_id: str, rol: Optional[str]):
+    cache_roles.aplicar_cambio(user_id, rol)
+    publicar_cambio_rol(user_id, rol)
+
+# Iniciar la aplicación FastAPI. La tabla la crean las migraciones; la base
+# se conecta en segundo plano y /listo indica cuándo responde.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    calentar_pool(engine)
+    cache_roles.escuchar_cambios()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Métricas de Prometheus (/metrics), chequeos de salud (/salud, /listo) y
+# compresión brotli/gzip de las respuestas grandes
+instalar_metricas(app)
+instalar_compresion(app)
+instalar_salud(app, engine=engine)
 
 origins = [
     "http://localhost",
@@ -80,55 +120,20 @@ app.add_middleware(
 )
 
 
-# --- LÓGICA DE VALIDACIÓN DE TOKEN (Sin cambios) ---
-async def get_token_payload(request: Request):
-    token = request.headers.get("Authorization")
-    if not token:
-        raise HTTPException(status_code=401, detail="Authorization header is expected")
-    
-    parts = token.split()
-    if parts[0].lower() != "bearer" or len(parts) != 2:
-        raise HTTPException(status_code=401, detail="Authorization header must be a Bearer token")
-        
-    token = parts[1]
-    
-    try:
-        jwks_url = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
-        jwks = json.loads(urlopen(jwks_url).read())
-        header = jwt.get_unverified_header(token)
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == header["kid"]:
-                rsa_key = {k: key[k] for k in ("kty", "kid", "use", "n", "e")}
-                break
-        else:
-            raise HTTPException(status_code=401, detail="Unable to find appropriate key")
-            
-        payload = jwt.decode(
-            token,
-            rsa_key,
-            algorithms=ALGORITHMS,
-            audience=AUTH0_API_AUDIENCE,
-            issuer=f"https://{AUTH0_DOMAIN}/"
-        )
-        return payload
-        
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token is expired")
-    except jwt.JWTClaimsError:
-        raise HTTPException(status_code=401, detail="Incorrect claims, please check the audience and issuer")
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Unable to parse authentication token: {e}")
+# --- LÓGICA DE VALIDACIÓN DE TOKEN ---
+# Compartida con los demás servicios (comun/auth.py): las claves de Auth0 se
+# descargan una vez y se refrescan solo ante un 'kid' desconocido, y los
+# tokens ya verificados quedan en caché hasta su expiración.
+get_token_payload = verificador_auth0
 
 # --- DECORADOR PARA VERIFICAR ROL DE ADMINISTRADOR ---
-async def admin_required(
-    payload: dict = Depends(get_token_payload),
-    db: Session = Depends(get_db)
+# Sin async: si el rol no está en caché se lee de la base, y FastAPI corre
+# las dependencias síncronas en el threadpool, fuera del event loop.
+def admin_required(
+    payload: dict = Depends(get_token_payload)
 ):
     user_id = payload.get("sub")
-    db_user = db.query(Usuario).filter(Usuario.id == user_id).first()
-    
-    if not db_user or db_user.rol != RolesUsuario.admin_general:
+    if not cache_roles.tiene_rol(user_id, RolesUsuario.admin_general.value):
         raise HTTPException(status_code=403, detail="Acceso denegado: se requiere rol de administrador.")
     
     return payload
@@ -137,7 +142,7 @@ async def admin_required(
 # --- ENDPOINTS DEL SERVICIO DE USUARIOS ---
 
 @app.get("/api/usuarios/perfil")
-async def get_user_profile(
+def get_user_profile(
     payload: dict = Depends(get_token_payload), 
     db: Session = Depends(get_db)
 ):
@@ -145,38 +150,110 @@ async def get_user_profile(
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID (sub) not found in token.")
 
-    try:
-        db_user = db.query(Usuario).filter(Usuario.id == user_id).first()
-        
-        if not db_user:
-            new_user = Usuario(id=user_id, rol=RolesUsuario.beneficiario)
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            db_user = new_user
-            
-        return {"user_id": db_user.id, "rol": db_user.rol.value}
+    # El perfil es solo el rol: si está en el caché no se consulta la base
+    rol = cache_roles.vigente(user_id)
+    if rol is not None:
+        return {"user_id": user_id, "rol": rol}
 
+    try:
+        rol, creado = _obtener_o_crear_usuario(db, user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
+    if creado:
+        # Otros servicios pueden tenerlo en caché como inexistente
+        _rol_cambiado(user_id, rol)
+    else:
+        cache_roles.recordar(user_id, rol)
+    return {"user_id": user_id, "rol": rol}
+
+# Crea el usuario como beneficiario si no existe y devuelve su rol, en una
+# sola sentencia. Dos primeros logins simultáneos no chocan: ON CONFLICT deja
+# pasar al segundo sin error.
+SQL_OBTENER_O_CREAR_USUARIO = text("""
+    WITH nuevo AS (
+        INSERT INTO usuarios (id, rol) VALUES (:user_id, 'beneficiario')
+        ON CONFLICT (id) DO NOTHING
+        RETURNING rol
+    )
+    SELECT rol::text, true FROM nuevo
+    UNION ALL
+    SELECT rol::text, false FROM usuarios WHERE id = :user_id AND NOT EXISTS (SELECT 1 FROM nuevo)
+""")
+
+def _obtener_o_crear_usuario(db: Session, user_id: str):
+    # Si otro login insertó el usuario y confirmó mientras esta sentencia
+    # esperaba, la fila no es visible en su snapshot y no vuelve nada: una
+    # segunda ejecución ya la ve.
+    for _ in range(2):
+        fila = db.execute(SQL_OBTENER_O_CREAR_USUARIO, {"user_id": user_id}).first()
+        db.commit()
+        if fila is not None:
+            return fila[0], fila[1]
+    raise RuntimeError(f"No se pudo obtener ni crear el usuario {user_id}.")
+
+@app.post("/api/usuarios/token-rol")
+def obtener_token_rol(payload: dict = Depends(get_token_payload)):
+    """
+    Token corto (ROLES_JWT_TTL_SEGUNDOS) firmado por este servicio con el rol
+    del usuario. El frontend lo envía en la cabecera X-Token-Rol y los demás
+    servicios lo verifican localmente con /.well-known/jwks.json.
+    """
+    user_id = payload.get("sub")
+    rol = cache_roles.rol_de(user_id) if user_id else None
+    if rol is None:
+        raise HTTPException(status_code=404, detail="Usuario no registrado.")
+    return emitir_token_rol(user_id, rol)
+
 # --- NUEVOS ENDPOINTS DE ADMINISTRACIÓN ---
 
-@app.get("/api/usuarios")
-async def list_users(
+USUARIOS_LIMITE_MAXIMO = 200
+
+@app.get("/api/usuarios", response_model=PaginaUsuarios)
+def list_users(
+    limite: int = Query(50, ge=1, le=USUARIOS_LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="'siguiente_cursor' de la página anterior"),
+    rol: Optional[RolesUsuario] = Query(None, description="Solo usuarios con este rol"),
     db: Session = Depends(get_db),
     # Usamos el decorador para proteger esta ruta
     admin_payload: dict = Depends(admin_required)
 ):
     """
-    Lista todos los usuarios y sus roles.
+    Lista los usuarios y sus roles, ordenados por id y paginados por cursor:
+    cada página continúa después del último id de la anterior, usando el
+    índice (rol, id) o la clave primaria. El costo de una página no depende
+    de cuántos usuarios haya.
     Solo accesible para usuarios con el rol 'admin_general'.
     """
-    users = db.query(Usuario).all()
-    return [{"user_id": user.id, "rol": user.rol.value} for user in users]
+    consulta = db.query(Usuario.id, Usuario.rol)
+    if rol is not None:
+        consulta = consulta.filter(Usuario.rol == rol)
+    if cursor:
+        consulta = consulta.filter(Usuario.id > cursor)
+    # Se pide una fila de más para saber si hay otra página
+    filas = consulta.order_by(Usuario.id).limit(limite + 1).all()
+    siguiente = filas[limite - 1][0] if len(filas) > limite else None
+    return PaginaUsuarios(
+        items=[UsuarioListado(user_id=fila[0], rol=fila[1].value) for fila in filas[:limite]],
+        siguiente_cursor=siguiente,
+    )
+
+@app.get("/api/usuarios/conteo", response_model=ConteoUsuarios)
+def count_users(
+    db: Session = Depends(get_db),
+    admin_payload: dict = Depends(admin_required)
+):
+    """
+    Total de usuarios y cantidad por rol.
+    Solo accesible para usuarios con el rol 'admin_general'.
+    """
+    por_rol = {rol.value: 0 for rol in RolesUsuario}
+    for rol, cantidad in db.query(Usuario.rol, func.count()).group_by(Usuario.rol).all():
+        por_rol[rol.value] = cantidad
+    return ConteoUsuarios(total=sum(por_rol.values()), por_rol=por_rol)
 
 @app.put("/api/usuarios/{user_id_to_update}/rol")
-async def update_user_rol(
+def update_user_rol(
     user_id_to_update: str,
     request: UpdateRolRequest,
     db: Session = Depends(get_db),
@@ -195,12 +272,13 @@ async def update_user_rol(
     db_user.rol = request.rol
     db.commit()
     db.refresh(db_user)
+    _rol_cambiado(db_user.id, db_user.rol.value)
     
     return {"user_id": db_user.id, "rol": db_user.rol.value}
 
 # --- NUEVO ENDPOINT: Eliminar Usuario (AÑADE ESTE BLOQUE) ---
 @app.delete("/api/usuarios/{user_id_to_delete}", status_code=204) # Responde con 204 No Content al éxito
-async def delete_user(
+def delete_user(
     user_id_to_delete: str, # El user_id que viene en la URL
     db: Session = Depends(get_db),
     admin_payload: dict = Depends(admin_required) # Protege la ruta para que solo administradores eliminen
@@ -221,4 +299,30 @@ async def delete_user(
     
     db.delete(db_user)
     db.commit()
-    return # FastAPI automáticamente devolverá 204 No Content
\ No newline at end of file
+    _rol_cambiado(user_id_to_delete, None)
+    return # FastAPI automáticamente devolverá 204 No Content
+
+# --- API INTERNA DE ROLES ---
+# La usan los demás servicios (comun/roles.py) cuando un rol no está en su
+# caché. No pasa por el proxy del frontend, pero el puerto de usuarios sí se
+# publica: el servicio que consulta debe enviar ROLES_API_TOKEN en la cabecera
+# X-Token-Servicio, y sin ROLES_API_TOKEN configurado la ruta no responde.
+@app.get("/interno/roles/{user_id}")
+def obtener_rol_interno(
+    user_id: str,
+    token_servicio: Optional[str] = Header(None, alias=CABECERA_TOKEN)
+):
+    if not ROLES_API_TOKEN:
+        raise HTTPException(status_code=503, detail="API interna de roles deshabilitada: falta ROLES_API_TOKEN.")
+    if not hmac.compare_digest((token_servicio or "").encode(), ROLES_API_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de servicio inválido.")
+    rol = cache_roles.rol_de(user_id)
+    if rol is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado.")
+    return {"user_id": user_id, "rol": rol}
+
+
+# Clave pública de los tokens de rol (comun/token_roles.py la descarga una vez)
+@app.get("/.well-known/jwks.json")
+def obtener_jwks():
+    return jwks()
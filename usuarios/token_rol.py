@@ -0,0 +1,88 @@
+# usuarios/token_rol.py
+#
+# Firma de los tokens de rol (ver comun/token_roles.py). La clave privada
+# RSA se toma de ROLES_JWT_CLAVE_PRIVADA (PEM) o del archivo
+# ROLES_JWT_CLAVE_ARCHIVO; si el archivo no existe se genera una vez y todos
+# los workers de gunicorn la comparten desde ahí. La clave pública se
+# publica en /.well-known/jwks.json.
+
+import base64
+import hashlib
+import os
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+from comun.token_roles import EMISOR_TOKEN_ROL, AUDIENCIA_TOKEN_ROL, ALGORITMO_TOKEN_ROL
+
+ROLES_JWT_CLAVE_PRIVADA = os.environ.get("ROLES_JWT_CLAVE_PRIVADA")
+ROLES_JWT_CLAVE_ARCHIVO = os.environ.get("ROLES_JWT_CLAVE_ARCHIVO", "/var/lib/usuarios/roles_jwt.pem")
+ROLES_JWT_TTL_SEGUNDOS = int(os.environ.get("ROLES_JWT_TTL_SEGUNDOS", "300"))
+
+_clave = None
+
+
+def _leer_o_generar_clave() -> bytes:
+    if ROLES_JWT_CLAVE_PRIVADA:
+        return ROLES_JWT_CLAVE_PRIVADA.encode("utf-8")
+    if not os.path.exists(ROLES_JWT_CLAVE_ARCHIVO):
+        os.makedirs(os.path.dirname(ROLES_JWT_CLAVE_ARCHIVO), exist_ok=True)
+        pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        try:
+            # O_EXCL: si otro worker la creó primero, se usa la suya
+            descriptor = os.open(ROLES_JWT_CLAVE_ARCHIVO, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(descriptor, "wb") as archivo:
+                archivo.write(pem)
+            return pem
+    # El archivo puede estar recién creado por otro worker y aún vacío
+    for _ in range(50):
+        with open(ROLES_JWT_CLAVE_ARCHIVO, "rb") as archivo:
+            pem = archivo.read()
+        if pem.strip().endswith(b"-----END PRIVATE KEY-----"):
+            return pem
+        time.sleep(0.1)
+    raise RuntimeError(f"La clave de tokens de rol en {ROLES_JWT_CLAVE_ARCHIVO} está incompleta.")
+
+
+def _base64url(numero: int) -> str:
+    datos = numero.to_bytes((numero.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _cargar_clave() -> dict:
+    global _clave
+    if _clave is None:
+        pem = _leer_o_generar_clave()
+        privada = serialization.load_pem_private_key(pem, password=None)
+        numeros = privada.public_key().public_numbers()
+        jwk = {"kty": "RSA", "use": "sig", "alg": ALGORITMO_TOKEN_ROL, "n": _base64url(numeros.n), "e": _base64url(numeros.e)}
+        # kid: huella de la clave pública, cambia solo si cambia la clave
+        jwk["kid"] = hashlib.sha256(f'{jwk["e"]}.{jwk["n"]}'.encode("ascii")).hexdigest()[:16]
+        _clave = {"pem": pem, "jwk": jwk}
+    return _clave
+
+
+def jwks() -> dict:
+    return {"keys": [_cargar_clave()["jwk"]]}
+
+
+def emitir_token_rol(user_id: str, rol: str) -> dict:
+    clave = _cargar_clave()
+    ahora = int(time.time())
+    claims = {
+        "iss": EMISOR_TOKEN_ROL,
+        "aud": AUDIENCIA_TOKEN_ROL,
+        "sub": user_id,
+        "rol": rol,
+        "iat": ahora,
+        "exp": ahora + ROLES_JWT_TTL_SEGUNDOS,
+    }
+    token = jwt.encode(claims, clave["pem"].decode("utf-8"), algorithm=ALGORITMO_TOKEN_ROL, headers={"kid": clave["jwk"]["kid"]})
+    return {"token": token, "rol": rol, "expira_en": ROLES_JWT_TTL_SEGUNDOS}